@@ -1,13 +1,21 @@
+import asyncio
+import re
 from tkinter import SE
-from typing import Final, Set
+from typing import Final, Mapping, Set
 from contextlib import asynccontextmanager
 from bald_spider import Request
 from bald_spider.http.response import Response
+from bald_spider.core.downloader.body import BodyBuffer
+from bald_spider.core.downloader.files import FileBuffer, PartWriter
+from bald_spider.exceptions import IgnoreRequest, NotConfigured
+from bald_spider.core.downloader.slot import SlotManager
 from bald_spider.middleware.middleware_manager import MiddlewareManager
 from bald_spider.utils.log import get_logger
 from abc import ABC, abstractmethod, ABCMeta
 from typing_extensions import Self
 
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+)", re.I)
+
 
 class DwonloaderMeta(ABCMeta):
 
@@ -23,8 +31,16 @@ class DownloaderBase(ABC, metaclass=DwonloaderMeta):
     def __init__(self, crawler) -> None:
         self.crawler = crawler
         self._active = ActiveRequestManger()
+        self.slots = SlotManager(crawler)
         self.middleware: MiddlewareManager | None = None
         self.logger = get_logger(self.__class__.__name__, crawler.settings.get("LOG_LEVEL"))
+        self.maxsize = crawler.settings.getint("DOWNLOAD_MAXSIZE")
+        self.warnsize = crawler.settings.getint("DOWNLOAD_WARNSIZE")
+        self.spill_size = crawler.settings.getint("DOWNLOAD_SPILL_SIZE")
+        self.files_store: str | None = crawler.settings.get("FILES_STORE")
+        self.files_hash: str = crawler.settings.get("FILES_HASH_ALGORITHM")
+        self.range_size = crawler.settings.getint("FILES_RANGE_SIZE")
+        self.range_concurrency = crawler.settings.getint("FILES_RANGE_CONCURRENCY")
 
     @classmethod
     def create_instance(cls, *args, **kwargs) -> Self:
@@ -34,14 +50,116 @@ class DownloaderBase(ABC, metaclass=DwonloaderMeta):
         self.logger.info(
             f"{self.crawler.spider} <downloader class: {type(self).__name__}"
             f"<concurrency: {self.crawler.settings.getint('CONCURRENCY')}"
+            f"<concurrency per domain: {self.crawler.settings.getint('CONCURRENCY_PER_DOMAIN')}"
         )
         self.middleware = MiddlewareManager.create_instance(self.crawler)
 
     async def fetch(self, request) -> Response | None:
         async with self._active(request):
+            if self.range_concurrency > 1 and request.get_meta("download_file"):
+                # 第一个请求只下载第一段, 服务端支持 range 时再并行下载剩下的部分; 不修改调用者的请求
+                request = request.replace(
+                    headers={
+                        "Range": f"bytes=0-{self.range_size - 1}",
+                        **(request.headers_or_none or {}),
+                        "Accept-Encoding": "identity",
+                    }
+                )
             response = await self.middleware.download(request)
             return response
 
+    def body_buffer(
+        self, request, expected: int | None = None, status: int = 200, headers: Mapping | None = None
+    ) -> BodyBuffer | PartWriter:
+        """响应体缓冲区, 可以用 meta 中的 download_maxsize/download_warnsize 单独设置某个请求的大小限制"""
+        meta = request.meta_or_none or {}
+        if (part := meta.get("download_file_part")) is not None:
+            if status == 206:
+                # 写入文件之前确认返回的正是请求的范围
+                _, start, end = part
+                match = _CONTENT_RANGE_RE.match((headers or {}).get("Content-Range", ""))
+                if match is None or (int(match.group(1)), int(match.group(2))) != (start, end):
+                    raise IgnoreRequest(f"{request} range {start}-{end} got Content-Range {match and match.group(0)}")
+                return PartWriter(*part)
+            # 错误页面读到内存中, 交给中间件按状态码处理(比如重试)
+            return BodyBuffer(request, maxsize=self.maxsize, warnsize=self.warnsize, spill_size=0, logger=self.logger)
+        maxsize = meta.get("download_maxsize", self.maxsize)
+        warnsize = meta.get("download_warnsize", self.warnsize)
+        if meta.get("download_file"):
+            if not self.files_store:
+                raise NotConfigured(f"FILES_STORE must be set to download file {request}")
+            return FileBuffer(
+                request,
+                store=self.files_store,
+                algorithm=self.files_hash,
+                maxsize=maxsize,
+                warnsize=warnsize,
+                logger=self.logger,
+                expected=expected,
+            )
+        return BodyBuffer(
+            request,
+            maxsize=maxsize,
+            warnsize=warnsize,
+            spill_size=self.spill_size,
+            logger=self.logger,
+            expected=expected,
+        )
+
+    async def body_value(self, request, buffer, status: int, headers: Mapping) -> bytes | memoryview:
+        """读完响应体之后调用, 文件下载在这里完成剩余的分段并保存文件"""
+        if isinstance(buffer, FileBuffer):
+            try:
+                await self._finish_file(request, buffer, status, headers)
+            except BaseException:
+                buffer.close()
+                raise
+        return buffer.getvalue()
+
+    async def _finish_file(self, request, buffer: FileBuffer, status: int, headers: Mapping):
+        if not 200 <= status < 300:
+            # 错误页面不保存, 交给中间件按状态码处理
+            buffer.close()
+            return
+        total = None
+        if status == 206 and (match := _CONTENT_RANGE_RE.match(headers.get("Content-Range", ""))):
+            total = int(match.group(3))
+        rehash = total is not None and total > buffer.size
+        if rehash:
+            buffer.check_total(total)
+            buffer.file.flush()
+            semaphore = asyncio.Semaphore(self.range_concurrency)
+            parts = [
+                asyncio.create_task(
+                    self._download_part(request, buffer, start, min(start + self.range_size, total) - 1, semaphore)
+                )
+                for start in range(buffer.size, total, self.range_size)
+            ]
+            try:
+                await asyncio.gather(*parts)
+            except BaseException:
+                # 一段失败就取消其他分段, 等它们结束后再删除临时文件
+                for part in parts:
+                    part.cancel()
+                await asyncio.gather(*parts, return_exceptions=True)
+                raise
+        request.meta["file"] = await buffer.finish(request.url, headers.get("Content-Type"), rehash)
+
+    async def _download_part(self, request, buffer: FileBuffer, start: int, end: int, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            part_request = request.replace(
+                headers={**(request.headers_or_none or {}), "Range": f"bytes={start}-{end}"},
+                meta={**request.meta, "download_file_part": (buffer, start, end)},
+                dont_filter=True,
+            )
+            # 分段请求同样经过中间件(代理 重试等), 中间件返回的新请求在这里直接下载, 不进入调度器
+            while isinstance(result := await self.middleware.process(part_request), Request):
+                await asyncio.sleep(result.meta.pop("schedule_delay", 0))
+                part_request = result
+            if result is None or result.status_code != 206:
+                status = result and result.status_code
+                raise IgnoreRequest(f"{request} range {start}-{end} failed, status {status}")
+
     @abstractmethod
     async def download(self, request: Request) -> Response | None:
         pass
@@ -53,7 +171,7 @@ class DownloaderBase(ABC, metaclass=DwonloaderMeta):
         return len(self._active)
 
     async def close(self) -> None:
-        pass
+        self.slots.close()
 
 
 class ActiveRequestManger:
@@ -75,5 +193,8 @@ class ActiveRequestManger:
         finally:
             self.remove(request)
 
+    def __iter__(self):
+        return iter(self._active)
+
     def __len__(self):
         return len(self._active)
@@ -1,13 +1,23 @@
 from bald_spider import Response
-from aiohttp import ClientSession, TCPConnector, BaseConnector, ClientTimeout, ClientResponse, TraceConfig
+from aiohttp import (
+    BaseConnector,
+    ClientResponse,
+    ClientSession,
+    ClientTimeout,
+    DummyCookieJar,
+    TCPConnector,
+    TraceConfig,
+)
 from bald_spider.core.downloader import DownloaderBase
+from bald_spider.core.downloader.pool import ClientPool
 
 
 class AioDownloader(DownloaderBase):
 
     def __init__(self, crawler):
         super().__init__(crawler)
-        self.session: ClientSession | None = None
+        # 所有 session 共用一个连接池, 按 meta["cookiejar"] 区分 cookie
+        self.sessions: ClientPool[ClientSession] | None = None
         self.connector: BaseConnector | None = None
         self._verify_ssl: bool | None = None
         self._timeout: ClientTimeout | None = None
@@ -17,40 +27,68 @@ class AioDownloader(DownloaderBase):
 
     def open(self):
         super().open()
-        request_timeout = self.crawler.settings.getint("REQUEST_TIMEOUT")
+        settings = self.crawler.settings
+        request_timeout = settings.getint("REQUEST_TIMEOUT")
         self._timeout = ClientTimeout(total=request_timeout)
-        self._verify_ssl = self.crawler.settings.getbool("VERIFY_SSL")
-        self._use_session = self.crawler.settings.getbool("USE_SESSION")
+        self._verify_ssl = settings.getbool("VERIFY_SSL")
+        self._use_session = settings.getbool("USE_SESSION")
         self.tace_config = TraceConfig()
         self.tace_config.on_request_start.append(self.request_start)
-        if self._use_session:
-            self.connector = TCPConnector(verify_ssl=self._verify_ssl)
-            self.session = ClientSession(
-                connector=self.connector, timeout=self._timeout, trace_configs=[self.tace_config]
-            )
+        # 代理请求也复用这个连接池, aiohttp 按 (host, port, ssl, proxy) 区分连接
+        self.connector = TCPConnector(
+            ssl=self._verify_ssl,
+            limit=settings.getint("CONNECTION_LIMIT"),
+            limit_per_host=settings.getint("CONNECTION_LIMIT_PER_HOST"),
+            ttl_dns_cache=settings.getint("DNS_CACHE_TTL") or None,
+            keepalive_timeout=settings.getfloat("KEEPALIVE_TIMEOUT"),
+            happy_eyeballs_delay=settings.getfloat("HAPPY_EYEBALLS_DELAY") or None,
+        )
+        # 最多保留 AIOHTTP_MAX_SESSIONS 个 cookiejar, 最久没有使用的连同 cookie 一起关闭
+        self.sessions = ClientPool(
+            self._new_session, lambda session: session.close(), settings.getint("AIOHTTP_MAX_SESSIONS")
+        )
+        self.sessions.get(None)
+
+    def _new_session(self, cookiejar) -> ClientSession:
+        return ClientSession(
+            connector=self.connector,
+            connector_owner=False,
+            timeout=self._timeout,
+            trace_configs=[self.tace_config],
+            # USE_SESSION=False 时不保存 cookie, 每个请求只带自己的 cookie
+            cookie_jar=None if self._use_session else DummyCookieJar(),
+        )
 
     async def download(self, request) -> Response | None:
         try:
-            if self._use_session and self.session:
-                response = await self.send_request(self.session, request)
-                body = await response.content.read()
-            else:
-                connector = TCPConnector(verify_ssl=self._verify_ssl)
-                async with ClientSession(
-                    connector=connector, timeout=self._timeout, trace_configs=[self.tace_config]
-                ) as session:
-                    response = await self.send_request(session, request)
-                    body = await response.content.read()
+            with self.sessions.use(request.get_meta("cookiejar")) as session:
+                response = await self.send_request(session, request)
+                body = await self._read_body(request, response)
         except Exception as e:
             self.logger.error(f"Error during request: {e}")
             raise e
 
         return self.structure_response(request, response, body)
 
+    async def _read_body(self, request, response: ClientResponse) -> bytes | memoryview:
+        buffer = None
+        try:
+            # 先按 Content-Length 检查, 再边读边检查实际大小
+            buffer = self.body_buffer(request, response.content_length, response.status, response.headers)
+            async for chunk in response.content.iter_any():
+                buffer.write(chunk)
+        except BaseException:
+            if buffer is not None:
+                buffer.close()
+            # 没读完的连接不能复用, 直接关闭
+            response.close()
+            raise
+        return await self.body_value(request, buffer, response.status, response.headers)
+
     @staticmethod
     def structure_response(request, response, body):
         return Response(
-            url=request.url, headers=dict(response.headers), body=body, request=request, status_code=response.status
+            url=request.url, headers=response.headers, body=body, request=request, status_code=response.status
         )
 
     async def send_request(self, session, request) -> ClientResponse:
@@ -60,7 +98,7 @@ class AioDownloader(DownloaderBase):
     async def _get(session, request) -> ClientResponse:
         response = await session.get(
             request.url,
-            headers=request.headers,
+            headers=request.headers_or_none,
             cookies=request.cookie,
             proxy=request.proxy,
         )
@@ -71,7 +109,7 @@ class AioDownloader(DownloaderBase):
         response = await session.post(
             request.url,
             data=request.body,
-            headers=request.headers,
+            headers=request.headers_or_none,
             cookies=request.cookie,
             proxy=request.proxy,
         )
@@ -82,7 +120,8 @@ class AioDownloader(DownloaderBase):
 
     async def close(self):
         """关闭 downloader，清理资源"""
+        await super().close()
+        if self.sessions is not None:
+            await self.sessions.close()
         if self.connector:
             await self.connector.close()
-        if self.session:
-            await self.session.close()
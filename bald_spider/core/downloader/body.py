@@ -0,0 +1,66 @@
+import mmap
+import tempfile
+from logging import Logger
+from typing import BinaryIO, List
+from bald_spider.exceptions import DownloadSizeError
+
+
+class BodyBuffer:
+    """
+    边下载边检查响应大小, 超过 maxsize 立即中止.
+    小响应在内存中拼接成 bytes; 超过 spill_size 后写入临时文件, 下载完成后 mmap 成只读 memoryview,
+    作为 Response.body_view 解码和解析时不会再复制整个响应体.
+    """
+
+    __slots__ = ("request", "maxsize", "warnsize", "spill_size", "logger", "size", "_chunks", "_file", "_warned")
+
+    def __init__(
+        self, request, *, maxsize: int, warnsize: int, spill_size: int, logger: Logger, expected: int | None = None
+    ) -> None:
+        self.request = request
+        self.maxsize = maxsize
+        self.warnsize = warnsize
+        self.spill_size = spill_size
+        self.logger = logger
+        self.size = 0
+        self._chunks: List[bytes] | None = []
+        self._file: BinaryIO | None = None
+        self._warned = False
+        if expected is not None:
+            self._check(expected, "expected size")
+
+    def _check(self, size: int, what: str):
+        if self.maxsize and size > self.maxsize:
+            self.close()
+            raise DownloadSizeError(
+                f"{self.request} cancelled, {what} ({size}) larger than download max size ({self.maxsize})."
+            )
+        if self.warnsize and size > self.warnsize and not self._warned:
+            self._warned = True
+            self.logger.warning(f"{self.request} {what} ({size}) larger than download warn size ({self.warnsize}).")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        self._check(self.size, "received size")
+        if self._file is not None:
+            self._file.write(chunk)
+            return
+        self._chunks.append(chunk)
+        if self.spill_size and self.size > self.spill_size:
+            self._file = tempfile.TemporaryFile(prefix="bald_spider_body_")
+            self._file.writelines(self._chunks)
+            self._chunks = None
+
+    def getvalue(self) -> bytes | memoryview:
+        if self._file is None:
+            return b"".join(self._chunks)
+        self._file.flush()
+        # mmap 持有自己的文件描述符, 临时文件已经删除, memoryview 被回收时释放
+        body = memoryview(mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ))
+        self.close()
+        return body
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,130 @@
+import asyncio
+import glob
+import hashlib
+import mimetypes
+import os
+from uuid import uuid4
+from logging import Logger
+from urllib.parse import urlsplit
+from bald_spider.core.downloader.body import BodyBuffer
+from bald_spider.exceptions import DownloadSizeError
+from bald_spider.items.items import FileItem
+
+
+class FileBuffer(BodyBuffer):
+    """
+    文件下载的响应体直接写入 FILES_STORE 下的临时文件, 同时计算哈希,
+    下载完成后按内容哈希重命名, 相同内容的文件只保存一份.
+    """
+
+    __slots__ = ("store", "algorithm", "hash", "tmp_path", "file")
+
+    def __init__(
+        self,
+        request,
+        *,
+        store: str,
+        algorithm: str,
+        maxsize: int,
+        warnsize: int,
+        logger: Logger,
+        expected: int | None = None,
+    ) -> None:
+        self.store = store
+        self.algorithm = algorithm
+        self.hash = hashlib.new(algorithm)
+        self.file = None
+        os.makedirs(store, exist_ok=True)
+        # 临时文件和最终文件在同一个目录下, 可以直接 os.replace
+        self.tmp_path = os.path.join(store, f".download-{uuid4().hex}")
+        self.file = open(self.tmp_path, "xb")
+        super().__init__(request, maxsize=maxsize, warnsize=warnsize, spill_size=0, logger=logger, expected=expected)
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        self._check(self.size, "received size")
+        self.file.write(chunk)
+        self.hash.update(chunk)
+
+    def check_total(self, total: int):
+        self._check(total, "file size")
+
+    def write_at(self, chunk: bytes, offset: int):
+        """range 请求按偏移写入, 写入前需要 flush 顺序写入的数据"""
+        view = memoryview(chunk)
+        while view:
+            written = os.pwrite(self.file.fileno(), view, offset)
+            view = view[written:]
+            offset += written
+
+    def getvalue(self) -> bytes:
+        return b""
+
+    async def finish(self, url: str, content_type: str | None, rehash: bool) -> FileItem:
+        self.file.close()
+        if rehash:
+            # 分段下载的数据不是按顺序到达的, 下载完成后重新计算整个文件的哈希
+            checksum, self.size = await asyncio.to_thread(_file_hash, self.tmp_path, self.algorithm)
+        else:
+            checksum = self.hash.hexdigest()
+        directory = os.path.join(self.store, checksum[:2])
+        # 相同内容的文件已经存在(扩展名可能不同)就不再保存
+        if existing := glob.glob(os.path.join(glob.escape(directory), checksum + "*")):
+            path = existing[0]
+            os.remove(self.tmp_path)
+        else:
+            path = os.path.join(directory, checksum + _extension(url, content_type))
+            os.makedirs(directory, exist_ok=True)
+            os.replace(self.tmp_path, path)
+        self.tmp_path = None
+        return FileItem(url=url, path=path, checksum=checksum, size=self.size)
+
+    def close(self):
+        """下载失败时删除临时文件"""
+        if self.file is not None:
+            self.file.close()
+        if self.tmp_path is not None and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.tmp_path = None
+
+
+class PartWriter:
+    """range 请求的响应体写入 FileBuffer 的指定位置"""
+
+    __slots__ = ("target", "offset", "end")
+
+    def __init__(self, target: FileBuffer, start: int, end: int) -> None:
+        self.target = target
+        self.offset = start
+        self.end = end
+
+    def write(self, chunk: bytes):
+        if self.offset + len(chunk) > self.end + 1:
+            raise DownloadSizeError(f"{self.target.request} range response is larger than requested.")
+        self.target.write_at(chunk, self.offset)
+        self.offset += len(chunk)
+
+    def getvalue(self) -> bytes:
+        return b""
+
+    def close(self):
+        pass
+
+
+def _file_hash(path: str, algorithm: str) -> tuple[str, int]:
+    file_hash = hashlib.new(algorithm)
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            file_hash.update(chunk)
+            size += len(chunk)
+    return file_hash.hexdigest(), size
+
+
+def _extension(url: str, content_type: str | None) -> str:
+    ext = os.path.splitext(urlsplit(url).path)[1]
+    if 1 < len(ext) <= 6 and ext[1:].isalnum():
+        return ext.lower()
+    if content_type:
+        return mimetypes.guess_extension(content_type.split(";")[0].strip()) or ""
+    return ""
@@ -1,44 +1,105 @@
+from importlib.util import find_spec
 from bald_spider import Response
 from bald_spider.core.downloader import DownloaderBase
+from bald_spider.core.downloader.pool import ClientPool
 import httpx
 
 
 class HTTPXDownloader(DownloaderBase):
     def __init__(self, crawler):
         super().__init__(crawler)
-        self._client: httpx.AsyncClient | None = None
+        # 每个代理一个长连接客户端, None 表示不走代理
+        self._clients: ClientPool[httpx.AsyncClient] | None = None
         self._timeout: httpx.Timeout | None = None
+        self._limits: httpx.Limits | None = None
+        self._verify_ssl: bool = True
+        self._http2: bool = False
 
     def open(self):
         super().open()
-        request_timeout = self.crawler.settings.getint("REQUEST_TIMEOUT")
+        settings = self.crawler.settings
+        request_timeout = settings.getint("REQUEST_TIMEOUT")
         self._timeout = httpx.Timeout(timeout=request_timeout)
+        self._limits = httpx.Limits(
+            max_connections=settings.getint("HTTPX_MAX_CONNECTIONS") or None,
+            max_keepalive_connections=settings.getint("HTTPX_MAX_KEEPALIVE_CONNECTIONS") or None,
+            keepalive_expiry=settings.getfloat("HTTPX_KEEPALIVE_EXPIRY"),
+        )
+        self._verify_ssl = settings.getbool("VERIFY_SSL")
+        self._http2 = settings.getbool("HTTPX_HTTP2")
+        if self._http2 and find_spec("h2") is None:
+            self.logger.warning("HTTPX_HTTP2 requires `pip install httpx[http2]`, fall back to HTTP/1.1.")
+            self._http2 = False
+        # 代理池很大时只保留最近使用的 HTTPX_MAX_CLIENTS 个客户端
+        self._clients = ClientPool(
+            self._new_client, lambda client: client.aclose(), settings.getint("HTTPX_MAX_CLIENTS")
+        )
+        self._clients.get(None)
+
+    def _new_client(self, proxy) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=self._timeout,
+            limits=self._limits,
+            http2=self._http2,
+            verify=self._verify_ssl,
+            proxy=proxy,
+        )
+
+    @staticmethod
+    def _build_request(request) -> httpx.Request:
+        body = request.body
+        return httpx.Request(
+            method=request.method,
+            url=request.url,
+            headers=request.headers_or_none,
+            cookies=request.cookie,
+            data=body if isinstance(body, dict) else None,
+            content=body if body and isinstance(body, (str, bytes)) else None,
+        )
 
     async def download(self, request) -> Response | None:
+        proxy = request.proxy
         try:
-            proxies = request.proxy
-            async with httpx.AsyncClient(timeout=self._timeout, proxy=proxies) as client:
+            with self._clients.use(proxy if proxy is None or isinstance(proxy, str) else str(proxy), proxy) as client:
                 self.logger.debug(f"request downloading: {request.url}, method: {request.method}")
-                response = await client.request(
-                    method=request.method,
-                    url=request.url,
-                    headers=request.headers,
-                    cookies=request.cookie,
-                    data=request.body,
-                )
-                body = await response.aread()
+                # 直接构造请求, 不会带上客户端 cookie jar 中其他请求留下的 cookie
+                response = await client.send(self._build_request(request), stream=True)
+                body = await self._read_body(request, response)
         except Exception as e:
             self.logger.error(f"Error during request: {e}")
             raise e
 
         return self.structure_response(request, response, body)
 
+    async def _read_body(self, request, response: httpx.Response) -> bytes | memoryview:
+        buffer = None
+        try:
+            # 先按 Content-Length 检查, 再边读边检查实际大小
+            length = response.headers.get("content-length")
+            buffer = self.body_buffer(
+                request, int(length) if length and length.isdigit() else None, response.status_code, response.headers
+            )
+            async for chunk in response.aiter_bytes():
+                buffer.write(chunk)
+        except BaseException:
+            if buffer is not None:
+                buffer.close()
+            raise
+        finally:
+            await response.aclose()
+        return await self.body_value(request, buffer, response.status_code, response.headers)
+
     @staticmethod
     def structure_response(request, response, body):
         return Response(
             url=request.url,
-            headers=dict(response.headers),
+            headers=response.headers,
             body=body,
             request=request,
             status_code=response.status_code,
         )
+
+    async def close(self):
+        await super().close()
+        if self._clients is not None:
+            await self._clients.close()
@@ -0,0 +1,77 @@
+import asyncio
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Iterator, Set, TypeVar
+
+T = TypeVar("T")
+
+
+class ClientPool(Generic[T]):
+    """
+    按 key 缓存的客户端(每个代理一个 httpx 客户端, 每个 cookiejar 一个 aiohttp session).
+    超过 maxsize 时关闭最久没有使用的客户端, 还有请求在使用的等请求结束后再关闭; key 为 None 的默认客户端不会被关闭.
+    """
+
+    def __init__(self, factory: Callable[..., T], close: Callable[[T], Awaitable], maxsize: int = 0) -> None:
+        self.factory = factory
+        self.close_client = close
+        self.maxsize = maxsize
+        self._clients: OrderedDict[Hashable, T] = OrderedDict()
+        # 客户端 -> 正在使用的请求数
+        self._using: Dict[T, int] = {}
+        # 已经淘汰, 等使用的请求结束后关闭
+        self._evicted: Set[T] = set()
+        self._closing: Set[asyncio.Task] = set()
+
+    def get(self, key: Hashable, *args) -> T:
+        """args 是创建客户端的参数, 默认就是 key"""
+        if (client := self._clients.get(key)) is not None:
+            self._clients.move_to_end(key)
+            return client
+        client = self._clients[key] = self.factory(*(args or (key,)))
+        if self.maxsize and len(self._clients) > self.maxsize:
+            self._evict(key)
+        return client
+
+    def _evict(self, keep: Hashable):
+        if (oldest := next((k for k in self._clients if k is not None and k != keep), None)) is None:
+            return
+        client = self._clients.pop(oldest)
+        if client in self._using:
+            self._evicted.add(client)
+        else:
+            self._close_later(client)
+
+    def _close_later(self, client: T):
+        task = asyncio.create_task(self.close_client(client))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @contextmanager
+    def use(self, key: Hashable, *args) -> Iterator[T]:
+        """请求期间占用客户端, 期间被淘汰也不会关闭"""
+        client = self.get(key, *args)
+        self._using[client] = self._using.get(client, 0) + 1
+        try:
+            yield client
+        finally:
+            if count := self._using.pop(client) - 1:
+                self._using[client] = count
+            elif client in self._evicted:
+                self._evicted.discard(client)
+                self._close_later(client)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._clients
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def close(self):
+        clients = [*self._clients.values(), *self._evicted]
+        self._clients.clear()
+        self._evicted.clear()
+        for client in clients:
+            await self.close_client(client)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
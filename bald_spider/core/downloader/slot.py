@@ -0,0 +1,228 @@
+import asyncio
+from collections import deque
+from random import uniform
+from typing import Deque, Dict, Tuple
+from urllib.parse import urlsplit
+from bald_spider.http.request import Request
+from bald_spider.utils.rate_limit import TokenBucket
+
+
+class Slot:
+    """一个下载槽位(默认一个域名一个), 有独立的并发数、下载间隔、限速和等待队列"""
+
+    __slots__ = (
+        "key", "concurrency", "delay", "delay_range", "bucket", "active", "next_time", "queue", "ready", "timer"
+    )
+
+    def __init__(
+        self,
+        key: str,
+        concurrency: int,
+        delay: float,
+        *,
+        delay_range: Tuple[float, float] | None = None,
+        bucket: TokenBucket | None = None,
+    ) -> None:
+        self.key = key
+        self.concurrency = concurrency
+        self.delay = delay
+        # 下载间隔的随机范围, 如 (0.75, 1.25)
+        self.delay_range = delay_range
+        self.bucket = bucket
+        self.active = 0
+        # 下一个请求最早可以发出的时间(loop.time())
+        self.next_time = 0.0
+        self.queue: Deque[Request] = deque()
+        self.ready = False
+        self.timer: asyncio.TimerHandle | None = None
+
+    def ready_time(self, now: float) -> float:
+        """不考虑并发时, 下一个请求最早可以发出的时间"""
+        if self.bucket is None:
+            return self.next_time
+        return max(self.next_time, self.bucket.available_at(now))
+
+    def free(self, now: float) -> bool:
+        return self.active < self.concurrency and self.ready_time(now) <= now
+
+    def acquire(self, now: float) -> None:
+        self.active += 1
+        if self.delay:
+            if self.delay_range:
+                self.next_time = now + uniform(self.delay * self.delay_range[0], self.delay * self.delay_range[1])
+            else:
+                self.next_time = now + self.delay
+        if self.bucket is not None:
+            self.bucket.consume(now)
+
+    def release(self) -> None:
+        self.active -= 1
+
+    def removable(self, now: float) -> bool:
+        return not self.active and not self.queue and self.timer is None and self.ready_time(now) <= now
+
+    def __repr__(self) -> str:
+        return (
+            f"<Slot {self.key} concurrency={self.concurrency} delay={self.delay} "
+            f"active={self.active} queued={len(self.queue)}>"
+        )
+
+
+class SlotManager:
+    """
+    按域名划分下载槽位. 调度器取出的请求如果所在槽位没有空闲, 就先放进槽位自己的队列,
+    等槽位有任务完成或者下载间隔到了再放出来, 一个慢域名不会占满全局并发.
+    下载间隔和限速都在调度阶段等待, 等待中的请求不占用全局并发.
+    """
+
+    GC_INTERVAL = 60
+
+    def __init__(self, crawler) -> None:
+        self.crawler = crawler
+        settings = crawler.settings
+        self.concurrency = settings.getint("CONCURRENCY_PER_DOMAIN")
+        self.delay = settings.getfloat("DOWNLOAD_DELAY")
+        self.delay_range = tuple(settings.getlist("RANDEOM_RANGE")) if settings.getbool("RANDOMNESS") else None
+        self.rate = settings.getfloat("RATE_LIMIT_PER_DOMAIN")
+        self.burst = settings.getint("RATE_LIMIT_BURST", 1)
+        self.custom_slots: Dict[str, Dict] = settings.getdict("DOWNLOAD_SLOTS")
+        global_rate = settings.getfloat("RATE_LIMIT")
+        self.bucket = TokenBucket(global_rate, self.burst) if global_rate else None
+        self._global_timer: asyncio.TimerHandle | None = None
+        self.slots: Dict[str, Slot] = {}
+        self._acquired: Dict[Request, Slot] = {}
+        self._ready: Deque[Slot] = deque()
+        self._parked = 0
+        self._last_gc = 0.0
+
+    @staticmethod
+    def slot_key(request: Request) -> str:
+        return request.get_meta("download_slot") or urlsplit(request.url).hostname or ""
+
+    def get_slot(self, request: Request) -> Slot:
+        key = self.slot_key(request)
+        if (slot := self.slots.get(key)) is None:
+            config = self.custom_slots.get(key, {})
+            rate = config.get("rate", self.rate)
+            slot = Slot(
+                key,
+                config.get("concurrency", self.concurrency),
+                config.get("delay", self.delay),
+                delay_range=self.delay_range,
+                bucket=TokenBucket(rate, self.burst) if rate else None,
+            )
+            self.slots[key] = slot
+        return slot
+
+    def throttled(self) -> bool:
+        """全局限速: 没有令牌时不发出任何请求, 到下一个令牌可用时唤醒引擎"""
+        if self.bucket is None:
+            return False
+        now = self._time()
+        available_at = self.bucket.available_at(now)
+        if available_at <= now:
+            return False
+        if self._global_timer is None:
+            self._global_timer = asyncio.get_running_loop().call_at(available_at, self._on_global_timer)
+        return True
+
+    def _on_global_timer(self) -> None:
+        self._global_timer = None
+        self.crawler.engine.wakeup()
+
+    def slot_for(self, request: Request) -> Slot | None:
+        """请求正在占用的槽位"""
+        return self._acquired.get(request)
+
+    def admit(self, request: Request) -> bool:
+        """槽位空闲就占用槽位, 否则放进槽位的等待队列"""
+        slot = self.get_slot(request)
+        now = self._time()
+        if not slot.queue and slot.free(now):
+            self._acquire(slot, request, now)
+            return True
+        slot.queue.append(request)
+        self._parked += 1
+        self._mark(slot, now)
+        return False
+
+    def pop_ready(self) -> Request | None:
+        """取出一个槽位已经空闲的等待请求"""
+        now = self._time()
+        while self._ready:
+            slot = self._ready.popleft()
+            slot.ready = False
+            if slot.queue and slot.free(now):
+                request = slot.queue.popleft()
+                self._parked -= 1
+                self._acquire(slot, request, now)
+                if slot.queue:
+                    self._mark(slot, now)
+                return request
+            if slot.queue:
+                self._mark(slot, now)
+        return None
+
+    def _acquire(self, slot: Slot, request: Request, now: float) -> None:
+        # 同一个请求对象再次进入调度(比如中间件原样返回了请求)时, 先释放之前占用的槽位
+        if (previous := self._acquired.pop(request, None)) is not None:
+            self._free(previous, now)
+        slot.acquire(now)
+        if self.bucket is not None:
+            self.bucket.consume(now)
+        # 中间件可能会修改请求的url, 释放时按请求对象找回槽位
+        self._acquired[request] = slot
+
+    def release(self, request: Request) -> None:
+        # 重复释放或者已经被再次占用时释放过的请求不用处理
+        if (slot := self._acquired.pop(request, None)) is None:
+            return
+        self._free(slot, self._time())
+
+    def _free(self, slot: Slot, now: float) -> None:
+        slot.release()
+        if slot.queue:
+            self._mark(slot, now)
+        if now - self._last_gc > self.GC_INTERVAL:
+            self._gc(now)
+
+    def _mark(self, slot: Slot, now: float) -> None:
+        if slot.ready or slot.timer is not None:
+            return
+        if slot.free(now):
+            slot.ready = True
+            self._ready.append(slot)
+        elif slot.active < slot.concurrency:
+            # 只是下载间隔或者限速没到, 到点之后再唤醒引擎; 并发满的槽位等 release
+            loop = asyncio.get_running_loop()
+            slot.timer = loop.call_at(slot.ready_time(now), self._on_timer, slot)
+
+    def _on_timer(self, slot: Slot) -> None:
+        slot.timer = None
+        if slot.queue:
+            self._mark(slot, self._time())
+        self.crawler.engine.wakeup()
+
+    def _gc(self, now: float) -> None:
+        self._last_gc = now
+        for key in [key for key, slot in self.slots.items() if slot.removable(now)]:
+            del self.slots[key]
+
+    def parked_requests(self) -> list[Request]:
+        return [request for slot in self.slots.values() for request in slot.queue]
+
+    def close(self) -> None:
+        if self._global_timer is not None:
+            self._global_timer.cancel()
+            self._global_timer = None
+        for slot in self.slots.values():
+            if slot.timer is not None:
+                slot.timer.cancel()
+                slot.timer = None
+
+    @staticmethod
+    def _time() -> float:
+        return asyncio.get_running_loop().time()
+
+    def __len__(self) -> int:
+        return self._parked
@@ -1,5 +1,6 @@
 from bald_spider.core.downloader import DownloaderBase
 from bald_spider.core.processor import Processor
+from bald_spider.core.process_pool import CallbackProcessPool
 from bald_spider.core.scheduler import Scheduler
 from collections.abc import Generator
 from typing import Callable
@@ -25,9 +26,14 @@ class Engine:
         self.spider: Scheduler | None = None
         self.scheduler: Scheduler | None = None
         self.processor: Processor | None = None
+        self.process_pool: CallbackProcessPool | None = None
         self.task_manager: TaskManager = TaskManager(self.settings.getint("CONCURRENCY"))
+        self.shard = crawler.shard
         self.running = False
         self.normal = True
+        self._activity = asyncio.Event()
+        self._processor_task: asyncio.Task | None = None
+        self._checkpoint_task: asyncio.Task | None = None
 
     def _get_downloader_cls(self):
         downloader_cls = load_class(self.settings.get("DOWNLOADER"))
@@ -41,53 +47,75 @@ class Engine:
         self.running = True
         self.logger.info(f"info bald_spider started.(project_name:{self.settings.get('PROJECT_NAME')})")
         self.spider = spider
-        self.scheduler = Scheduler(self.crawler)
-        if hasattr(self.scheduler, "open"):
-            self.scheduler.open()
         downloader_cls = self._get_downloader_cls()
         self.downloader = downloader_cls.create_instance(self.crawler)
+        self.scheduler = Scheduler(self.crawler)
+        self.scheduler.open()
         if hasattr(self.downloader, "open"):
             self.downloader.open()
         self.processor = Processor(self.crawler)
-        self.start_requests = iter(spider.start_requests())
+        await self.processor.open()
+        self.process_pool = CallbackProcessPool.create_instance(self.crawler)
+        # 多进程抓取时只有第一个子进程执行 start_requests, 请求再按域名分给其他子进程
+        if self.shard is None or self.shard.index == 0:
+            self.start_requests = iter(spider.start_requests())
+        if self.shard is not None:
+            self.shard.open()
         await self._open_spider()
 
     async def _open_spider(self):
         asyncio.create_task(self.crawler.subscriber.notify(spider_opened))
         # 启动处理器的后台处理任务
-        asyncio.create_task(self.processor.process())
+        self._processor_task = asyncio.create_task(self.processor.process())
         crawling = asyncio.create_task(self.crawl())
         # 这里可以做其他的事情
         asyncio.create_task(self.scheduler.interval_log(self.settings.getint("INTERVAL")))
+        if self.settings.get("JOBDIR"):
+            self._checkpoint_task = asyncio.create_task(
+                self.scheduler.interval_checkpoint(self.settings.getint("JOBDIR_CHECKPOINT_INTERVAL"))
+            )
         await crawling
 
     async def crawl(self):
         """主逻辑"""
         while self.running:
-            request = await self._get_next_request()
-            if request is not None:
+            if (request := await self._get_next_request()) is not None:
                 await self._crawl(request)
-            else:
-                try:
-                    start_request = next(self.start_requests)
-                except StopIteration:
-                    self.start_requests = None
-
-                except Exception as e:
-                    # 1.发起请求的task运行完毕
-                    # 2.调度器是否空闲
-                    # 3.下载器是否空闲
-                    if not await self._exit():
-                        continue
-
+            elif self.start_requests is not None and self.scheduler.queue_empty():
+                await self._next_start_request()
+            elif self._exit():
+                # 1.发起请求的task运行完毕
+                # 2.调度器是否空闲
+                # 3.下载器是否空闲
+                # 多进程抓取时其他子进程还可能发来请求, 等主进程通知结束
+                if self.shard is None or self.shard.finished:
                     self.running = False
-                    if self.start_requests is not None:
-                        self.logger.error(f"Error during start_requests: {e}")
                 else:
-                    # 入队
-                    await self.enqueue_request(start_request)
-        if not self.running:
-            await self.close_spider()
+                    await self._wait_activity()
+            else:
+                # 队列暂时为空, 等待新请求入队或者任务完成
+                await self._wait_activity()
+        await self.close_spider()
+
+    async def _next_start_request(self):
+        try:
+            start_request = next(self.start_requests)
+        except StopIteration:
+            self.start_requests = None
+        except Exception as e:
+            self.start_requests = None
+            self.logger.error(f"Error during start_requests: {e}")
+        else:
+            # 入队
+            await self.enqueue_request(start_request)
+
+    async def _wait_activity(self):
+        self._activity.clear()
+        await self._activity.wait()
+
+    def wakeup(self):
+        """请求入队、任务完成、处理器空闲或者收到停止信号时唤醒主循环"""
+        self._activity.set()
 
     async def _crawl(self, request):
         # 实现并发
@@ -99,11 +127,21 @@ class Engine:
 
         # asyncio.create_task(crawl_task())
         await self.task_manager.semaphore.acquire()
-        self.task_manager.create_task(crawl_task())
+        task = self.task_manager.create_task(crawl_task())
+        task.add_done_callback(lambda _: self._request_done(request))
+
+    def _request_done(self, request):
+        self.downloader.slots.release(request)
+        self.scheduler.request_done(request)
+        self.wakeup()
 
     async def _fetch(self, request):
         async def _success(_response):
-            callback: Callable = request.callback or self.spider.parse
+            callback: Callable = request.callback or (
+                self.spider.parse_file if request.get_meta("download_file") else self.spider.parse
+            )
+            if self.process_pool.offload(request, callback):
+                return self.process_pool.run(callback, _response)
             result = callback(_response)
             if result:
                 if iscoroutine(result):
@@ -119,9 +157,11 @@ class Engine:
 
     async def enqueue_request(self, request):
         await self._schedule_request(request)
+        self.wakeup()
 
     async def _schedule_request(self, request):
-        # TODO 去重
+        if self.shard is not None and not self.shard.owns(request) and self.shard.send(request):
+            return
         await self.scheduler.enqueue_request(request)
 
     async def _get_next_request(self):
@@ -137,13 +177,28 @@ class Engine:
             else:
                 raise OutputError(f"{type(self.spider)} must return `Request` or `Item`")
 
-    async def _exit(self):
+    def inflight_requests(self) -> list[Request]:
+        """正在下载以及还在处理器中等待入队的请求"""
+        return list(self.downloader._active) + self.processor.pending_requests()
+
+    def _exit(self):
         if self.scheduler.idle() and self.downloader.idle() and self.task_manager.all_done() and self.processor.idle():
             return True
         return False
 
     async def close_spider(self):
         await asyncio.gather(*self.task_manager.current_task)
+        if self._processor_task is not None:
+            self._processor_task.cancel()
+        try:
+            await self.processor.close()
+        except Exception as exc:
+            # 管道关闭出错时仍然要保存断点和关闭下载器
+            self.logger.error(f"Error closing pipelines: {exc!r}")
+        await self.process_pool.close()
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+        self.scheduler.close()
         await self.downloader.close()
         if self.normal:
             await self.crawler.close()
@@ -0,0 +1,138 @@
+"""
+把需要大量 CPU 的回调函数放到进程池中执行, 解析页面时不会阻塞事件循环, 一次抓取可以用满多个核.
+
+PROCESS_POOL_CALLBACKS 中的回调函数(方法名, "*" 表示全部)在子进程中执行, 请求的 meta 中
+process_pool=True/False 可以单独指定某个请求. 每个子进程创建一个自己的爬虫实例,
+回调函数按方法名调用, 子进程中修改爬虫或者 meta 的状态不会同步回主进程, 也不能使用 self.crawler.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from inspect import isasyncgen, iscoroutine, isgenerator
+from typing import Callable, List, Tuple
+from multidict import CIMultiDict
+from bald_spider import Request
+from bald_spider.exceptions import TransformTypeError
+from bald_spider.http.response import Response
+from bald_spider.utils import json_backend
+from bald_spider.utils.log import get_logger
+from bald_spider.utils.request import request_from_dict, request_to_dict
+
+# 子进程中的爬虫实例
+_spider = None
+
+
+def default_start_method() -> str:
+    """主进程中已经有线程(数据导出 SQLite 管道等)时 fork 出来的子进程可能死锁, 默认使用 forkserver, 不支持时 spawn"""
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _init_worker(spider_cls, backend: str):
+    global _spider
+    json_backend.set_backend(backend)
+    _spider = spider_cls()
+
+
+async def _collect(result) -> list:
+    return [output async for output in result]
+
+
+def _run_callback(callback_name: str, request_dict: dict, url: str, status: int, headers: list, body: bytes):
+    """在子进程中执行回调, 请求转成 dict 返回, 异常也作为结果返回"""
+    outputs: List[Tuple[str, object]] = []
+    try:
+        request = request_from_dict(request_dict, _spider)
+        response = Response(url, request=request, headers=CIMultiDict(headers), body=body, status_code=status)
+        result = getattr(_spider, callback_name)(response)
+        if iscoroutine(result):
+            asyncio.run(result)
+            return outputs
+        if isasyncgen(result):
+            result = asyncio.run(_collect(result))
+        elif isgenerator(result):
+            result = list(result)
+        elif result is not None:
+            raise TransformTypeError("callnack return value must be `generator` or `async generator` ")
+        for output in result or ():
+            if isinstance(output, Request):
+                outputs.append(("request", request_to_dict(output, _spider)))
+            else:
+                outputs.append(("output", output))
+    except Exception as exc:
+        exc.add_note(traceback.format_exc())
+        outputs.append(("error", exc))
+    return outputs
+
+
+def _header_items(headers) -> list:
+    """aiohttp 和 httpx 的响应头不能 pickle, 转成 (name, value) 列表"""
+    if hasattr(headers, "multi_items"):
+        return list(headers.multi_items())
+    return list(headers.items())
+
+
+class CallbackProcessPool:
+    def __init__(self, crawler) -> None:
+        self.crawler = crawler
+        settings = crawler.settings
+        self.logger = get_logger(self.__class__.__name__, settings.get("LOG_LEVEL"))
+        callbacks = settings.getlist("PROCESS_POOL_CALLBACKS")
+        self.all_callbacks = "*" in callbacks
+        self.callbacks = frozenset(callbacks)
+        self.workers = settings.getint("PROCESS_POOL_WORKERS") or os.cpu_count() or 1
+        self.start_method: str = settings.get("PROCESS_POOL_START_METHOD") or default_start_method()
+        self._executor: ProcessPoolExecutor | None = None
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls(crawler)
+
+    def offload(self, request: Request, callback: Callable) -> bool:
+        """是否在进程池中执行, 只有爬虫自己的方法可以按名称调用"""
+        flag = request.get_meta("process_pool")
+        if flag is None:
+            flag = self.all_callbacks or getattr(callback, "__name__", None) in self.callbacks
+        return bool(flag) and getattr(callback, "__self__", None) is self.crawler.spider
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(type(self.crawler.spider), json_backend.backend),
+            )
+            self.logger.info(f"callback process pool started, workers: {self.workers}")
+        return self._executor
+
+    async def run(self, callback: Callable, response: Response):
+        """在子进程中执行回调, 和 transform 一样返回异步生成器, 异常作为输出返回"""
+        spider = self.crawler.spider
+        self.crawler.stats.inc_value("process_pool_callback_count")
+        try:
+            outputs = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(),
+                _run_callback,
+                callback.__name__,
+                request_to_dict(response.request, spider),
+                response.url,
+                response.status_code,
+                _header_items(response.headers),
+                response.body,
+            )
+        except Exception as exc:
+            # 子进程崩溃(BrokenProcessPool)或者参数不能 pickle
+            outputs = [("error", exc)]
+        for kind, output in outputs:
+            if kind == "request":
+                yield request_from_dict(output, spider)
+            else:
+                yield output
+
+    async def close(self):
+        if self._executor is not None:
+            await asyncio.to_thread(self._executor.shutdown)
+            self._executor = None
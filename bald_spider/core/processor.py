@@ -1,6 +1,6 @@
 from asyncio import Queue
-import asyncio
 from bald_spider import Request, Item
+from bald_spider.pipelines.pipeline_manager import PipelineManager
 from bald_spider.utils.log import get_logger
 
 
@@ -10,36 +10,48 @@ class Processor:
         self.queue: Queue = Queue()
         self.logger = get_logger(self.__class__.__name__)
         self._processing = False
+        # 多进程抓取时数据发给主进程, 由主进程的管道处理
+        if crawler.shard is not None:
+            self.pipelines = crawler.shard.item_forwarder()
+        else:
+            self.pipelines: PipelineManager = PipelineManager.create_instance(crawler)
+
+    async def open(self):
+        await self.pipelines.open_spider()
+
+    async def close(self):
+        await self.pipelines.close_spider()
 
     async def process(self):
-        if self._processing:
-            return
-        self._processing = True
-        try:
-            while not self.idle():
-                result = await self.queue.get()
+        # 常驻消费者, 队列为空时挂起等待, 由 enqueue 唤醒
+        while True:
+            result = await self.queue.get()
+            self._processing = True
+            try:
                 if isinstance(result, Request):
                     await self.crawler.engine.enqueue_request(result)
                 else:
                     assert isinstance(result, Item)
                     await self._process_item(result)
+            except Exception as exc:
+                self.logger.error(f"Error processing {result}: {exc}")
+            finally:
+                self._processing = False
                 self.queue.task_done()
-        finally:
-            self._processing = False
+            if self.idle():
+                self.crawler.engine.wakeup()
 
     async def _process_item(self, item: Item):
-        self.crawler.stats.inc_value("item_successful_count")
-        # 使用异步日志替代同步print，避免阻塞事件循环
-        self.logger.info(f"Item processed: {item}")
+        await self.pipelines.process_item(item)
 
     async def enqueue(self, output: Request | Item):
         await self.queue.put(output)
-        # 不要每次都立即处理，让处理器自己管理
-        if not self._processing:
-            asyncio.create_task(self.process())
+
+    def pending_requests(self) -> list[Request]:
+        return [output for output in self.queue._queue if isinstance(output, Request)]
 
     def idle(self):
-        return len(self) == 0
+        return len(self) == 0 and not self._processing
 
     def __len__(self):
         return self.queue.qsize()
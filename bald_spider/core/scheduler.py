@@ -1,36 +1,200 @@
 import asyncio
+import os
+import pickle
+import threading
+from heapq import heappop, heappush
+from itertools import count
+from typing import List, Tuple
 
-from httpx._transports import default
+from bald_spider.core.downloader.slot import SlotManager
+from bald_spider.dupefilter import BaseDupeFilter
 from bald_spider.event import request_scheduled
+from bald_spider.http.request import Request
 from bald_spider.utils.pqueue import SpoderPriorityQueue
 from bald_spider.utils.log import get_logger
+from bald_spider.utils.project import load_class
+from bald_spider.utils.request import request_from_dict, request_to_dict
 
 
 class Scheduler:
     def __init__(self, crawler):
         self.request_queue: SpoderPriorityQueue | None = None
+        self.dupe_filter: BaseDupeFilter | None = None
+        self.slots: SlotManager | None = None
         self.crawler = crawler
         self.item_count = 0
         self.response_count = 0
         self.logger = get_logger(self.__class__.__name__, log_level=crawler.settings.get("LOG_LEVEL"))
+        self.jobdir: str | None = crawler.settings.get("JOBDIR")
+        self.max_parked = crawler.settings.getint("SCHEDULER_MAX_PARKED")
+        self.max_busy = crawler.settings.getint("SCHEDULER_MAX_BUSY_HITS")
+        self.slot_backlog = crawler.settings.getint("SCHEDULER_SLOT_BACKLOG")
+        # 延时请求(如重试退避): (到期时间, 序号, 请求), 到期后放回队列
+        self._delayed: List[Tuple[float, int, Request]] = []
+        self._delayed_seq = count()
+        self._delayed_timer: asyncio.TimerHandle | None = None
+        # 断点保存的序号, 只保留最后一次保存的结果
+        self._checkpoint_seq = count()
+        self._checkpoint_saved = -1
+        self._checkpoint_lock = threading.Lock()
 
     def open(self):
-        self.request_queue = SpoderPriorityQueue()
+        if self.jobdir:
+            os.makedirs(self.jobdir, exist_ok=True)
+        self.slots = self.crawler.engine.downloader.slots
+        self.request_queue = load_class(self.crawler.settings.get("SCHEDULER_QUEUE")).create_instance(self.crawler)
+        self.dupe_filter = load_class(self.crawler.settings.get("DUPEFILTER")).create_instance(self.crawler)
+        if hasattr(self.request_queue, "open"):
+            self.request_queue.open()
+        if self.jobdir:
+            self._restore()
+
+    def _restore(self):
+        # 上次退出时队列中、下载中和处理器中的请求, 指纹已经记录过, 直接入队不再去重
+        path = os.path.join(self.jobdir, "requests.pickle")
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            requests = pickle.load(f)
+        for d in requests:
+            request = request_from_dict(d, self.crawler.spider)
+            if (delay := request.pop_meta("schedule_delay", 0)) > 0:
+                self._delay(request, delay)
+            else:
+                self.request_queue.put_nowait(request)
+        self.logger.info(f"restored {len(requests)} pending requests from {self.jobdir}")
+
+    def checkpoint(self):
+        """退出时保存全部待抓取请求和去重状态到 JOBDIR, 下次启动时恢复"""
+        if not self.jobdir:
+            return
+        self._save_requests(next(self._checkpoint_seq), self._pending(self.request_queue.dump()))
+        self.dupe_filter.checkpoint()
+
+    async def interval_checkpoint(self, interval):
+        # 定时保存不清空队列(磁盘队列只提交溢出的请求), 序列化和写文件在线程中执行, 不阻塞事件循环
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            if hasattr(self.request_queue, "checkpoint"):
+                queued = self.request_queue.checkpoint()
+            else:
+                queued = self.request_queue.dump()
+            pending = self._pending(queued)
+            await loop.run_in_executor(None, self._save_requests, next(self._checkpoint_seq), pending)
+            self.dupe_filter.checkpoint()
+
+    def _pending(self, queued: List[Request]) -> List[Request]:
+        pending = queued + self.slots.parked_requests() + self.crawler.engine.inflight_requests()
+        # 延时请求记下剩余的等待时间, 恢复后继续等待
+        now = asyncio.get_running_loop().time() if self._delayed else 0.0
+        for due, _, request in self._delayed:
+            request = request.replace()
+            request.meta["schedule_delay"] = max(0.0, due - now)
+            pending.append(request)
+        return pending
+
+    def _save_requests(self, seq: int, pending: List[Request]):
+        requests = []
+        for request in pending:
+            try:
+                requests.append(request_to_dict(request, self.crawler.spider))
+            except ValueError as exc:
+                self.logger.warning(f"{request} can not be saved: {exc}")
+        data = pickle.dumps(requests, pickle.HIGHEST_PROTOCOL)
+        path = os.path.join(self.jobdir, "requests.pickle")
+        with self._checkpoint_lock:
+            # 线程中还没写完的定时保存不能覆盖退出时保存的结果
+            if seq < self._checkpoint_saved:
+                return
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+            self._checkpoint_saved = seq
+        self.logger.debug(f"checkpoint {len(requests)} pending requests to {self.jobdir}")
 
     async def next_request(self):
-        request = await self.request_queue.get()
+        # 优先放出槽位已经空闲的等待请求, 再从队列里找槽位有空闲的请求
+        if self.slots.throttled():
+            return None
+        request = self.slots.pop_ready()
+        # 槽位忙时请求放进槽位的等待队列, 等待的总数、每个槽位等待的数量和每次连续碰到忙槽位的次数都有上限,
+        # 其余请求留在(磁盘)队列中: 内存不会随待抓取的请求数增长, 后来的高优先级请求也不会排在一长串等待请求后面
+        busy = 0
+        while request is None and busy < self.max_busy and len(self.slots) < self.max_parked:
+            if (request := self.request_queue.get_nowait()) is None:
+                break
+            busy += 1
+            if len(self.slots.get_slot(request).queue) >= self.slot_backlog:
+                # 放回队列, 共享队列据此删除处理中的记录
+                self.request_queue.put_nowait(request)
+                self.request_done(request)
+                request = None
+            elif not self.slots.admit(request):
+                request = None
         return request
 
-    async def enqueue_request(self, request):
-        await self.request_queue.put(request)
+    def request_done(self, request):
+        """请求处理完成, 共享队列据此删除处理中的记录"""
+        if hasattr(self.request_queue, "request_done"):
+            self.request_queue.request_done(request)
+
+    async def enqueue_request(self, request) -> bool:
+        if not request.dont_filter and self.dupe_filter.request_seen(request):
+            self.dupe_filter.log(request)
+            return False
+        if (delay := request.pop_meta("schedule_delay", 0)) > 0:
+            self._delay(request, delay)
+        else:
+            await self.request_queue.put(request)
         asyncio.create_task(self.crawler.subscriber.notify(request_scheduled, request, self.crawler.spider))
         self.crawler.stats.inc_value("request_scheduler_count")
+        return True
+
+    def _delay(self, request: Request, delay: float):
+        due = asyncio.get_running_loop().time() + delay
+        heappush(self._delayed, (due, next(self._delayed_seq), request))
+        # 只有新请求最早到期时才需要重新设置定时器
+        if self._delayed[0][2] is request:
+            self._schedule_delayed()
+
+    def _schedule_delayed(self):
+        if self._delayed_timer is not None:
+            self._delayed_timer.cancel()
+            self._delayed_timer = None
+        if self._delayed:
+            self._delayed_timer = asyncio.get_running_loop().call_at(self._delayed[0][0], self._release_delayed)
+
+    def _release_delayed(self):
+        self._delayed_timer = None
+        now = asyncio.get_running_loop().time()
+        while self._delayed and self._delayed[0][0] <= now:
+            self.request_queue.put_nowait(heappop(self._delayed)[2])
+        self._schedule_delayed()
+        self.crawler.engine.wakeup()
+
+    def close(self):
+        self.checkpoint()
+        if self._delayed_timer is not None:
+            self._delayed_timer.cancel()
+            self._delayed_timer = None
+        if hasattr(self.request_queue, "close"):
+            self.request_queue.close()
+        if self.dupe_filter is not None:
+            self.dupe_filter.close()
+
+    def queue_empty(self) -> bool:
+        """队列为空(不算槽位中等待的请求)"""
+        return self.request_queue.empty()
 
     def idle(self) -> bool:
         """检查调度器是否空闲"""
         if self.request_queue is None:
             return True
-        return self.request_queue.empty()
+        if not (self.request_queue.empty() and not len(self.slots) and not self._delayed):
+            return False
+        # 共享队列还要等其他节点处理中的请求
+        return not hasattr(self.request_queue, "idle") or self.request_queue.idle()
 
     async def interval_log(self, interval):
         while True:
@@ -46,4 +210,4 @@ class Scheduler:
             await asyncio.sleep(interval)
 
     def __len__(self):
-        return self.request_queue.qsize()
+        return self.request_queue.qsize() + len(self.slots) + len(self._delayed)
@@ -0,0 +1,309 @@
+"""
+多进程抓取(CRAWLER_PROCESSES 大于 1).
+主进程启动 N 个子进程, 每个子进程运行自己的 Crawler/Engine, 请求按域名哈希分给固定的子进程,
+不属于自己的请求通过队列发给对应的子进程, 同一个域名的去重和限速都在同一个进程中完成.
+子进程产生的数据批量发回主进程, 由主进程的管道统一处理; 结束时合并各个子进程的统计信息.
+
+终止检测: 主进程定期向所有子进程发探测消息, 子进程回复是否空闲以及发送和接收的请求数,
+连续两轮所有子进程都空闲, 计数没有变化并且发送数等于接收数时, 通知所有子进程退出.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+import zlib
+from typing import Dict, List
+from urllib.parse import urlsplit
+from bald_spider.http.request import Request
+from bald_spider.items.items import Item
+from bald_spider.core.process_pool import default_start_method
+from bald_spider.pipelines.pipeline_manager import PipelineManager
+from bald_spider.stats_collector import StatsCollector
+from bald_spider.subscriber import Subscriber
+from bald_spider.utils import json_backend
+from bald_spider.utils.date import now
+from bald_spider.utils.log import get_logger
+from bald_spider.utils.project import merge_settings
+from bald_spider.utils.request import request_from_dict, request_to_dict
+
+PROBE_INTERVAL = 0.2
+# 这些统计项由主进程自己计算, 不合并子进程的值
+_RUN_STATS = ("start_time", "end_time", "reason", "use_time")
+
+
+def shard_index(url: str, count: int) -> int:
+    """按域名分片, 不能用 hash(), 每个进程的 hash 种子不同"""
+    host = urlsplit(url).hostname or ""
+    return zlib.crc32(host.encode()) % count
+
+
+class ItemForwarder:
+    """子进程中代替 PipelineManager, 数据攒成一批发给主进程"""
+
+    def __init__(self, outbox, batch_size: int) -> None:
+        self.outbox = outbox
+        self.batch_size = batch_size
+        self.buffer: List[Item] = []
+
+    async def open_spider(self):
+        pass
+
+    async def process_item(self, item: Item):
+        self.buffer.append(item)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.outbox.put(("items", self.buffer))
+            self.buffer = []
+
+    async def close_spider(self):
+        self.flush()
+
+
+class Shard:
+    """子进程中的分片: 转发不属于自己的请求, 接收其他进程发来的请求, 回复终止检测"""
+
+    def __init__(self, index: int, count: int, inboxes: list, outbox) -> None:
+        self.index = index
+        self.count = count
+        self.inboxes = inboxes
+        self.outbox = outbox
+        self.crawler = None
+        self.sent = 0
+        self.received = 0
+        # 已经收到但还没有进入调度器的请求
+        self.pending = 0
+        self.finished = False
+        self.items: ItemForwarder | None = None
+        self.logger = get_logger(f"{self.__class__.__name__}-{index}")
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def update_settings(self, settings):
+        """每个子进程使用自己的 JOBDIR 子目录, 恢复时需要使用相同的进程数; 统计信息由主进程合并后输出"""
+        settings.set("STATS_DUMP", False)
+        if jobdir := settings.get("JOBDIR"):
+            settings.set("JOBDIR", os.path.join(jobdir, f"shard-{self.index}"))
+
+    def item_forwarder(self) -> ItemForwarder:
+        self.items = ItemForwarder(self.outbox, self.crawler.settings.getint("ITEM_PIPELINE_BATCH_SIZE"))
+        return self.items
+
+    def open(self):
+        self._loop = asyncio.get_running_loop()
+        threading.Thread(target=self._read, name=f"shard-{self.index}-inbox", daemon=True).start()
+
+    def owns(self, request: Request) -> bool:
+        return shard_index(request.url, self.count) == self.index
+
+    def send(self, request: Request) -> bool:
+        """发给负责这个域名的进程, 回调函数不是爬虫的方法时不能转发, 留在本进程"""
+        try:
+            d = request_to_dict(request, self.crawler.spider)
+        except ValueError as exc:
+            self.logger.warning(f"{request} is crawled by shard {self.index}: {exc}")
+            return False
+        self.inboxes[shard_index(request.url, self.count)].put(("request", d))
+        self.sent += 1
+        return True
+
+    def _read(self):
+        inbox = self.inboxes[self.index]
+        while True:
+            message = inbox.get()
+            self._loop.call_soon_threadsafe(self._handle, message)
+            if message[0] == "stop":
+                return
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == "request":
+            self.received += 1
+            self.pending += 1
+            asyncio.create_task(self._enqueue(message[1]))
+        elif kind == "probe":
+            idle = self.idle()
+            if idle and self.items is not None:
+                self.items.flush()
+            self.outbox.put(("probe", message[1], self.index, idle, self.sent, self.received))
+        elif kind == "stop":
+            self.finished = True
+            self.crawler.engine.wakeup()
+
+    async def _enqueue(self, d: dict):
+        engine = self.crawler.engine
+        try:
+            await engine.enqueue_request(request_from_dict(d, self.crawler.spider))
+        finally:
+            self.pending -= 1
+            engine.wakeup()
+
+    def idle(self) -> bool:
+        engine = self.crawler.engine
+        if engine is None or not engine.running or engine.processor is None:
+            return False
+        return self.pending == 0 and engine.start_requests is None and engine._exit()
+
+    def interrupt(self):
+        engine = self.crawler.engine
+        self.finished = True
+        if engine is not None:
+            engine.running = False
+            engine.normal = False
+            engine.wakeup()
+            self.crawler.stats.close_spider(self.crawler.spider, "ctrl + c")
+
+
+def _worker_main(index: int, count: int, spider_cls, settings, inboxes: list, outbox):
+    asyncio.run(_run_worker(index, count, spider_cls, settings, inboxes, outbox))
+
+
+async def _run_worker(index: int, count: int, spider_cls, settings, inboxes: list, outbox):
+    from bald_spider.crawler import Crawler
+
+    crawler = Crawler(spider_cls, settings)
+    crawler.shard = shard = Shard(index, count, inboxes, outbox)
+    shard.crawler = crawler
+    loop = asyncio.get_running_loop()
+    # fork 出来的子进程继承了主进程的信号处理函数, 换成只停止本进程的引擎
+    signal.signal(signal.SIGINT, lambda signum, frame: loop.call_soon_threadsafe(shard.interrupt))
+    try:
+        await crawler.crawl()
+    finally:
+        stats = dict(crawler.stats.get_stats()) if crawler.stats is not None else {}
+        outbox.put(("done", index, stats))
+
+
+class ShardedCrawler:
+    """主进程: 启动子进程, 检测终止, 用管道处理子进程发回的数据, 合并统计信息"""
+
+    def __init__(self, spider_cls, settings, processes: int) -> None:
+        self.spider_cls = spider_cls
+        self.settings = settings.copy()
+        self.processes = processes
+        self.spider = None
+        self.engine = None
+        self.stats: StatsCollector | None = None
+        self.subscriber: Subscriber | None = None
+        self.logger = get_logger(self.__class__.__name__, self.settings.get("LOG_LEVEL"))
+
+    async def crawl(self):
+        self.subscriber = Subscriber()
+        self.spider = self.spider_cls.create_instance(self)
+        merge_settings(self.spider_cls, self.settings)
+        json_backend.set_backend(self.settings.get("JSON_BACKEND"))
+        self.stats = StatsCollector(self)
+        self.stats["start_time"] = now()
+        pipelines = PipelineManager.create_instance(self)
+        await pipelines.open_spider()
+        # 管道已经打开(可能有数据导出线程), 默认不 fork
+        start_method = self.settings.get("CRAWLER_PROCESS_START_METHOD") or default_start_method()
+        context = multiprocessing.get_context(start_method)
+        inboxes = [context.Queue() for _ in range(self.processes)]
+        outbox = context.Queue()
+        workers = [
+            context.Process(
+                target=_worker_main,
+                args=(index, self.processes, self.spider_cls, self.settings, inboxes, outbox),
+                name=f"{self.spider}-shard-{index}",
+            )
+            for index in range(self.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.logger.info(f"{self.spider} started {self.processes} crawler processes.")
+        try:
+            results = await self._coordinate(workers, inboxes, outbox, pipelines)
+        finally:
+            for worker in workers:
+                await asyncio.to_thread(worker.join)
+        await pipelines.close_spider()
+        reason = "finished"
+        for stats in results.values():
+            self._merge_stats(stats)
+            if stats.get("reason", "finished") != "finished":
+                reason = stats["reason"]
+        self.stats["crawler_processes"] = self.processes
+        self.stats.close_spider(self.spider, reason)
+
+    async def _coordinate(self, workers, inboxes, outbox, pipelines) -> Dict[int, dict]:
+        loop = asyncio.get_running_loop()
+        messages: asyncio.Queue = asyncio.Queue()
+
+        def read():
+            while (message := outbox.get()) is not None:
+                loop.call_soon_threadsafe(messages.put_nowait, message)
+
+        reader = threading.Thread(target=read, name="shard-outbox", daemon=True)
+        reader.start()
+        count = len(workers)
+        results: Dict[int, dict] = {}
+        replies: Dict[int, tuple] = {}
+        probe_round, last, stopped = 0, None, False
+        next_probe = loop.time() + PROBE_INTERVAL
+
+        def stop():
+            for inbox in inboxes:
+                inbox.put(("stop",))
+
+        while len(results) < count:
+            try:
+                message = await asyncio.wait_for(messages.get(), max(0.0, next_probe - loop.time()))
+            except asyncio.TimeoutError:
+                message = None
+            if message is not None:
+                kind = message[0]
+                if kind == "items":
+                    for item in message[1]:
+                        await pipelines.process_item(item)
+                elif kind == "probe":
+                    if message[1] == probe_round:
+                        replies[message[2]] = message[3:]
+                elif kind == "done":
+                    results[message[1]] = message[2]
+            if loop.time() < next_probe:
+                continue
+            next_probe = loop.time() + PROBE_INTERVAL
+            for index, worker in enumerate(workers):
+                if index not in results and not worker.is_alive():
+                    self.logger.error(f"crawler process {worker.name} exited with code {worker.exitcode}.")
+                    results[index] = {"reason": f"shard {index} exited with code {worker.exitcode}"}
+            if stopped:
+                continue
+            if len(results) > 0:
+                # 有子进程提前退出(被中断或者崩溃), 发给它的请求无法完成, 结束所有子进程
+                stopped = True
+                stop()
+                continue
+            if probe_round and len(replies) < count:
+                continue
+            snapshot = tuple(replies[index] for index in range(count)) if probe_round else None
+            balanced = snapshot is not None and all(idle for idle, _, _ in snapshot)
+            balanced = balanced and sum(sent for _, sent, _ in snapshot) == sum(received for _, _, received in snapshot)
+            if balanced and snapshot == last:
+                stopped = True
+                stop()
+                continue
+            last = snapshot if balanced else None
+            probe_round += 1
+            replies = {}
+            for inbox in inboxes:
+                inbox.put(("probe", probe_round))
+        outbox.put(None)
+        await asyncio.to_thread(reader.join)
+        # 读线程结束后可能还有没处理的数据
+        while not messages.empty():
+            message = messages.get_nowait()
+            if message[0] == "items":
+                for item in message[1]:
+                    await pipelines.process_item(item)
+        return results
+
+    def _merge_stats(self, stats: dict):
+        for key, value in stats.items():
+            if key in _RUN_STATS or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            self.stats.inc_value(key, value)
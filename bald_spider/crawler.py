@@ -1,6 +1,8 @@
 import asyncio
+import os
 import signal
 from bald_spider.core.engine import Engine
+from bald_spider.core.shard import ShardedCrawler
 from bald_spider.event import spider_closed, spider_opened
 from bald_spider.spider import Spider
 from typing import Final, Set, Type
@@ -8,7 +10,8 @@ from bald_spider.settings.settings_manager import SettingsManager
 from bald_spider.exceptions import SpiderTypeError
 from bald_spider.stats_collector import StatsCollector
 from bald_spider.subscriber import Subscriber
-from bald_spider.utils.project import merge_settings
+from bald_spider.utils.project import load_class, merge_settings
+from bald_spider.utils import json_backend
 from bald_spider.utils.log import get_logger
 from bald_spider.utils.date import now
 
@@ -23,10 +26,13 @@ class Crawler:
         self.engine: Engine | None = None
         self.stats: StatsCollector | None = None
         self.subscriber: Subscriber | None = None
+        # 多进程抓取时子进程中的分片, 见 bald_spider.core.shard
+        self.shard = None
 
     async def crawl(self):
         self.subscriber = self._create_subscriber()
         self.spider = self._create_spider()
+        json_backend.set_backend(self.settings.get("JSON_BACKEND"))
         self.engine = self._create_engine()
         self.stats = self._create_stats()
         await self.engine.start_spider(self.spider)
@@ -39,7 +45,7 @@ class Crawler:
         return engine
 
     def _create_stats(self):
-        stats = StatsCollector(self)
+        stats = load_class(self.settings.get("STATS_COLLECTOR"))(self)
         stats["start_time"] = now()
         return stats
 
@@ -52,6 +58,8 @@ class Crawler:
         self.subscriber.subscriber(spider.spider_opened, event=spider_opened)
         self.subscriber.subscriber(spider.spider_closed, event=spider_closed)
         merge_settings(self.spider_cls, self.settings)
+        if self.shard is not None:
+            self.shard.update_settings(self.settings)
 
     async def close(self, reason="finished"):
         asyncio.create_task(self.subscriber.notify(spider_closed))
@@ -79,15 +87,28 @@ class CrawlerProcess:
     async def start(self):
         await asyncio.gather(*self._active)
 
-    def _create_crawler(self, spider_cls) -> Crawler:
+    def _create_crawler(self, spider_cls) -> Crawler | ShardedCrawler:
         if isinstance(spider_cls, str):
             raise SpiderTypeError(f"{type(self)}.crawl args: String is not supported.")
+        settings = self.settings.copy()
+        merge_settings(spider_cls, settings)
+        processes = settings.getint("CRAWLER_PROCESSES", 1)
+        if processes == 0:
+            processes = os.cpu_count() or 1
+        if processes > 1:
+            return ShardedCrawler(spider_cls, self.settings, processes)
         crawler = Crawler(spider_cls, self.settings)
         return crawler
 
     def _shutdown(self, signum, frame):
+        loop = asyncio.get_event_loop()
         for crawler in self.crawlers:
+            if crawler.engine is None:
+                # 多进程抓取时子进程自己处理 ctrl + c
+                continue
             crawler.engine.running = False
             crawler.engine.normal = False
+            # 信号处理函数不在事件循环中执行, 需要线程安全地唤醒等待中的引擎
+            loop.call_soon_threadsafe(crawler.engine.wakeup)
             crawler.stats.close_spider(crawler.spider, "ctrl + c")
         logger.warning(f"sipders received `ctrl + c` signal, closed.")
@@ -0,0 +1,41 @@
+import os
+from bald_spider.utils.log import get_logger
+from bald_spider.utils.request import request_fingerprint
+
+
+class BaseDupeFilter:
+    def __init__(self, crawler) -> None:
+        self.crawler = crawler
+        self.logger = get_logger(self.__class__.__name__, crawler.settings.get("LOG_LEVEL"))
+        self.jobdir = crawler.settings.get("JOBDIR")
+
+    def _jobdir_path(self, name) -> str | None:
+        return os.path.join(self.jobdir, name) if self.jobdir else None
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls(crawler)
+
+    def request_seen(self, request) -> bool:
+        fp = request_fingerprint(request)
+        if fp in self:
+            return True
+        self.add(fp)
+        return False
+
+    def add(self, fp: bytes) -> None:
+        raise NotImplementedError
+
+    def __contains__(self, fp: bytes) -> bool:
+        raise NotImplementedError
+
+    def log(self, request) -> None:
+        self.logger.debug(f"Filtered duplicate request: {request}")
+        self.crawler.stats.inc_value("request_dupe_count")
+
+    def checkpoint(self) -> None:
+        """把去重状态保存到 JOBDIR"""
+        pass
+
+    def close(self) -> None:
+        self.checkpoint()
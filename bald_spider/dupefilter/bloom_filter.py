@@ -0,0 +1,73 @@
+from math import ceil, log
+import os
+import pickle
+from bald_spider.dupefilter import BaseDupeFilter
+
+
+class BloomDupeFilter(BaseDupeFilter):
+    """
+    布隆过滤器去重, 内存占用只和容量、误判率有关, 适合上亿级别的url.
+    误判只会导致少量新请求被当成重复请求丢弃, 不会重复下载.
+    """
+
+    def __init__(self, crawler) -> None:
+        super().__init__(crawler)
+        self.capacity = crawler.settings.getint("BLOOM_CAPACITY")
+        self.error_rate = crawler.settings.getfloat("BLOOM_ERROR_RATE")
+        if self.capacity <= 0 or not 0 < self.error_rate < 1:
+            raise ValueError(
+                f"invalid bloom filter config: capacity={self.capacity}, error_rate={self.error_rate}"
+            )
+        self.num_bits = ceil(-self.capacity * log(self.error_rate) / (log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+        self.path = self._jobdir_path("requests.bloom")
+        if self.path and os.path.exists(self.path):
+            self._load()
+        self.logger.info(
+            f"bloom filter: capacity {self.capacity}, error rate {self.error_rate}, "
+            f"{len(self.bits) / 1024 / 1024:.1f} MB, {self.num_hashes} hashes"
+        )
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+        if (state["num_bits"], state["num_hashes"]) != (self.num_bits, self.num_hashes):
+            self.logger.warning(f"bloom filter config changed, ignore saved state {self.path}")
+            return
+        self.bits, self.count = state["bits"], state["count"]
+        self.logger.info(f"restored {self.count} fingerprints from {self.path}")
+
+    def checkpoint(self) -> None:
+        if not self.path:
+            return
+        state = {"num_bits": self.num_bits, "num_hashes": self.num_hashes, "bits": self.bits, "count": self.count}
+        with open(self.path + ".tmp", "wb") as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(self.path + ".tmp", self.path)
+
+    def _positions(self, fp: bytes):
+        # 双重哈希: 用指纹的两段生成 k 个位置
+        h1 = int.from_bytes(fp[:8], "little")
+        h2 = int.from_bytes(fp[8:16], "little") | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, fp: bytes) -> None:
+        bits = self.bits
+        for pos in self._positions(fp):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+        if self.count == self.capacity:
+            self.logger.warning(f"bloom filter is full ({self.capacity}), false positive rate will grow.")
+
+    def __contains__(self, fp: bytes) -> bool:
+        bits = self.bits
+        for pos in self._positions(fp):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __len__(self) -> int:
+        return self.count
@@ -0,0 +1,44 @@
+import os
+from typing import List, Set
+from bald_spider.dupefilter import BaseDupeFilter
+
+
+class MemoryDupeFilter(BaseDupeFilter):
+    """精确去重, 内存中保存每个请求的 20 字节指纹"""
+
+    FP_SIZE = 20
+
+    def __init__(self, crawler) -> None:
+        super().__init__(crawler)
+        self.fingerprints: Set[bytes] = set()
+        self._unsaved: List[bytes] = []
+        self.path = self._jobdir_path("requests.seen")
+        if self.path and os.path.exists(self.path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        size = self.FP_SIZE
+        # 只读取完整的指纹, 忽略写了一半的尾部
+        self.fingerprints.update(data[i : i + size] for i in range(0, len(data) - size + 1, size))
+        self.logger.info(f"restored {len(self.fingerprints)} fingerprints from {self.path}")
+
+    def add(self, fp: bytes) -> None:
+        self.fingerprints.add(fp)
+        if self.path:
+            self._unsaved.append(fp)
+
+    def __contains__(self, fp: bytes) -> bool:
+        return fp in self.fingerprints
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def checkpoint(self) -> None:
+        # 指纹文件只追加上次保存之后新增的部分
+        if not self.path or not self._unsaved:
+            return
+        with open(self.path, "ab") as f:
+            f.write(b"".join(self._unsaved))
+        self._unsaved.clear()
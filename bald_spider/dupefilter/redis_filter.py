@@ -0,0 +1,40 @@
+from bald_spider.dupefilter import BaseDupeFilter
+from bald_spider.utils.redis_client import RedisError, redis_client, redis_key
+from bald_spider.utils.request import request_fingerprint
+
+
+class RedisDupeFilter(BaseDupeFilter):
+    """
+    多个节点共享的去重集合(Redis 集合), 一次 SADD 同时完成判断和记录.
+    Redis 不可用时当作没有见过, 宁可重复抓取也不丢失请求.
+    """
+
+    def __init__(self, crawler) -> None:
+        super().__init__(crawler)
+        self.client = redis_client(crawler)
+        self.key = redis_key(crawler, "dupefilter")
+        self._available = True
+
+    def request_seen(self, request) -> bool:
+        try:
+            seen = self.client.execute("SADD", self.key, request_fingerprint(request)) == 0
+        except RedisError as exc:
+            if self._available:
+                self._available = False
+                self.logger.error(f"redis unavailable, requests are not filtered: {exc}")
+            return False
+        self._available = True
+        return seen
+
+    def add(self, fp: bytes) -> None:
+        self.client.execute("SADD", self.key, fp)
+
+    def __contains__(self, fp: bytes) -> bool:
+        return self.client.execute("SISMEMBER", self.key, fp) == 1
+
+    def __len__(self) -> int:
+        return self.client.execute("SCARD", self.key)
+
+    def close(self) -> None:
+        super().close()
+        self.client.close()
@@ -42,3 +42,15 @@ class IgnoreRequest(Exception):
 
 class NotConfigured(Exception):
     pass
+
+
+class PipelineInitError(Exception):
+    pass
+
+
+class DropItem(Exception):
+    pass
+
+
+class DownloadSizeError(IgnoreRequest):
+    pass
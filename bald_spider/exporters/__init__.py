@@ -0,0 +1,54 @@
+import csv
+import io
+from typing import BinaryIO, List
+from bald_spider.items.items import Item
+from bald_spider.utils import json_backend
+
+
+class BaseExporter:
+    """把 item 写进一个二进制流, 每个输出文件对应一个 exporter"""
+
+    def __init__(self, stream: BinaryIO, *, fields: List[str] | None = None, encoding: str = "utf-8") -> None:
+        self.stream = stream
+        self.fields = fields
+        self.encoding = encoding
+
+    def start(self) -> None:
+        pass
+
+    def export_item(self, item: Item) -> None:
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        pass
+
+
+class JsonLinesExporter(BaseExporter):
+    def export_item(self, item: Item) -> None:
+        values = item.to_dict()
+        if self.fields:
+            values = {field: values.get(field) for field in self.fields}
+        self.stream.write(json_backend.dumps(values) + b"\n")
+
+
+class CsvExporter(BaseExporter):
+    def __init__(self, stream: BinaryIO, **kwargs) -> None:
+        super().__init__(stream, **kwargs)
+        self._text = io.TextIOWrapper(stream, encoding=self.encoding, newline="", write_through=True)
+        self._writer = csv.writer(self._text)
+
+    def export_item(self, item: Item) -> None:
+        values = item.to_dict()
+        if self.fields is None:
+            # 没有指定 FEED_FIELDS 时使用第一个 item 定义的字段
+            self.fields = list(item.FIELDS)
+            self._writer.writerow(self.fields)
+        self._writer.writerow([values.get(field, "") for field in self.fields])
+
+    def start(self) -> None:
+        if self.fields:
+            self._writer.writerow(self.fields)
+
+    def finish(self) -> None:
+        # 底层流由调用方关闭
+        self._text.detach()
@@ -2,6 +2,21 @@ from typing import Dict, Callable
 
 
 class Request:
+    # 待抓取的请求可能有上百万个, 用 __slots__ 去掉实例 __dict__, headers 和 meta 第一次访问时才创建
+    __slots__ = (
+        "url",
+        "callback",
+        "priority",
+        "method",
+        "cookie",
+        "proxy",
+        "body",
+        "encoding",
+        "dont_filter",
+        "_headers",
+        "_meta",
+    )
+
     def __init__(
         self,
         url: str,
@@ -15,9 +30,10 @@ class Request:
         body="",
         encoding="utf-8",
         meta: Dict | None = None,
+        dont_filter: bool = False,
     ):
         self.url = url
-        self.headers = headers if headers else {}
+        self._headers = headers or None
         self.callback = callback
         self.priority = priority
         self.method = method
@@ -25,7 +41,23 @@ class Request:
         self.proxy = proxy
         self.body = body
         self.encoding = encoding
-        self._meta = meta if meta is not None else {}
+        self._meta = meta
+        self.dont_filter = dont_filter
+
+    def replace(self, **kwargs):
+        """复制一个请求, 用 kwargs 覆盖部分属性, meta 和 headers 是浅拷贝"""
+        for name in ("url", "callback", "priority", "method", "cookie", "proxy", "body", "encoding", "dont_filter"):
+            kwargs.setdefault(name, getattr(self, name))
+        if "headers" not in kwargs and self._headers:
+            kwargs["headers"] = dict(self._headers)
+        if "meta" not in kwargs and self._meta:
+            kwargs["meta"] = dict(self._meta)
+        return type(self)(**kwargs)
+
+    def copy(self):
+        return self.replace()
+
+    __copy__ = copy
 
     def __str__(self):
         return f" {self.url} {self.method}"
@@ -34,5 +66,35 @@ class Request:
         return slef.priority < other.priority
 
     @property
-    def meta(self):
+    def headers(self) -> Dict:
+        if self._headers is None:
+            self._headers = {}
+        return self._headers
+
+    @headers.setter
+    def headers(self, value: Dict | None):
+        self._headers = value
+
+    @property
+    def meta(self) -> Dict:
+        if self._meta is None:
+            self._meta = {}
         return self._meta
+
+    @property
+    def headers_or_none(self) -> Dict | None:
+        """没有 headers 时返回 None, 不会创建空字典"""
+        return self._headers
+
+    @property
+    def meta_or_none(self) -> Dict | None:
+        """没有 meta 时返回 None, 不会创建空字典"""
+        return self._meta
+
+    def get_meta(self, key, default=None):
+        """读取 meta 中的值, 没有 meta 的请求不会创建空字典"""
+        return self._meta.get(key, default) if self._meta else default
+
+    def pop_meta(self, key, default=None):
+        """取出并删除 meta 中的值, 没有 meta 的请求不会创建空字典"""
+        return self._meta.pop(key, default) if self._meta else default
@@ -1,62 +1,192 @@
-from typing import Dict
-from bald_spider import Request
-import ujson
 import re
-from parsel import Selector
-from urllib.parse import urljoin as _urljoin
-from bald_spider.exceptions import DecodeError
+from re import Pattern
+from typing import Dict, Iterator, List, Mapping, Sequence
+from bald_spider import Request
+from parsel import Selector, SelectorList
+from parsel.utils import extract_regex
+from urllib.parse import urljoin as _urljoin, urlsplit
+from bald_spider.utils import html, json_backend
+from bald_spider.utils.encoding import SNIFF_SIZE, bom_encoding, decode_body, declared_encoding, header_encoding
+
+_MISSING = object()
+_XML_DECLARATION = re.compile(rb"\s*<\?xml\s")
 
 
 class Response:
+    __slots__ = (
+        "url",
+        "request",
+        "_headers",
+        "_body",
+        "status_code",
+        "_encoding",
+        "_text_cache",
+        "_json_cache",
+        "_selector",
+    )
+
     def __init__(
         self,
         url: str,
         *,
         request: Request,
-        headers: Dict,
-        body: bytes = b"",
+        headers: Mapping | None = None,
+        body: bytes | memoryview = b"",
         status_code: int = 200,
     ):
         self.url = url
         self.request = request
-        self.headers = headers
-        self.body = body
+        # 直接保存下载器返回的(大小写不敏感的)响应头, 不再复制成 dict
+        self._headers = headers
+        # 超过 DOWNLOAD_SPILL_SIZE 的响应体是 mmap 的 memoryview, 第一次访问 body 时才复制成 bytes
+        self._body = body
         self.status_code = status_code
-        self.encoding = request.encoding
+        self._encoding = None
         self._text_cache = None
+        self._json_cache = _MISSING
         self._selector = None
 
     @property
-    def text(self):
-        if self._text_cache:
-            return self._text_cache
-        try:
-            self._text_cache = self.body.decode(self.encoding)
-        except UnicodeDecodeError:
-            try:
-                _encoding_re = re.compile(r"charset=([\w-]+)", flags=re.I)
-                _encoding_string = self.headers.get("Content-Type", "") or self.headers.get("content-type", "")
-                _encoding = _encoding_re.search(_encoding_string)
-                if _encoding:
-                    _encoding = _encoding.group(1)
-                    self._text_cache = self.body.decode(self.encoding)
-                else:
-                    raise DecodeError(f"can not decode {self.body} with {self.encoding}")
-            except UnicodeDecodeError as exc:
-                raise UnicodeDecodeError(exc.encoding, exc.object, exc.start, exc.end, f"{self.request}")
+    def body(self) -> bytes:
+        if type(self._body) is not bytes:
+            self._body = bytes(self._body)
+        return self._body
+
+    @body.setter
+    def body(self, value: bytes | memoryview):
+        self._body = value
+
+    @property
+    def body_view(self) -> memoryview:
+        """不复制的只读视图, 大响应体直接是 mmap, 解码和解析使用"""
+        return self._body if type(self._body) is memoryview else memoryview(self._body)
+
+    @property
+    def text(self) -> str:
+        if self._text_cache is None:
+            self._text_cache, self._encoding = decode_body(
+                self.body_view, self._content_type(), self.request.encoding, urlsplit(self.url).hostname
+            )
         return self._text_cache
 
-    def xpath(self, xpath_sting):
+    @property
+    def encoding(self) -> str:
+        """实际使用的编码, 有 BOM 或者声明了编码时不需要解码响应体"""
+        if self._encoding is None:
+            if (declared := declared_encoding(bytes(self.body_view[:SNIFF_SIZE]), self._content_type())) is not None:
+                self._encoding = declared[0]
+            else:
+                self.text
+        return self._encoding
+
+    def _content_type(self) -> str | None:
+        return self.headers.get("Content-Type") or self.headers.get("content-type")
+
+    @property
+    def selector(self) -> Selector:
+        """第一次使用时解析, utf-8 的响应体直接交给 lxml, 不用先解码再编码"""
         if self._selector is None:
-            self._selector = Selector(self.text)
-        return self._selector.xpath(xpath_sting)
+            body = self.body_view
+            # 指定类型, 避免 parsel 先尝试按 JSON 解析整个响应体
+            type_ = "xml" if _XML_DECLARATION.match(bytes(body[:256])) else "html"
+            if body and self.encoding == "utf-8" and bom_encoding(bytes(body[:3])) is None:
+                self._selector = Selector(body=self.body, type=type_, encoding="utf-8", base_url=self.url)
+            else:
+                self._selector = Selector(text=self.text, type=type_, base_url=self.url)
+        return self._selector
+
+    def xpath(self, query: str, **kwargs) -> SelectorList:
+        # 编译后的 xpath 和 css 转换结果由 parsel 在进程内缓存
+        return self.selector.xpath(query, **kwargs)
+
+    def css(self, query: str) -> SelectorList:
+        return self.selector.css(query)
+
+    def re(self, regex: str | Pattern, replace_entities: bool = True) -> List[str]:
+        """直接在文本上匹配, 不需要解析"""
+        return extract_regex(regex, self.text, replace_entities)
+
+    def re_first(self, regex: str | Pattern, default: str | None = None, replace_entities: bool = True) -> str | None:
+        matches = self.re(regex, replace_entities)
+        return matches[0] if matches else default
+
+    def title(self) -> str | None:
+        """快速提取, 不解析 DOM"""
+        return html.get_title(self.text)
+
+    def links(self) -> List[str]:
+        """页面中 <a href> 的绝对地址, 快速提取, 不解析 DOM"""
+        return html.urljoin_all(self.base_url(), html.get_links(self.text))
+
+    def base_url(self) -> str:
+        """<base href> 指定的地址, 没有时就是 url, 拼接相对链接时使用"""
+        base = html.get_base_url(self.text)
+        return _urljoin(self.url, base) if base else self.url
+
+    def html_meta(self) -> Dict[str, str]:
+        """<meta name=... content=...>, 快速提取, 不解析 DOM"""
+        return html.get_meta(self.text)
 
     def json(self):
-        return ujson.loads(self.text)
+        """直接从 bytes 解析, 结果会缓存"""
+        if self._json_cache is _MISSING:
+            data = self._json_body()
+            try:
+                self._json_cache = json_backend.loads(data)
+            except ValueError:
+                # 没有声明编码的非 utf-8 JSON, 按识别出的编码解码后再解析
+                if isinstance(data, str) or self.encoding == "utf-8":
+                    raise
+                self._json_cache = json_backend.loads(self.text)
+        return self._json_cache
+
+    def iter_json(self, path: str | Sequence[str] = ()) -> Iterator:
+        """
+        逐个返回 JSON 数组中的元素, 不构建整个对象树, 适合很大的数组.
+        path 是数组所在的 key, 如 "data.items" 或 ("data", "items")
+        """
+        if isinstance(path, str):
+            path = path.split(".") if path else ()
+        if self._json_cache is not _MISSING:
+            value = self._json_cache
+            for key in path:
+                value = value.get(key, ()) if isinstance(value, dict) else ()
+            return iter(value)
+        data = self._json_body()
+        return json_backend.iter_array(data.encode() if isinstance(data, str) else data, path)
+
+    def _json_body(self) -> bytes | memoryview | str:
+        """JSON 只能是 utf-8/16/32, utf-8 直接使用 bytes, 其他编码先解码"""
+        body = self._body
+        if (bom := bom_encoding(bytes(body[:4]))) is not None:
+            return body[bom[1] :] if bom[0] == "utf-8" else self.text
+        content_type = self._content_type()
+        if header_encoding(content_type) not in (None, "utf-8", "cp1252"):
+            return self.text
+        return body
 
     def urljoin(self, url):
         return _urljoin(self.url, url)
 
+    def replace(self, **kwargs):
+        """复制一个响应, 用 kwargs 覆盖部分属性"""
+        for name in ("url", "request", "status_code"):
+            kwargs.setdefault(name, getattr(self, name))
+        kwargs.setdefault("body", self._body)
+        kwargs.setdefault("headers", self._headers)
+        return type(self)(**kwargs)
+
+    def copy(self):
+        return self.replace()
+
+    __copy__ = copy
+
+    @property
+    def headers(self) -> Mapping:
+        if self._headers is None:
+            self._headers = {}
+        return self._headers
+
     def __str__(self):
         return f"<Response {self.status_code} {self.url}>"
 
@@ -8,7 +8,10 @@ class Field(dict):
 class ItemMeta(ABCMeta):
 
     def __new__(mcs, name, bases, attrs):
+        # 继承父类的字段, 子类同名字段覆盖父类
         field = dict()
+        for base in reversed(bases):
+            field.update(getattr(base, "FIELDS", {}))
         # 创建一个新的属性字典，移除 Field 实例
         new_attrs = {}
         for key, value in attrs.items():
@@ -16,7 +19,9 @@ class ItemMeta(ABCMeta):
                 field[key] = value
             else:
                 new_attrs[key] = value
-        
+        # 字段值按下标存放在 _values 列表中, 子类不再需要 __dict__
+        new_attrs.setdefault("__slots__", ())
         cls_instance = super().__new__(mcs, name, bases, new_attrs)
         cls_instance.FIELDS = field
+        cls_instance._index = {key: i for i, key in enumerate(field)}
         return cls_instance
@@ -4,77 +4,123 @@ from collections.abc import MutableMapping
 from bald_spider.exceptions import ItemAttribuError, ItemInError
 from bald_spider.items import Field, ItemMeta
 
+# 字段未赋值
+_MISSING = object()
+_set_values = object.__setattr__
+
+
+def _rebuild(cls, values):
+    return cls(**values)
+
 
 class Item(MutableMapping, metaclass=ItemMeta):
 
+    __slots__ = ("_values",)
+
     FIELDS: dict
+    _index: dict
 
     def __init__(self, *args, **kwargs) -> None:
-        self._values = {}
         if args:
             raise ItemInError(f"{self.__class__.__name__} : position args is not suppored,use keywords args.")
+        values = [_MISSING] * len(self._index)
+        _set_values(self, "_values", values)
         if kwargs:
+            index = self._index
             for key, value in kwargs.items():
-                self[key] = value
+                try:
+                    values[index[key]] = value
+                except KeyError:
+                    raise KeyError(f"{self.__class__.__name__} does not support field: {key}") from None
 
     def __setitem__(self, key, value):
-        if key in self.FIELDS:
-            self._values[key] = value
-        else:
-            raise KeyError(f"{self.__class__.__name__} does not support field: {key}")
+        try:
+            self._values[self._index[key]] = value
+        except KeyError:
+            raise KeyError(f"{self.__class__.__name__} does not support field: {key}") from None
 
     def __repr__(self) -> str:
-        return pformat(dict(self))
+        return pformat(self.to_dict())
 
     def __getitem__(self, key):
-        return self._values[key]
+        value = self._values[self._index[key]]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
 
     def __delitem__(self, key):
-        del self._values[key]
+        i = self._index[key]
+        if self._values[i] is _MISSING:
+            raise KeyError(key)
+        self._values[i] = _MISSING
+
+    def __contains__(self, key):
+        i = self._index.get(key)
+        return i is not None and self._values[i] is not _MISSING
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        if i is None:
+            return default
+        value = self._values[i]
+        return default if value is _MISSING else value
 
     def __setattr__(self, key, value):
-        # 允许设置内部属性：以 _ 开头的，或者特定的内部属性
-        if key.startswith("_") or key in ["values"]:
-            super().__setattr__(key, value)
-        else:
+        if key in self.FIELDS:
             raise AttributeError(f"use item[{key!r}]={value!r} to set field value.")
+        super().__setattr__(key, value)
 
     def __getattr__(self, item):
+        # 只有正常的属性查找失败时才会调用, 不影响方法和 _values 的访问速度
+        if item in self.FIELDS:
+            raise ItemAttribuError(f"use item[{item!r}] to get field value.")
         raise AttributeError(
             f"{self.__class__.__name__} does not support field: {item}."
             f"please add the `{item}` field to the {self.__class__.__name__},"
             f"and use item `{item!r}` to get field value!"
         )
 
-    def __getattribute__(self, item):
-        # 检查是否是字段访问
-        fields = super().__getattribute__("FIELDS")
-        if item in fields:
-            raise ItemAttribuError(f"use item[{item!r}] to get field value.")
-        else:
-            return super().__getattribute__(item)
-
     __str__ = __repr__
 
     def __iter__(self):
-        return iter(self._values)
+        return (key for key, value in zip(self._index, self._values) if value is not _MISSING)
 
     def __len__(self):
-        return len(self._values)
+        return len(self._values) - self._values.count(_MISSING)
+
+    def __reduce__(self):
+        return _rebuild, (self.__class__, self.to_dict())
 
     def to_dict(self):
-        return dict(self)
+        return {key: value for key, value in zip(self._index, self._values) if value is not _MISSING}
 
     def copy(self):
+        """浅拷贝, 字段值本身不复制"""
+        item = self.__class__.__new__(self.__class__)
+        _set_values(item, "_values", self._values.copy())
+        return item
+
+    __copy__ = copy
+
+    def deepcopy(self):
         return deepcopy(self)
 
 
+class FileItem(Item):
+    """文件下载(meta["download_file"]=True)的结果, path 按内容哈希命名"""
+
+    url = Field()
+    path = Field()
+    checksum = Field()
+    size = Field()
+
+
 if __name__ == "__main__":
 
     class TestItem(Item):
         url = Field()
         title = Field()
 
-    test_item = TestItem("www.baidu.com")
+    test_item = TestItem(url="www.baidu.com")
     # test_item["url"] = "www.baidu.com"
     print(test_item["url"])
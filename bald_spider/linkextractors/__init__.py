@@ -0,0 +1,132 @@
+"""
+从响应中提取链接并生成请求.
+链接用正则一次扫描提取(不解析 DOM), 批量拼接绝对地址, allow/deny 正则和域名规则预先编译成一个正则,
+同一个页面中重复的链接只保留第一个.
+
+    link_extractor = LinkExtractor(allow=r"/detail/[0-9]+", allow_domains="example.com")
+
+    def parse(self, response):
+        yield from link_extractor.extract_requests(response, callback=self.parse_detail)
+"""
+
+import re
+from typing import Callable, Iterable, List
+from bald_spider import Request
+from bald_spider.http.response import Response
+from bald_spider.utils.html import get_links, urljoin_all
+from bald_spider.utils.request import canonicalize_url
+
+# 默认忽略的文件扩展名
+IGNORED_EXTENSIONS = (
+    # 图片
+    "mng", "pct", "bmp", "gif", "jpg", "jpeg", "png", "pst", "psp", "tif", "tiff", "ai", "drw", "dxf", "eps", "ps",
+    "svg", "cdr", "ico", "webp", "avif",
+    # 音频
+    "mp3", "wma", "ogg", "wav", "ra", "aac", "mid", "au", "aiff", "flac", "m4a",
+    # 视频
+    "3gp", "asf", "asx", "avi", "mov", "mp4", "mpg", "qt", "rm", "swf", "wmv", "m4v", "flv", "webm", "mkv",
+    # 文档
+    "xls", "xlsx", "ppt", "pptx", "pps", "doc", "docx", "odt", "ods", "odg", "odp", "pdf",
+    # 其他
+    "css", "exe", "bin", "rss", "dmg", "iso", "apk", "jar", "zip", "rar", "gz", "tar", "7z", "bz2", "xz", "woff",
+    "woff2", "ttf", "eot",
+)
+
+_HOST_RE = re.compile(r"https?://(?:[^/?#@]*@)?([^/?#:]*)", re.I)
+
+
+def _as_list(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (str, re.Pattern)):
+        return [value]
+    return list(value)
+
+
+def _compile(patterns) -> re.Pattern | None:
+    """多个正则合并成一个, 每个链接只需要匹配一次"""
+    patterns = [p.pattern if isinstance(p, re.Pattern) else p for p in _as_list(patterns)]
+    return re.compile("|".join(f"(?:{p})" for p in patterns)) if patterns else None
+
+
+def _compile_domains(domains) -> re.Pattern | None:
+    """域名规则包括子域名, 如 example.com 匹配 example.com 和 www.example.com"""
+    domains = [re.escape(d.lower().strip(".")) for d in _as_list(domains)]
+    return re.compile(rf"(?:^|\.)(?:{'|'.join(domains)})$") if domains else None
+
+
+class LinkExtractor:
+    def __init__(
+        self,
+        allow: str | Iterable[str] = (),
+        deny: str | Iterable[str] = (),
+        allow_domains: str | Iterable[str] = (),
+        deny_domains: str | Iterable[str] = (),
+        deny_extensions: Iterable[str] | None = None,
+        canonicalize: bool = False,
+        unique: bool = True,
+    ) -> None:
+        self.allow = _compile(allow)
+        self.deny = _compile(deny)
+        self.allow_domains = _compile_domains(allow_domains)
+        self.deny_domains = _compile_domains(deny_domains)
+        extensions = IGNORED_EXTENSIONS if deny_extensions is None else _as_list(deny_extensions)
+        self.deny_extensions = frozenset(ext.lower().lstrip(".") for ext in extensions)
+        self.canonicalize = canonicalize
+        self.unique = unique
+
+    def extract_links(self, response: Response) -> List[str]:
+        """返回符合规则的绝对地址, 按在页面中出现的顺序"""
+        links = urljoin_all(response.base_url(), get_links(response.text))
+        allow, deny = self.allow, self.deny
+        allow_domains, deny_domains = self.allow_domains, self.deny_domains
+        deny_extensions = self.deny_extensions
+        unique, canonicalize = self.unique, self.canonicalize
+        check_domain = allow_domains is not None or deny_domains is not None
+        host_match = _HOST_RE.match
+        seen = set()
+        result = []
+        for url in links:
+            if "#" in url:
+                url = url.partition("#")[0]
+            if (host := host_match(url)) is None:
+                # mailto: javascript: 等不是 http(s) 的链接
+                continue
+            if canonicalize:
+                url = canonicalize_url(url)
+            if unique:
+                if url in seen:
+                    continue
+                seen.add(url)
+            if check_domain:
+                host = host.group(1).lower()
+                if allow_domains is not None and not allow_domains.search(host):
+                    continue
+                if deny_domains is not None and deny_domains.search(host):
+                    continue
+            if deny_extensions:
+                path = url.partition("?")[0]
+                dot = path.rfind(".")
+                if dot > path.rfind("/") and path[dot + 1 :].lower() in deny_extensions:
+                    continue
+            if allow is not None and not allow.search(url):
+                continue
+            if deny is not None and deny.search(url):
+                continue
+            result.append(url)
+        return result
+
+    def extract_requests(self, response: Response, callback: Callable | None = None, **kwargs) -> List[Request]:
+        """返回可以直接 yield 的请求, kwargs 传给 Request, meta 和 headers 每个请求复制一份"""
+        meta = kwargs.pop("meta", None)
+        headers = kwargs.pop("headers", None)
+        return [
+            Request(
+                url,
+                callback=callback,
+                meta=dict(meta) if meta else None,
+                headers=dict(headers) if headers else None,
+                **kwargs,
+            )
+            for url in self.extract_links(response)
+        ]
@@ -0,0 +1,83 @@
+"""
+自动限速中间件:
+1、根据每个域名的响应延迟调整下载间隔, 让同时在途的请求数接近 AUTOTHROTTLE_TARGET_CONCURRENCY
+2、响应正常时逐步放大域名并发和全局并发, 出现 429/5xx 或者下载异常时减半并发、加倍下载间隔
+"""
+
+from bald_spider.exceptions import NotConfigured
+from bald_spider.utils.log import get_logger
+
+
+class AutoThrottle:
+    def __init__(self, crawler) -> None:
+        settings = crawler.settings
+        if not settings.getbool("AUTOTHROTTLE_ENABLED"):
+            raise NotConfigured
+        self.crawler = crawler
+        self.target_concurrency = settings.getfloat("AUTOTHROTTLE_TARGET_CONCURRENCY")
+        if self.target_concurrency <= 0:
+            raise NotConfigured
+        self.min_delay = settings.getfloat("DOWNLOAD_DELAY")
+        self.max_delay = settings.getfloat("AUTOTHROTTLE_MAX_DELAY")
+        self.max_concurrency = settings.getint("AUTOTHROTTLE_MAX_CONCURRENCY")
+        # CONCURRENCY_PER_DOMAIN 只是初始值, 响应正常时域名并发可以一直增加到这个上限
+        self.max_slot_concurrency = settings.getint("AUTOTHROTTLE_MAX_CONCURRENCY_PER_DOMAIN") or self.max_concurrency
+        self.debug = settings.getbool("AUTOTHROTTLE_DEBUG")
+        self.slots = crawler.engine.downloader.slots
+        self.task_manager = crawler.engine.task_manager
+        self.slots.delay = max(self.min_delay, settings.getfloat("AUTOTHROTTLE_START_DELAY"))
+        # 全局并发用浮点数累加, 每个窗口(limit 个响应)最多增加 1
+        self._limit = float(self.task_manager.semaphore.limit)
+        self._cooldown = 0
+        self.logger = get_logger(self.__class__.__name__, settings.get("LOG_LEVEL"))
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls(crawler)
+
+    def process_response(self, request, response, spider):
+        latency = request.meta.get("download_latency")
+        if response.status_code == 429 or response.status_code >= 500:
+            self._backoff(request, f"response code: {response.status_code}")
+        elif latency is not None:
+            self._speedup(request, latency)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self._backoff(request, type(exception).__name__)
+
+    def _speedup(self, request, latency):
+        slot = self.slots.slot_for(request)
+        if slot is None:
+            return
+        old_delay, old_concurrency = slot.delay, slot.concurrency
+        # 目标间隔 = 延迟 / 目标在途数, 和当前间隔取平均做平滑
+        target_delay = latency / self.target_concurrency
+        slot.delay = min(max(self.min_delay, (slot.delay + target_delay) / 2), self.max_delay)
+        if slot.active >= slot.concurrency and slot.concurrency < self.max_slot_concurrency:
+            slot.concurrency += 1
+        if self._cooldown:
+            self._cooldown -= 1
+        elif self.task_manager.semaphore.locked() and self._limit < self.max_concurrency:
+            self._limit = min(self._limit + 1 / self._limit, self.max_concurrency)
+            self.task_manager.resize(int(self._limit))
+        if self.debug:
+            self.logger.info(
+                f"slot: {slot.key} | latency: {latency * 1000:.0f} ms | "
+                f"delay: {old_delay * 1000:.0f} -> {slot.delay * 1000:.0f} ms | "
+                f"concurrency: {old_concurrency} -> {slot.concurrency} | total: {int(self._limit)}"
+            )
+
+    def _backoff(self, request, reason):
+        slot = self.slots.slot_for(request)
+        if slot is not None:
+            slot.delay = min(max(slot.delay * 2, self.min_delay, 0.1), self.max_delay)
+            slot.concurrency = max(1, slot.concurrency // 2)
+        # 同一个窗口内只收缩一次全局并发, 避免一批错误把并发压到 1
+        if not self._cooldown:
+            self._limit = max(1.0, self._limit / 2)
+            self.task_manager.resize(int(self._limit))
+            self._cooldown = int(self._limit)
+        self.crawler.stats.inc_value("autothrottle/backoff_count")
+        if self.debug:
+            self.logger.info(f"{request} {reason}, back off: {slot} | total: {int(self._limit)}")
@@ -27,4 +27,3 @@ class DefaultHeader:
         if self.headers:
             for k, v in self.headers.items():
                 request.headers.setdefault(k, v)
-        return request
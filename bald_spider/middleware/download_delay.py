@@ -1,25 +1,20 @@
-import asyncio
-from random import uniform
 from bald_spider.exceptions import NotConfigured
 from bald_spider.utils.log import get_logger
 
 
 class DownloadDelay:
+    """
+    DOWNLOAD_DELAY 现在由调度器按下载槽位控制(见 bald_spider.core.downloader.slot),
+    在中间件里 sleep 会白白占用并发. 这个中间件只是为了兼容旧的 MIDDLEWARES 配置, 不会被启用.
+    """
+
     def __init__(self, settings, log_level) -> None:
-        self.delay = settings.getfloat("DOWNLOAD_DELAY")
-        if not self.delay:
-            raise NotConfigured
-        self.randomness = settings.getbool("RANDOMNESS")
-        self.floor, self.upper = settings.getlist("RANDEOM_RANGE")
         self.logger = get_logger(self.__class__.__name__, log_level)
+        if settings.getfloat("DOWNLOAD_DELAY"):
+            self.logger.debug("DOWNLOAD_DELAY is handled by the scheduler download slots.")
+        raise NotConfigured
 
     @classmethod
     def create_instance(cls, crawler):
         o = cls(settings=crawler.settings, log_level=crawler.settings.get("LOG_LEVEL"))
         return o
-
-    async def process_request(self, _request, _spider):
-        if self.randomness:
-            await asyncio.sleep(uniform(self.delay * self.floor, self.delay * self.upper))
-        else:
-            await asyncio.sleep(self.delay)
@@ -1,4 +1,6 @@
 from asyncio import create_task
+from inspect import iscoroutinefunction
+from time import perf_counter
 from types import MethodType
 from typing import Callable
 from bald_spider.exceptions import (
@@ -15,7 +17,6 @@ from bald_spider.utils.log import get_logger
 from bald_spider.utils.project import load_class
 from pprint import pformat
 from collections import defaultdict
-from bald_spider.utils.project import common_call
 from bald_spider.event import ignore_request, response_received
 
 
@@ -28,42 +29,62 @@ class MiddlewareManager:
         middlewares = self.crawler.settings.getlist("MIDDLEWARES")
         self._add_middlewares(middlewares)
         self._add_methods()
+        self._compile()
         self.download_method: Callable = crawler.engine.downloader.download
         self._stats = crawler.stats
+        # 只有自动限速用到下载延迟, 没有开启时不记录, 避免每个请求都创建 meta
+        self._record_latency = crawler.settings.getbool("AUTOTHROTTLE_ENABLED")
+
+    def _compile(self):
+        """启动时把中间件方法编译成 (方法, 是否协程) 的元组, 请求时不再判断协程和查找方法"""
+
+        def chain(methods):
+            return tuple((method, iscoroutinefunction(method)) for method in methods)
+
+        self._request_chain = chain(self.methods["process_request"])
+        self._response_chain = chain(reversed(self.methods["process_response"]))
+        self._exception_chain = chain(reversed(self.methods["process_exception"]))
 
     async def _process_request(self, request: Request):
-        for method in self.methods["process_request"]:
-            # result = method(request, self.crawler.spider)
-            result = await common_call(method, request, self.crawler.spider)
-            if result == None:
+        spider = self.crawler.spider
+        for method, is_async in self._request_chain:
+            result = await method(request, spider) if is_async else method(request, spider)
+            if result is None:
                 continue
             if isinstance(result, (Request, Response)):
                 return result
             raise InvalidOutputError(
                 f"middleware {method.__qualname__} must return Request, Response or None,got {type(result).__name__}"
             )
-        return await self.download_method(request)
+        if not self._record_latency:
+            return await self.download_method(request)
+        start = perf_counter()
+        response = await self.download_method(request)
+        request.meta["download_latency"] = perf_counter() - start
+        return response
 
     async def _process_response(self, request: Request, response: Response):
-        for method in reversed(self.methods["process_response"]):
+        spider = self.crawler.spider
+        for method, is_async in self._response_chain:
             try:
-                response = await common_call(method, request, response, self.crawler.spider)
+                response = await method(request, response, spider) if is_async else method(request, response, spider)
             except IgnoreRequest as exc:
-                create_task(self.crawler.subscriber.notify(ignore_request, exc, request, self.crawler.spider))
+                self._notify(ignore_request, exc, request, spider)
                 return None
             else:
-                if isinstance(response, Request):
-                    return response
                 if isinstance(response, Response):
                     continue
+                if isinstance(response, Request):
+                    return response
                 raise InvalidOutputError(
                     f"middleware {method.__qualname__} must return Request or Response,got {type(response).__name__}"
                 )
         return response
 
     async def _process_exception(self, request: Request, exception: Exception):
-        for method in reversed(self.methods["process_exception"]):
-            response = await common_call(method, request, exception, self.crawler.spider)
+        spider = self.crawler.spider
+        for method, is_async in self._exception_chain:
+            response = await method(request, exception, spider) if is_async else method(request, exception, spider)
             if response is None:
                 continue
             if isinstance(response, (Request, Response)):
@@ -76,25 +97,40 @@ class MiddlewareManager:
         else:
             raise exception
 
+    def _notify(self, event, *args):
+        # 没有订阅者时不创建任务
+        if self.crawler.subscriber.has_receivers(event):
+            create_task(self.crawler.subscriber.notify(event, *args))
+
     async def download(self, request: Request) -> Response | None:
+        response = await self.process(request)
+        if isinstance(response, Request):
+            await self.crawler.engine.enqueue_request(response)
+            return None
+        return response
+
+    async def process(self, request: Request) -> Response | Request | None:
+        """经过所有中间件下载, 中间件返回的新请求交给调用者处理"""
         try:
             response = await self._process_request(request)
         except KeyError:
             raise RequestMethodError(f"{request.method.lower()} is not supported.")
         except IgnoreRequest as exc:
-            create_task(self.crawler.subscriber.notify(ignore_request, exc, request, self.crawler.spider))
-            response = await self._process_exception(request, exc)
+            self._notify(ignore_request, exc, request, self.crawler.spider)
+            try:
+                response = await self._process_exception(request, exc)
+            except IgnoreRequest:
+                # 和响应阶段一致, 没有中间件处理的 IgnoreRequest 直接丢弃请求
+                self.logger.debug(f"{request} ignored: {exc}")
+                return None
         except Exception as exc:
             self._stats.inc_value(f"download_error/{exc.__class__.__name__}")
             response = await self._process_exception(request, exc)
         else:
-            create_task(self.crawler.subscriber.notify(response_received, response, self.crawler.spider))
-            self.crawler.stats.inc_value("response_received_count")
-        if isinstance(response, Response):
+            self._notify(response_received, response, self.crawler.spider)
+            self._stats.inc_value("response_received_count")
+        if self._response_chain and isinstance(response, Response):
             response = await self._process_response(request, response)
-        if isinstance(response, Request):
-            await self.crawler.engine.enqueue_request(request)
-            return None
         return response
 
     def _add_methods(self):
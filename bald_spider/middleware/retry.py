@@ -5,6 +5,9 @@
 3、请求期间报错的,我们需要手机这些错误,当捕获到这些异常的时候,就需要去进行重新请求.
 """
 
+import time
+from email.utils import parsedate_to_datetime
+from random import uniform
 from typing import List
 from asyncio.exceptions import TimeoutError
 from aiohttp import ClientConnectionError, ClientConnectorError, ClientResponseError, ClientTimeout
@@ -40,12 +43,18 @@ class Retry:
         max_retry_times: int,
         retry_exceptions: List,
         stats: StatsCollector,
+        priority_adjust: int = 1,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
     ):
         self.retry_http_codes = retry_http_codes
         self.ignore_http_codes = ignore_http_codes
         self.max_retry_times = max_retry_times
         self.retry_exceptions = tuple(retry_exceptions + _retry_exceptions)
         self.stats = stats
+        self.priority_adjust = priority_adjust
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
         self.logger = get_logger(self.__class__.__name__)
 
     @classmethod
@@ -56,33 +65,63 @@ class Retry:
             max_retry_times=crawler.settings.getint("MAX_RETRY_TIMES"),
             retry_exceptions=crawler.settings.getlist("RETRY_EXCEPTIONS"),
             stats=crawler.stats,
+            priority_adjust=crawler.settings.getint("RETRY_PRIORITY_ADJUST"),
+            backoff_base=crawler.settings.getfloat("RETRY_BACKOFF_BASE"),
+            backoff_max=crawler.settings.getfloat("RETRY_BACKOFF_MAX"),
         )
         return o
 
     def process_response(self, request, response, spider):
         if request.meta.get("dont_retry", False):
             return response
-        if response.status in self.ignore_http_codes:
+        if response.status_code in self.ignore_http_codes:
             return response
-        if response.status in self.retry_http_codes:
-            reason = f"response code: {response.status}"
-            return self._retry(request, reason, spider) or response
+        if response.status_code in self.retry_http_codes:
+            reason = f"response code: {response.status_code}"
+            return self._retry(request, reason, spider, self._retry_after(response)) or response
         return response
 
     def process_exception(self, request, exception, spider):
         if isinstance(exception, self.retry_exceptions) and not request.meta.get("dont_retry", False):
             return self._retry(request, type(exception).__name__, spider)
 
-    def _retry(self, request, reason, spider):
-        # TODO 去重的逻辑还没写,要保证重试的请求不要被请求过滤器给过滤掉
-        # 重新发起请求的优先级该怎么定
+    def _retry(self, request, reason, spider, retry_after: float | None = None):
         retry_times = request.meta.get("retry_times", 0)
         if retry_times < self.max_retry_times:
             retry_times += 1
-            self.logger.info(f"{spider} {request} {reason} retry {retry_times} time ...")
-            request.meta["retry_times"] = retry_times
+            delay = self._backoff(retry_times, retry_after)
+            self.logger.info(f"{spider} {request} {reason} retry {retry_times} time after {delay:.2f}s ...")
+            # 重试的请求指纹已经存在, 需要跳过去重; 优先级数值越大越靠后, 重试请求排到正常请求之后
+            retry_request = request.replace(priority=request.priority + self.priority_adjust, dont_filter=True)
+            retry_request.meta["retry_times"] = retry_times
+            # 由调度器延时放回队列, 等待期间不占用并发
+            retry_request.meta["schedule_delay"] = delay
             self.stats.inc_value(f"retry_count")
-            return request
+            return retry_request
         else:
             self.logger.warning(f"{spider} {request} {reason} retry max {self.max_retry_times} times, give up.")
+            self.stats.inc_value(f"retry_max_reached")
+            return None
+
+    def _backoff(self, retry_times: int, retry_after: float | None) -> float:
+        """指数退避加随机抖动, 服务端给了 Retry-After 时不早于它, 都不超过 RETRY_BACKOFF_MAX"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (retry_times - 1))
+        delay = uniform(delay / 2, delay)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    @staticmethod
+    def _retry_after(response) -> float | None:
+        value = response.headers.get("Retry-After") or response.headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        # HTTP-date 格式
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
             return None
@@ -0,0 +1,27 @@
+from bald_spider.items.items import Item
+
+
+class BasePipeline:
+    """
+    管道基类, 按需实现:
+    process_item(item, spider): 逐条处理, 返回 item 继续传递, 抛出 DropItem 丢弃
+    process_items(items, spider): 批量处理, 攒够 batch_size 条或者每隔 batch_interval 秒调用一次,
+        返回保留的 items 继续传递(返回 None 表示全部保留)
+    """
+
+    # 批量处理的条数和时间间隔, 为 None 时使用 ITEM_PIPELINE_BATCH_SIZE 和 ITEM_PIPELINE_BATCH_INTERVAL
+    batch_size: int | None = None
+    batch_interval: float | None = None
+
+    def open_spider(self, spider) -> None:
+        pass
+
+    def process_item(self, item, spider) -> Item:
+        pass
+
+    def close_spider(self, spider) -> None:
+        pass
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls()
@@ -0,0 +1,129 @@
+import asyncio
+import gzip
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, List
+from bald_spider.exceptions import NotConfigured
+from bald_spider.exporters import BaseExporter
+from bald_spider.items.items import Item
+from bald_spider.pipelines import BasePipeline
+from bald_spider.utils.log import get_logger
+from bald_spider.utils.project import load_class
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class FeedExportPipeline(BasePipeline):
+    """
+    把 item 导出到本地文件, 支持 jsonlines/csv, gzip/zstd 压缩, 按大小或条数切分文件.
+    序列化和写文件都在单独的写线程中进行, 不阻塞事件循环.
+    FEED_PATH 支持 {name}(爬虫名), {time}(启动时间), {part}(切分序号) 占位符.
+    """
+
+    def __init__(self, crawler) -> None:
+        settings = crawler.settings
+        self.crawler = crawler
+        self.logger = get_logger(self.__class__.__name__, settings.get("LOG_LEVEL"))
+        self.path: str = settings.get("FEED_PATH")
+        self.format: str = settings.get("FEED_FORMAT")
+        exporters = settings.getdict("FEED_EXPORTERS")
+        if self.format not in exporters:
+            raise NotConfigured(f"unknown FEED_FORMAT: {self.format}, available: {list(exporters)}")
+        self.exporter_cls = load_class(exporters[self.format])
+        self.fields: List[str] | None = settings.getlist("FEED_FIELDS") or None
+        self.encoding: str = settings.get("FEED_ENCODING")
+        self.buffer_size = settings.getint("FEED_BUFFER_SIZE")
+        self.compression: str | None = settings.get("FEED_COMPRESSION")
+        self.compression_level: int | None = settings.get("FEED_COMPRESSION_LEVEL")
+        if self.compression == "zstd" and zstandard is None:
+            self.logger.warning("FEED_COMPRESSION=zstd requires `zstandard` to be installed, fall back to gzip.")
+            self.compression = "gzip"
+        if self.compression not in (None, "gzip", "zstd"):
+            raise NotConfigured(f"unknown FEED_COMPRESSION: {self.compression}")
+        self.rotate_size = settings.getint("FEED_ROTATE_SIZE")
+        self.rotate_count = settings.getint("FEED_ROTATE_COUNT")
+        self.time = datetime.now().strftime("%Y%m%d%H%M%S")
+        # 单线程保证写入顺序
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="feed-export")
+        self._raw: BinaryIO | None = None
+        self._stream: BinaryIO | None = None
+        self._exporter: BaseExporter | None = None
+        self._part = 0
+        self._part_count = 0
+
+    @classmethod
+    def create_instance(cls, crawler):
+        if not crawler.settings.get("FEED_PATH"):
+            raise NotConfigured
+        return cls(crawler)
+
+    async def process_items(self, items: List[Item], spider):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._write, items)
+        self.crawler.stats.inc_value("feed_exported_count", len(items))
+
+    async def close_spider(self, spider):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_part)
+        self._executor.shutdown()
+
+    def _write(self, items: List[Item]):
+        for item in items:
+            if self._exporter is None:
+                self._open_part()
+            self._exporter.export_item(item)
+            self._part_count += 1
+            # 压缩时按已经写到磁盘的大小估算
+            if (self.rotate_count and self._part_count >= self.rotate_count) or (
+                self.rotate_size and self._raw.tell() >= self.rotate_size
+            ):
+                self._close_part()
+
+    def _part_path(self) -> str:
+        path = self.path
+        if (self.rotate_size or self.rotate_count) and "{part}" not in path:
+            root, ext = os.path.splitext(path)
+            path = f"{root}.{{part}}{ext}"
+        path = path.format(name=self.crawler.spider, time=self.time, part=f"{self._part:05d}")
+        if self.compression == "gzip":
+            path += ".gz"
+        elif self.compression == "zstd":
+            path += ".zst"
+        return path
+
+    def _open_part(self):
+        path = self._part_path()
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+        if self.compression is None:
+            self._raw = self._stream = open(path, "wb", buffering=self.buffer_size)
+        else:
+            self._raw = open(path, "wb")
+            if self.compression == "gzip":
+                level = 6 if self.compression_level is None else int(self.compression_level)
+                compressed = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=level)
+            else:
+                level = 3 if self.compression_level is None else int(self.compression_level)
+                compressed = zstandard.ZstdCompressor(level=level).stream_writer(self._raw)
+            # 攒够缓冲区再交给压缩器, 减少小块压缩的开销
+            self._stream = io.BufferedWriter(compressed, self.buffer_size)
+        self._exporter = self.exporter_cls(self._stream, fields=self.fields, encoding=self.encoding)
+        self._exporter.start()
+        self.logger.info(f"export items to {path}")
+
+    def _close_part(self):
+        if self._exporter is None:
+            return
+        self._exporter.finish()
+        self._stream.close()
+        if self._raw is not self._stream:
+            # GzipFile 不会关闭传入的 fileobj
+            self._raw.close()
+        self._raw = self._stream = self._exporter = None
+        self._part += 1
+        self._part_count = 0
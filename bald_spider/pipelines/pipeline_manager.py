@@ -0,0 +1,186 @@
+import asyncio
+from inspect import iscoroutinefunction
+from pprint import pformat
+from typing import Callable, List, Tuple
+from bald_spider.event import item_successful
+from bald_spider.exceptions import DropItem, NotConfigured, PipelineInitError
+from bald_spider.items.items import Item
+from bald_spider.pipelines import BasePipeline
+from bald_spider.utils.log import get_logger
+from bald_spider.utils.project import load_class
+
+
+class _Stage:
+    """管道链中的一环, 批量管道自带缓冲区"""
+
+    __slots__ = ("pipeline", "process_item", "process_items", "batch_size", "batch_interval", "buffer")
+
+    def __init__(self, pipeline, batch_size: int, batch_interval: float) -> None:
+        self.pipeline = pipeline
+        self.process_item: Tuple[Callable, bool] | None = None
+        self.process_items: Tuple[Callable, bool] | None = None
+        self.batch_size = pipeline.batch_size or batch_size
+        self.batch_interval = pipeline.batch_interval or batch_interval
+        self.buffer: List[Item] = []
+
+
+class PipelineManager:
+    """
+    按 ITEM_PIPELINES 的顺序处理数据.
+    批量管道先把数据放进缓冲区, 攒够 batch_size 条或者到了 batch_interval 再一起写入,
+    写入后剩下的数据继续传给后面的管道.
+    """
+
+    def __init__(self, crawler) -> None:
+        self.crawler = crawler
+        self.logger = get_logger(self.__class__.__name__, crawler.settings.get("LOG_LEVEL"))
+        self.batch_size = crawler.settings.getint("ITEM_PIPELINE_BATCH_SIZE")
+        self.batch_interval = crawler.settings.getfloat("ITEM_PIPELINE_BATCH_INTERVAL")
+        self.pipelines = []
+        self._stages: List[_Stage] = []
+        self._stats = crawler.stats
+        self._closed = asyncio.Event()
+        self._flush_task: asyncio.Task | None = None
+        self._add_pipelines(crawler.settings.getlist("ITEM_PIPELINES"))
+
+    @classmethod
+    def create_instance(cls, *args, **kwargs):
+        return cls(*args, **kwargs)
+
+    def _add_pipelines(self, pipelines):
+        enabled_pipelines = [p for p in pipelines if self._validate_pipeline(p)]
+        if enabled_pipelines:
+            self.logger.info(f"enabled pipelines: \n {pformat(enabled_pipelines)}")
+
+    def _validate_pipeline(self, pipeline) -> bool:
+        pipeline_cls = load_class(pipeline)
+        if not hasattr(pipeline_cls, "create_instance"):
+            raise PipelineInitError(
+                f"Pipeline init failed, must inherit from `BasePipeline` or `create_instance` method."
+            )
+        try:
+            instance = pipeline_cls.create_instance(self.crawler)
+        except NotConfigured:
+            return False
+        self.pipelines.append(instance)
+        stage = _Stage(instance, self.batch_size, self.batch_interval)
+        if self._overridden(instance, "process_item"):
+            stage.process_item = (instance.process_item, iscoroutinefunction(instance.process_item))
+        if hasattr(instance, "process_items"):
+            stage.process_items = (instance.process_items, iscoroutinefunction(instance.process_items))
+        if stage.process_item is None and stage.process_items is None:
+            raise PipelineInitError(f"Pipeline {pipeline} must implement `process_item` or `process_items`.")
+        self._stages.append(stage)
+        return True
+
+    @staticmethod
+    def _overridden(pipeline, method_name) -> bool:
+        method = getattr(type(pipeline), method_name, None)
+        return method is not None and method is not getattr(BasePipeline, method_name)
+
+    async def open_spider(self):
+        await self._call_all("open_spider")
+        intervals = [stage.batch_interval for stage in self._stages if stage.process_items is not None]
+        if intervals:
+            self._flush_task = asyncio.create_task(self._interval_flush(min(intervals)))
+
+    async def close_spider(self):
+        self._closed.set()
+        if self._flush_task is not None:
+            await self._flush_task
+        # 按顺序清空缓冲区, 前面批量管道放出来的数据会进入后面管道的缓冲区, 随后一起清空
+        for index, stage in enumerate(self._stages):
+            if stage.buffer:
+                await self._flush(index)
+        await self._call_all("close_spider")
+
+    async def process_item(self, item: Item):
+        await self._process([item], 0)
+
+    async def _process(self, items: List[Item], start: int):
+        spider = self.crawler.spider
+        for index in range(start, len(self._stages)):
+            stage = self._stages[index]
+            if stage.process_item is not None:
+                method, is_async = stage.process_item
+                kept = []
+                for item in items:
+                    try:
+                        item = await method(item, spider) if is_async else method(item, spider)
+                    except DropItem as exc:
+                        self._drop(item, exc)
+                        continue
+                    except Exception as exc:
+                        # 和批量管道一样只丢弃出错的数据, 不影响同一批的其他数据和定时写入任务
+                        self._stats.inc_value("item_error_count")
+                        self.logger.error(f"{type(stage.pipeline).__name__} failed to process item: {exc!r}")
+                        continue
+                    if item is not None:
+                        kept.append(item)
+                items = kept
+            if not items:
+                return
+            if stage.process_items is not None:
+                stage.buffer.extend(items)
+                if len(stage.buffer) >= stage.batch_size:
+                    await self._flush(index)
+                return
+        for item in items:
+            self._item_done(item)
+
+    async def _flush(self, index: int):
+        stage = self._stages[index]
+        # 先换掉缓冲区, 写入期间新来的数据进入下一批
+        batch, stage.buffer = stage.buffer, []
+        method, is_async = stage.process_items
+        spider = self.crawler.spider
+        try:
+            kept = await method(batch, spider) if is_async else method(batch, spider)
+        except asyncio.CancelledError:
+            # 写入时被取消, 这一批放回缓冲区, 关闭时再写入
+            stage.buffer[:0] = batch
+            raise
+        except DropItem as exc:
+            for item in batch:
+                self._drop(item, exc)
+            return
+        except Exception as exc:
+            self._stats.inc_value("item_error_count", len(batch))
+            self.logger.error(f"{type(stage.pipeline).__name__} failed to process {len(batch)} items: {exc!r}")
+            return
+        await self._process(batch if kept is None else list(kept), index + 1)
+
+    async def _interval_flush(self, interval: float):
+        while not self._closed.is_set():
+            try:
+                await asyncio.wait_for(self._closed.wait(), interval)
+            except asyncio.TimeoutError:
+                for index, stage in enumerate(self._stages):
+                    if not stage.buffer:
+                        continue
+                    try:
+                        await self._flush(index)
+                    except Exception as exc:
+                        # 定时写入任务不能退出, 否则后面的数据一直留在缓冲区中
+                        self.logger.error(f"interval flush of {type(stage.pipeline).__name__} failed: {exc!r}")
+
+    async def _call_all(self, method_name):
+        spider = self.crawler.spider
+        for pipeline in self.pipelines:
+            if (method := getattr(pipeline, method_name, None)) is None:
+                continue
+            if iscoroutinefunction(method):
+                await method(spider)
+            else:
+                method(spider)
+
+    def _drop(self, item: Item, exc: DropItem):
+        self._stats.inc_value("item_dropped_count")
+        self.logger.debug("Item dropped: %s %s", exc, item)
+
+    def _item_done(self, item: Item):
+        self._stats.inc_value("item_successful_count")
+        if self.crawler.subscriber.has_receivers(item_successful):
+            asyncio.create_task(self.crawler.subscriber.notify(item_successful, item, self.crawler.spider))
+        # 惰性格式化, 日志级别不输出时不调用 item 的 pformat
+        self.logger.info("Item processed: %s", item)
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Type
+from bald_spider.exceptions import NotConfigured
+from bald_spider.items.items import Item
+from bald_spider.pipelines import BasePipeline
+from bald_spider.utils import json_backend
+from bald_spider.utils.log import get_logger
+
+
+class SqlitePipeline(BasePipeline):
+    """
+    把 item 批量写入本地 SQLite. 表结构由 Item 的 FIELDS 生成, 默认一个 Item 类一张表,
+    Field(sqlite_type="INTEGER") 可以指定列类型. 设置 SQLITE_UPSERT_KEYS 后按这些字段更新已有的行.
+    连接只在一个后台线程中使用, 每批数据一个事务.
+    """
+
+    def __init__(self, crawler) -> None:
+        settings = crawler.settings
+        self.crawler = crawler
+        self.logger = get_logger(self.__class__.__name__, settings.get("LOG_LEVEL"))
+        self.path: str = settings.get("SQLITE_PATH")
+        self.table: str | None = settings.get("SQLITE_TABLE")
+        self.upsert_keys: List[str] = settings.getlist("SQLITE_UPSERT_KEYS")
+        self.batch_size = settings.getint("SQLITE_BATCH_SIZE")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-pipeline")
+        self._db: sqlite3.Connection | None = None
+        # Item 类 -> (列名, insert 语句)
+        self._statements: Dict[Type[Item], tuple[List[str], str]] = {}
+
+    @classmethod
+    def create_instance(cls, crawler):
+        if not crawler.settings.get("SQLITE_PATH"):
+            raise NotConfigured
+        return cls(crawler)
+
+    async def open_spider(self, spider):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._connect)
+
+    async def process_items(self, items: List[Item], spider):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._insert, items)
+        self.crawler.stats.inc_value("sqlite_saved_count", len(items))
+
+    async def close_spider(self, spider):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown()
+
+    def _connect(self):
+        if directory := os.path.dirname(self.path):
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL 下 NORMAL 只在断电时可能丢失最后的事务, 不会损坏数据库
+        self._db.execute("PRAGMA synchronous=NORMAL")
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _insert(self, items: List[Item]):
+        groups: Dict[Type[Item], List[Item]] = {}
+        for item in items:
+            groups.setdefault(type(item), []).append(item)
+        with self._db:
+            for item_cls, group in groups.items():
+                columns, sql = self._statement(item_cls)
+                self._db.executemany(sql, [self._row(item, columns) for item in group])
+
+    @staticmethod
+    def _row(item: Item, columns: List[str]) -> tuple:
+        values = item.to_dict()
+        row = []
+        for column in columns:
+            value = values.get(column)
+            if isinstance(value, (dict, list, tuple, set)):
+                value = json_backend.dumps(value if not isinstance(value, set) else list(value)).decode()
+            row.append(value)
+        return tuple(row)
+
+    def _statement(self, item_cls: Type[Item]) -> tuple[List[str], str]:
+        if (statement := self._statements.get(item_cls)) is not None:
+            return statement
+        table = self.table or item_cls.__name__.lower()
+        columns = list(item_cls.FIELDS)
+        for key in self.upsert_keys:
+            if key not in item_cls.FIELDS:
+                raise KeyError(f"SQLITE_UPSERT_KEYS: {item_cls.__name__} does not have field {key}")
+        self._create_table(table, item_cls)
+        names = ", ".join(_quote(column) for column in columns)
+        placeholders = ", ".join("?" * len(columns))
+        sql = f"INSERT INTO {_quote(table)} ({names}) VALUES ({placeholders})"
+        if self.upsert_keys:
+            updates = [column for column in columns if column not in self.upsert_keys]
+            conflict = ", ".join(_quote(key) for key in self.upsert_keys)
+            if updates:
+                assignments = ", ".join(f"{_quote(column)} = excluded.{_quote(column)}" for column in updates)
+                sql += f" ON CONFLICT ({conflict}) DO UPDATE SET {assignments}"
+            else:
+                sql += f" ON CONFLICT ({conflict}) DO NOTHING"
+        self._statements[item_cls] = columns, sql
+        return columns, sql
+
+    def _create_table(self, table: str, item_cls: Type[Item]):
+        definitions = [f"{_quote(name)} {field.get('sqlite_type', '')}".rstrip() for name, field in item_cls.FIELDS.items()]
+        with self._db:
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} ({', '.join(definitions)})")
+            # 表已经存在时补上 Item 新增的字段
+            existing = {row[1] for row in self._db.execute(f"PRAGMA table_info({_quote(table)})")}
+            for name, definition in zip(item_cls.FIELDS, definitions):
+                if name not in existing:
+                    self._db.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {definition}")
+            if self.upsert_keys:
+                index = _quote(f"{table}_{'_'.join(self.upsert_keys)}_key")
+                keys = ", ".join(_quote(key) for key in self.upsert_keys)
+                self._db.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {_quote(table)} ({keys})")
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
@@ -7,15 +7,137 @@ LOG_LEVEL = "INFO"
 VERIFY_SSL = True
 REQUEST_TIMEOUT = 60
 USE_SESSION = True
+# 每个域名(下载槽位)的并发数, DOWNLOAD_SLOTS 可以单独配置某个域名, 如 {"example.com": {"concurrency": 2, "delay": 1}}
+CONCURRENCY_PER_DOMAIN = 8
+DOWNLOAD_SLOTS = {}
 DOWNLOADER = "bald_spider.core.downloader.aiohttp_downloder.AioDownloader"
+# aiohttp downloader 连接池, 0 表示不限制
+CONNECTION_LIMIT = 100
+CONNECTION_LIMIT_PER_HOST = 0
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 15
+HAPPY_EYEBALLS_DELAY = 0.25
+# 每个 meta["cookiejar"] 一个 session(共用连接池), 最多保留的 session 数, 超过时关闭最久没有使用的, 0 表示不限制
+AIOHTTP_MAX_SESSIONS = 1000
+# httpx downloader 连接池, HTTPX_HTTP2 需要安装 httpx[http2]
+HTTPX_MAX_CONNECTIONS = 100
+HTTPX_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTPX_KEEPALIVE_EXPIRY = 5.0
+HTTPX_HTTP2 = False
+# 每个代理一个客户端, 最多保留的客户端数, 超过时关闭最久没有使用的, 0 表示不限制
+HTTPX_MAX_CLIENTS = 64
 INTERVAL = 5
 STATS_DUMP = True
-# download delay
+# download delay, 每个下载槽位两次请求之间的间隔, 在调度阶段等待, 不占用并发
 DOWNLOAD_DELAY = 0
 RANDOMNESS = True
 RANDEOM_RANGE = (0.75, 1.25)
+# rate limit, 令牌桶限速(每秒请求数), 0 表示不限速, 也可以在 DOWNLOAD_SLOTS 中单独配置 "rate"
+RATE_LIMIT = 0
+RATE_LIMIT_PER_DOMAIN = 0
+RATE_LIMIT_BURST = 1
+# auto throttle, 需要在 MIDDLEWARES 中加入 bald_spider.middleware.auto_throttle.AutoThrottle
+AUTOTHROTTLE_ENABLED = False
+AUTOTHROTTLE_TARGET_CONCURRENCY = 2.0
+AUTOTHROTTLE_START_DELAY = 1.0
+AUTOTHROTTLE_MAX_DELAY = 60.0
+AUTOTHROTTLE_MAX_CONCURRENCY = 64
+# 单个域名并发的上限, 0 表示和 AUTOTHROTTLE_MAX_CONCURRENCY 相同
+AUTOTHROTTLE_MAX_CONCURRENCY_PER_DOMAIN = 0
+AUTOTHROTTLE_DEBUG = False
 # retry
 RETRY_HTTP_CODES = [408, 429, 500, 503, 504, 522, 524]
 IGNORE_HTTP_CODES = [403, 404]
 MAX_RETRY_TIMES = 2
+# 重试的退避间隔: RETRY_BACKOFF_BASE * 2 ** (n - 1) 加随机抖动, 最大 RETRY_BACKOFF_MAX 秒
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 60.0
+# 重试请求的优先级调整, 数值越大越靠后
+RETRY_PRIORITY_ADJUST = 1
 ALLOWED_CODES = []
+# scheduler queue, 使用 bald_spider.utils.pqueue.DiskPriorityQueue 可以把待抓取请求落盘
+SCHEDULER_QUEUE = "bald_spider.utils.pqueue.SpoderPriorityQueue"
+SCHEDULER_DISK_PATH = None
+SCHEDULER_MEMORY_BUFFER = 1000
+# 槽位忙时最多有多少个请求在槽位中等待(总数和每个槽位), 每次取请求最多从队列取多少个, 其余的留在队列中
+SCHEDULER_MAX_PARKED = 1000
+SCHEDULER_SLOT_BACKLOG = 16
+SCHEDULER_MAX_BUSY_HITS = 32
+# 断点续爬, 设置 JOBDIR 后退出时(以及每隔一段时间)保存待抓取请求和去重状态
+JOBDIR = None
+JOBDIR_CHECKPOINT_INTERVAL = 60
+# dupefilter
+DUPEFILTER = "bald_spider.dupefilter.memory_filter.MemoryDupeFilter"
+# bloom filter (bald_spider.dupefilter.bloom_filter.BloomDupeFilter)
+BLOOM_CAPACITY = 10_000_000
+BLOOM_ERROR_RATE = 0.001
+# item pipelines, 按顺序处理数据
+ITEM_PIPELINES = []
+# 批量管道每攒够多少条或者每隔多少秒写入一次
+ITEM_PIPELINE_BATCH_SIZE = 100
+ITEM_PIPELINE_BATCH_INTERVAL = 1.0
+# feed export, 设置 FEED_PATH 并把 bald_spider.pipelines.feed_export.FeedExportPipeline 加入 ITEM_PIPELINES
+# FEED_PATH 支持 {name} {time} {part} 占位符, 如 "output/{name}-{time}.jsonl"
+FEED_PATH = None
+FEED_FORMAT = "jsonlines"
+FEED_EXPORTERS = {
+    "jsonlines": "bald_spider.exporters.JsonLinesExporter",
+    "csv": "bald_spider.exporters.CsvExporter",
+}
+# 导出的字段, 默认全部字段
+FEED_FIELDS = []
+FEED_ENCODING = "utf-8"
+FEED_BUFFER_SIZE = 1024 * 1024
+# None, "gzip" 或 "zstd"(需要安装 zstandard)
+FEED_COMPRESSION = None
+FEED_COMPRESSION_LEVEL = None
+# 单个文件超过多少字节或者多少条后切分, 0 表示不切分
+FEED_ROTATE_SIZE = 0
+FEED_ROTATE_COUNT = 0
+# sqlite, 设置 SQLITE_PATH 并把 bald_spider.pipelines.sqlite.SqlitePipeline 加入 ITEM_PIPELINES
+SQLITE_PATH = None
+# 表名, 默认使用 Item 类名的小写
+SQLITE_TABLE = None
+# 按这些字段 upsert, 为空时直接插入
+SQLITE_UPSERT_KEYS = []
+SQLITE_BATCH_SIZE = 1000
+# 响应大小限制(字节), 超过 DOWNLOAD_MAXSIZE 中止下载, 超过 DOWNLOAD_WARNSIZE 打印警告, 0 表示不限制
+DOWNLOAD_MAXSIZE = 1024 * 1024 * 1024
+DOWNLOAD_WARNSIZE = 32 * 1024 * 1024
+# 响应体超过这个大小后写入临时文件并 mmap, response.body_view 直接使用 mmap, response.body 访问时才复制成 bytes
+DOWNLOAD_SPILL_SIZE = 16 * 1024 * 1024
+# 文件下载, 请求的 meta 中设置 download_file=True 后响应体直接写入 FILES_STORE, 文件按内容哈希命名
+FILES_STORE = None
+FILES_HASH_ALGORITHM = "sha256"
+# FILES_RANGE_CONCURRENCY 大于 1 时按 FILES_RANGE_SIZE 分段, 并行发出 range 请求
+FILES_RANGE_SIZE = 8 * 1024 * 1024
+FILES_RANGE_CONCURRENCY = 1
+# response.json() 和数据导出使用的 JSON 库, auto 按 orjson -> ujson -> json 选择已安装的
+JSON_BACKEND = "auto"
+# 进程池中执行的回调函数名, 如 ["parse_detail"], "*" 表示全部; 请求的 meta 中 process_pool=True/False 可以单独指定
+PROCESS_POOL_CALLBACKS = []
+# 进程池大小, 0 表示 CPU 核数
+PROCESS_POOL_WORKERS = 0
+# 子进程的启动方式 fork/spawn/forkserver, None 表示 forkserver(不支持时 spawn), 爬虫类需要可以被导入;
+# fork 启动最快, 但是主进程中已经有线程(数据导出 SQLite 管道等)时子进程可能死锁
+PROCESS_POOL_START_METHOD = None
+# 抓取进程数, 大于 1 时每个子进程运行一个引擎, 请求按域名分给子进程, 0 表示 CPU 核数
+CRAWLER_PROCESSES = 1
+# 抓取子进程的启动方式, 同 PROCESS_POOL_START_METHOD(主进程在启动子进程之前已经打开了管道)
+CRAWLER_PROCESS_START_METHOD = None
+# 统计信息, 分布式抓取时使用 bald_spider.stats_collector.RedisStatsCollector 汇总所有节点的计数
+STATS_COLLECTOR = "bald_spider.stats_collector.StatsCollector"
+# 分布式抓取: SCHEDULER_QUEUE = "bald_spider.utils.pqueue.RedisPriorityQueue",
+# DUPEFILTER = "bald_spider.dupefilter.redis_filter.RedisDupeFilter", 所有节点连接同一个 Redis
+REDIS_URL = "redis://127.0.0.1:6379/0"
+# key 的前缀, None 表示 bald_spider:爬虫名
+REDIS_KEY = None
+# 每个 Redis 命令最多阻塞的秒数, 超时后退避重连
+REDIS_SOCKET_TIMEOUT = 10
+# 每个节点最多取出多少个还没有完成的请求, 0 表示 CONCURRENCY 的 2 倍
+REDIS_MAX_INFLIGHT = 0
+# 心跳间隔, 超过 REDIS_HEARTBEAT_TIMEOUT 秒没有心跳的节点, 处理中的请求放回队列
+REDIS_POLL_INTERVAL = 1.0
+REDIS_HEARTBEAT_TIMEOUT = 60
+# 所有节点都空闲持续多少秒后结束抓取
+REDIS_IDLE_TIME = 3
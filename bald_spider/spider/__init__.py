@@ -24,6 +24,11 @@ class Spider:
     def parse(self, response):
         raise NotImplemented
 
+    def parse_file(self, response):
+        """文件下载请求没有指定 callback 时, 直接输出下载结果"""
+        if (file_item := response.meta.get("file")) is not None:
+            yield file_item
+
     def __str__(self):
         return self.__class__.__name__
 
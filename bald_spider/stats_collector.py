@@ -1,6 +1,8 @@
 from bald_spider.utils.log import get_logger
 from pprint import pformat
+from time import monotonic
 from bald_spider.utils.date import date_delta, now
+from bald_spider.utils.redis_client import RedisError, redis_client, redis_key
 
 
 class StatsCollector:
@@ -40,3 +42,67 @@ class StatsCollector:
 
     def __delitem__(self, key):
         del self._stats[key]
+
+
+class RedisStatsCollector(StatsCollector):
+    """
+    本地统计之外, 把计数累加到所有节点共享的 Redis 哈希表中.
+    增量先在本地合并, 每隔 REDIS_POLL_INTERVAL 秒和结束时一次发送, 发送失败时留到下次.
+    """
+
+    def __init__(self, crawler) -> None:
+        super().__init__(crawler)
+        self.client = redis_client(crawler)
+        self.interval = crawler.settings.getfloat("REDIS_POLL_INTERVAL")
+        self._key: str | None = None
+        self._deltas = {}
+        self._last_flush = monotonic()
+
+    @property
+    def key(self) -> str:
+        # 创建统计时爬虫可能还没有创建, 用到时再生成 key
+        if self._key is None:
+            self._key = redis_key(self.crawler, "stats")
+        return self._key
+
+    def inc_value(self, key, count=1, start=0):
+        super().inc_value(key, count, start)
+        self._deltas[key] = self._deltas.get(key, 0) + count
+        if monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = monotonic()
+        if not self._deltas:
+            return
+        commands = [
+            ("HINCRBYFLOAT" if isinstance(value, float) else "HINCRBY", self.key, key, value)
+            for key, value in self._deltas.items()
+        ]
+        deltas, self._deltas = self._deltas, {}
+        try:
+            self.client.pipeline(commands)
+        except RedisError as exc:
+            # 增量放回本地, 下次一起发送
+            for key, value in deltas.items():
+                self._deltas[key] = self._deltas.get(key, 0) + value
+            self.log.error(f"flush stats to redis failed: {exc}")
+
+    def get_shared_stats(self):
+        """所有节点累加后的计数"""
+        reply = self.client.execute("HGETALL", self.key)
+        stats = {}
+        for i in range(0, len(reply), 2):
+            value = reply[i + 1].decode()
+            stats[reply[i].decode()] = float(value) if "." in value or "e" in value else int(value)
+        return stats
+
+    def close_spider(self, spider, reason):
+        super().close_spider(spider, reason)
+        self.flush()
+        if self._dump:
+            try:
+                self.log.info(f"{spider} shared stats:\n" + pformat(self.get_shared_stats()))
+            except RedisError as exc:
+                self.log.error(f"get shared stats failed: {exc}")
+        self.client.close()
@@ -14,6 +14,9 @@ class Subscriber:
     def unsubscriber(self, receiver: Callable[..., Coroutine[Any, Any, Any]], *, event: str) -> None:
         self._subscriber[event].remove(receiver)
 
+    def has_receivers(self, event: str) -> bool:
+        return bool(self._subscriber.get(event))
+
     async def notify(self, event: str, *args, **kwargs):
         for receiver in self._subscriber[event]:
             asyncio.create_task(receiver(*args, **kwargs))
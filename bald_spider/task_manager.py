@@ -1,12 +1,61 @@
-from typing import Set, Final
+from collections import deque
+from typing import Deque, Set, Final
 import asyncio
-from asyncio import Task, Future, Semaphore
+from asyncio import Task, Future
+
+
+class ResizableSemaphore:
+	"""可以在运行时调整上限的信号量, 调小上限时已经获取的不受影响, 释放后才生效"""
+
+	def __init__(self, value=16):
+		self._limit = max(1, value)
+		self._active = 0
+		self._waiters: Deque[Future] = deque()
+
+	@property
+	def limit(self):
+		return self._limit
+
+	async def acquire(self):
+		while self._active >= self._limit:
+			waiter = asyncio.get_running_loop().create_future()
+			self._waiters.append(waiter)
+			try:
+				await waiter
+			except asyncio.CancelledError:
+				if waiter in self._waiters:
+					self._waiters.remove(waiter)
+				elif not waiter.cancelled():
+					# 已经被唤醒但还没恢复运行就被取消了, 把空出来的许可交给下一个等待者
+					self._wake()
+				raise
+		self._active += 1
+		return True
+
+	def release(self):
+		self._active -= 1
+		self._wake()
+
+	def resize(self, value):
+		self._limit = max(1, value)
+		self._wake()
+
+	def locked(self):
+		return self._active >= self._limit
+
+	def _wake(self):
+		free = self._limit - self._active
+		while free > 0 and self._waiters:
+			waiter = self._waiters.popleft()
+			if not waiter.done():
+				waiter.set_result(None)
+				free -= 1
 
 
 class TaskManager:
 	def __init__(self, total_concurrency=16):
 		self.current_task: Final[Set] = set()
-		self.semaphore: Semaphore = Semaphore(total_concurrency)
+		self.semaphore: ResizableSemaphore = ResizableSemaphore(total_concurrency)
 
 	def create_task(self, coroutine) -> Task:
 		task = asyncio.create_task(coroutine)
@@ -17,6 +66,10 @@ class TaskManager:
 			self.semaphore.release()
 
 		task.add_done_callback(done_callback)
+		return task
+
+	def resize(self, total_concurrency):
+		self.semaphore.resize(total_concurrency)
 
 	def all_done(self):
 		return len(self.current_task) == 0
@@ -0,0 +1,130 @@
+"""
+响应体编码识别, 顺序: BOM -> Content-Type 响应头 -> 前 4KB 中的 <meta charset> / <?xml encoding>
+-> 同一个 host 上次检测到的编码 -> 请求的 encoding -> 编码检测.
+编码检测比较耗时, 检测结果按 host 缓存, 同一个站点的后续页面直接复用.
+"""
+
+import codecs
+import re
+from functools import lru_cache
+
+try:
+    from charset_normalizer import from_bytes
+except ImportError:
+    from_bytes = None
+
+# 声明的编码按浏览器的习惯换成兼容的超集
+_SUPERSETS = {
+    "ascii": "cp1252",
+    "iso8859-1": "cp1252",
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "big5": "big5hkscs",
+    "shift_jis": "cp932",
+    "euc_kr": "cp949",
+}
+# UTF-32 的 BOM 以 UTF-16 的 BOM 开头, 需要先判断
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+_HEADER_CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?\s*([\w.:+-]+)", re.I)
+_BODY_CHARSET_RE = re.compile(
+    rb"""<meta\s[^>]*?charset\s*=\s*["']?\s*([\w.:+-]+)|<\?xml\s[^>]*?encoding\s*=\s*["']([\w.:+-]+)""", re.I
+)
+SNIFF_SIZE = 4096
+DETECT_SIZE = 64 * 1024
+# 没有安装 charset_normalizer 时依次尝试的编码, cp1252 作为最后的兜底
+_FALLBACKS = ("gb18030",)
+_MAX_HOSTS = 10000
+_host_encodings: dict[str, str] = {}
+
+
+@lru_cache(maxsize=256)
+def resolve_encoding(name: str) -> str | None:
+    """规范化编码名称, 不认识的编码返回 None"""
+    try:
+        name = codecs.lookup(name.strip().strip("\"'")).name
+    except (LookupError, ValueError):
+        return None
+    return _SUPERSETS.get(name, name)
+
+
+def bom_encoding(head: bytes) -> tuple[str, int] | None:
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    return None
+
+
+def header_encoding(content_type: str | None) -> str | None:
+    if content_type and (match := _HEADER_CHARSET_RE.search(content_type)):
+        return resolve_encoding(match.group(1))
+    return None
+
+
+def body_declared_encoding(head: bytes) -> str | None:
+    if match := _BODY_CHARSET_RE.search(head):
+        return resolve_encoding((match.group(1) or match.group(2)).decode("ascii"))
+    return None
+
+
+def detect_encoding(body: bytes | memoryview) -> str:
+    sample = bytes(body[:DETECT_SIZE])
+    if from_bytes is not None:
+        if (best := from_bytes(sample).best()) is not None:
+            return resolve_encoding(best.encoding) or best.encoding
+    else:
+        for encoding in _FALLBACKS:
+            try:
+                str(sample, encoding)
+            except UnicodeDecodeError as exc:
+                # 截断的样本末尾可能是半个字符
+                if len(sample) < len(body) and exc.start >= len(sample) - 4:
+                    return encoding
+                continue
+            return encoding
+    return "cp1252"
+
+
+def host_encoding(host: str | None) -> str | None:
+    return _host_encodings.get(host)
+
+
+def remember_host_encoding(host: str | None, encoding: str):
+    if host is None:
+        return
+    if host not in _host_encodings and len(_host_encodings) >= _MAX_HOSTS:
+        del _host_encodings[next(iter(_host_encodings))]
+    _host_encodings[host] = encoding
+
+
+def declared_encoding(head: bytes, content_type: str | None) -> tuple[str, int] | None:
+    """BOM 和声明的编码, 返回 (编码, BOM 长度), 不需要解码响应体"""
+    if (bom := bom_encoding(head)) is not None:
+        return bom
+    if encoding := header_encoding(content_type) or body_declared_encoding(head):
+        return encoding, 0
+    return None
+
+
+def decode_body(
+    body: bytes | memoryview, content_type: str | None, default: str, host: str | None = None
+) -> tuple[str, str]:
+    """返回 (文本, 编码), 声明的编码和检测到的编码都用 replace 解码, 不会抛出异常"""
+    if (declared := declared_encoding(bytes(body[:SNIFF_SIZE]), content_type)) is not None:
+        encoding, size = declared
+        return str(body[size:] if size else body, encoding, "replace"), encoding
+    cached = host_encoding(host)
+    default = resolve_encoding(default) or "utf-8"
+    for encoding in (cached, default) if cached and cached != default else (default,):
+        try:
+            return str(body, encoding), encoding
+        except UnicodeDecodeError:
+            pass
+    encoding = detect_encoding(body)
+    remember_host_encoding(host, encoding)
+    return str(body, encoding, "replace"), encoding
@@ -0,0 +1,296 @@
+"""
+进程内的 Redis 替身, 在后台线程中监听本地端口, 实现分布式队列 去重和统计用到的命令,
+测试分布式抓取时不需要启动真正的 Redis.
+
+    server = FakeRedisServer().start()
+    settings = {"REDIS_URL": server.url, ...}
+    ...
+    server.stop()
+
+停止时断开所有连接, 用同一个 FakeRedis 在相同端口上重新启动可以模拟 Redis 重启.
+"""
+
+import socket
+import socketserver
+import threading
+from typing import Any, Callable, Dict, List
+
+from bald_spider.utils.redis_client import RedisError
+
+
+class _ZSet(dict):
+    """member -> score"""
+
+
+class _Hash(dict):
+    """field -> value"""
+
+
+def _number(value: bytes) -> float:
+    return float(value)
+
+
+def _format(score: float) -> bytes:
+    return repr(int(score) if score == int(score) else score).encode()
+
+
+def _score_bound(value: bytes) -> float:
+    if value in (b"-inf", b"+inf", b"inf"):
+        return float(value)
+    return float(value.lstrip(b"("))
+
+
+# 修改数据的命令, 执行后增加 key 的版本号, WATCH 据此判断 key 是否被修改
+_WRITES = frozenset((b"FLUSHDB", b"DEL", b"ZADD", b"ZREM", b"ZPOPMIN", b"SADD", b"HINCRBY", b"HINCRBYFLOAT"))
+
+
+class FakeRedis:
+    """内存中的数据和命令实现, 所有命令在同一把锁内执行, MULTI/EXEC 是原子的"""
+
+    def __init__(self) -> None:
+        self.data: Dict[bytes, Any] = {}
+        self.versions: Dict[bytes, int] = {}
+        self.lock = threading.Lock()
+        self.commands: Dict[bytes, Callable] = {
+            name[4:].upper().encode(): getattr(self, name) for name in dir(self) if name.startswith("cmd_")
+        }
+
+    def execute(self, args: List[bytes]) -> Any:
+        name = args[0].upper()
+        handler = self.commands.get(name)
+        if handler is None:
+            return RedisError(f"ERR unknown command '{args[0].decode()}'")
+        if name in _WRITES:
+            keys = list(self.data) if name == b"FLUSHDB" else args[1:] if name == b"DEL" else args[1:2]
+            for key in keys:
+                self.versions[key] = self.versions.get(key, 0) + 1
+        try:
+            return handler(*args[1:])
+        except TypeError:
+            return RedisError(f"ERR wrong number of arguments for '{args[0].decode()}' command")
+
+    def _get(self, key: bytes, kind: type):
+        value = self.data.get(key)
+        if value is not None and not isinstance(value, kind):
+            raise RedisError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _zset(self, key: bytes) -> Dict[bytes, float]:
+        return self._get(key, _ZSet) or _ZSet()
+
+    def _zsorted(self, key: bytes) -> List[tuple]:
+        return sorted(self._zset(key).items(), key=lambda pair: (pair[1], pair[0]))
+
+    def _cleanup(self, key: bytes):
+        if not self.data.get(key, True):
+            del self.data[key]
+
+    def cmd_ping(self, *args):
+        return args[0] if args else "PONG"
+
+    def cmd_auth(self, *args):
+        return "OK"
+
+    def cmd_select(self, db):
+        return "OK"
+
+    def cmd_flushdb(self):
+        self.data.clear()
+        return "OK"
+
+    def cmd_del(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def cmd_exists(self, *keys):
+        return sum(key in self.data for key in keys)
+
+    def cmd_zadd(self, key, *pairs):
+        zset = self._get(key, _ZSet)
+        if zset is None:
+            zset = self.data[key] = _ZSet()
+        added = 0
+        for i in range(0, len(pairs), 2):
+            member = pairs[i + 1]
+            added += member not in zset
+            zset[member] = _number(pairs[i])
+        return added
+
+    def cmd_zcard(self, key):
+        return len(self._zset(key))
+
+    def cmd_zrem(self, key, *members):
+        zset = self._zset(key)
+        removed = sum(zset.pop(member, None) is not None for member in members)
+        self._cleanup(key)
+        return removed
+
+    def cmd_zpopmin(self, key, count=b"1"):
+        zset = self._zset(key)
+        reply = []
+        for member, score in self._zsorted(key)[: int(count)]:
+            del zset[member]
+            reply += [member, _format(score)]
+        self._cleanup(key)
+        return reply
+
+    def cmd_zrange(self, key, start, stop, *options):
+        items = self._zsorted(key)
+        start, stop = int(start), int(stop)
+        stop = len(items) + stop if stop < 0 else stop
+        items = items[(len(items) + start if start < 0 else start) : stop + 1]
+        if options and options[0].upper() == b"WITHSCORES":
+            return [value for member, score in items for value in (member, _format(score))]
+        return [member for member, _ in items]
+
+    def cmd_zrangebyscore(self, key, low, high):
+        low_value, high_value = _score_bound(low), _score_bound(high)
+        return [
+            member
+            for member, score in self._zsorted(key)
+            if (score > low_value if low.startswith(b"(") else score >= low_value)
+            and (score < high_value if high.startswith(b"(") else score <= high_value)
+        ]
+
+    def cmd_sadd(self, key, *members):
+        values = self._get(key, set)
+        if values is None:
+            values = self.data[key] = set()
+        size = len(values)
+        values.update(members)
+        return len(values) - size
+
+    def cmd_sismember(self, key, member):
+        return int(member in (self._get(key, set) or ()))
+
+    def cmd_scard(self, key):
+        return len(self._get(key, set) or ())
+
+    def cmd_hincrby(self, key, field, amount):
+        return self._hincr(key, field, int(amount))
+
+    def cmd_hincrbyfloat(self, key, field, amount):
+        return _format(self._hincr(key, field, float(amount)))
+
+    def _hincr(self, key, field, amount):
+        values = self._get(key, _Hash)
+        if values is None:
+            values = self.data[key] = _Hash()
+        current = values.get(field, b"0")
+        value = (float(current) if isinstance(amount, float) else int(current)) + amount
+        values[field] = _format(value) if isinstance(amount, float) else str(value).encode()
+        return value
+
+    def cmd_hgetall(self, key):
+        return [value for pair in (self._get(key, _Hash) or {}).items() for value in pair]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "FakeRedisServer"
+
+    def setup(self):
+        super().setup()
+        self.server.connections.add(self.request)
+
+    def finish(self):
+        self.server.connections.discard(self.request)
+        super().finish()
+
+    def handle(self):
+        redis = self.server.redis
+        transaction: List[List[bytes]] | None = None
+        # WATCH 的 key 和当时的版本号
+        watched: Dict[bytes, int] = {}
+        while (args := self._read_command()) is not None:
+            name = args[0].upper()
+            if name == b"WATCH":
+                with redis.lock:
+                    watched.update((key, redis.versions.get(key, 0)) for key in args[1:])
+                reply = "OK"
+            elif name == b"UNWATCH":
+                watched, reply = {}, "OK"
+            elif name == b"MULTI":
+                transaction, reply = [], "OK"
+            elif name == b"EXEC":
+                if transaction is None:
+                    reply = RedisError("ERR EXEC without MULTI")
+                else:
+                    with redis.lock:
+                        if any(redis.versions.get(key, 0) != version for key, version in watched.items()):
+                            reply = None
+                        else:
+                            reply = [self._call(redis, command) for command in transaction]
+                    transaction, watched = None, {}
+            elif transaction is not None:
+                transaction.append(args)
+                reply = "QUEUED"
+            else:
+                with redis.lock:
+                    reply = self._call(redis, args)
+            try:
+                self.wfile.write(self._encode(reply))
+            except OSError:
+                return
+
+    @staticmethod
+    def _call(redis: FakeRedis, args: List[bytes]) -> Any:
+        try:
+            return redis.execute(args)
+        except RedisError as exc:
+            return exc
+
+    def _read_command(self) -> List[bytes] | None:
+        # 连接断开(包括 stop 时主动断开)返回 None
+        try:
+            line = self.rfile.readline()
+            if not line.startswith(b"*"):
+                return None
+            args = []
+            for _ in range(int(line[1:])):
+                size = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(size + 2)[:-2])
+            return args
+        except (OSError, ValueError):
+            return None
+
+    def _encode(self, reply: Any) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, RedisError):
+            return b"-%s\r\n" % str(reply).encode()
+        if isinstance(reply, str):
+            return b"+%s\r\n" % reply.encode()
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, bytes):
+            return b"$%d\r\n%s\r\n" % (len(reply), reply)
+        return b"*%d\r\n" % len(reply) + b"".join(self._encode(item) for item in reply)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, redis: FakeRedis | None = None) -> None:
+        super().__init__((host, port), _Handler)
+        self.redis = redis or FakeRedis()
+        self.connections = set()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "FakeRedisServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-redis", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        for conn in list(self.connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,109 @@
+"""
+不构建 DOM 树的快速提取: 标题 链接 <meta> 和 <base>, 用预编译的正则对整个页面扫描一遍.
+注释和 <script> <style> 中的内容会被跳过.
+"""
+
+import re
+from html import unescape
+from typing import Dict, Iterable, List
+from urllib.parse import urljoin, urlparse, urlsplit, urlunparse
+
+_SKIP = r"<!--.*?-->|<script\b.*?</script\s*>|<style\b.*?</style\s*>"
+_VALUE = r"""\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>"']+))"""
+_TITLE_RE = re.compile(_SKIP + r"|<title\b[^>]*>(.*?)</title\s*>", re.I | re.S)
+_LINK_RE = re.compile(_SKIP + r"|<a\s[^>]*?\bhref" + _VALUE, re.I | re.S)
+_META_RE = re.compile(_SKIP + r"|<meta\s([^>]*)>", re.I | re.S)
+_BASE_RE = re.compile(r"<base\s[^>]*?\bhref" + _VALUE, re.I)
+_ATTR_RE = re.compile(r"([\w:.-]+)" + _VALUE, re.S)
+_SPACE_RE = re.compile(r"\s+")
+# 这些链接 urljoin 会做额外的处理(去掉 . 和 .. 路径段, 合并 //, 去掉空的 ? 和 #, 删除制表符和换行), 交给 urljoin
+# urljoin 会把最后一段的 ;params 单独处理(比如去掉空的 params), 带 ; 的链接也交给 urljoin
+_SLOW_RELATIVE_RE = re.compile(r"(?:^|/)\.\.?(?:[/?#]|$)|.//|^//(?:[/?#]|$)|[?#]$|\?#|;|[\t\r\n]|^[a-zA-Z][a-zA-Z0-9+.-]*:")
+_SLOW_ABSOLUTE_RE = re.compile(r"[?#]$|\?#|;|[\t\r\n]")
+# base 的路径带 . 或 .. 路径段, 或者有空的路径段时, urljoin 拼接相对链接会先规范化 base 的路径
+_SLOW_BASE_PATH_RE = re.compile(r"/\.\.?(?:/|$)|//")
+
+
+def _unescape(value: str) -> str:
+    return unescape(value) if "&" in value else value
+
+
+def get_title(text: str) -> str | None:
+    for match in _TITLE_RE.finditer(text):
+        if (title := match.group(1)) is not None:
+            return _SPACE_RE.sub(" ", _unescape(title)).strip()
+    return None
+
+
+def get_links(text: str) -> List[str]:
+    """<a href> 的原始值(已经反转义, 没有拼接成绝对地址), 按页面中的顺序"""
+    links = []
+    append = links.append
+    for match in _LINK_RE.finditer(text):
+        value = match.group(1)
+        if value is None:
+            value = match.group(2)
+            if value is None:
+                value = match.group(3)
+                if value is None:
+                    continue
+        append(_unescape(value.strip()))
+    return links
+
+
+def get_meta(text: str) -> Dict[str, str]:
+    """<meta name/property/http-equiv=... content=...>, key 为小写"""
+    meta = {}
+    for match in _META_RE.finditer(text):
+        if (attrs := match.group(1)) is None:
+            continue
+        values = {m.group(1).lower(): m.group(2) or m.group(3) or m.group(4) or "" for m in _ATTR_RE.finditer(attrs)}
+        key = values.get("name") or values.get("property") or values.get("http-equiv")
+        if key and "content" in values:
+            meta.setdefault(key.lower(), _unescape(values["content"]))
+    return meta
+
+
+def get_base_url(text: str) -> str | None:
+    """<base href>, 只在 <head> 中查找"""
+    end = text.find("</head")
+    if match := _BASE_RE.search(text, 0, end if end != -1 else len(text)):
+        return _unescape((match.group(1) or match.group(2) or match.group(3) or "").strip()) or None
+    return None
+
+
+def urljoin_all(base: str, links: Iterable[str]) -> List[str]:
+    """
+    批量拼接绝对地址, 结果和逐个调用 urljoin(base, link) 相同.
+    base 只解析一次, 常见的链接形式直接拼接字符串, 带 . 或 .. 路径段和其他 scheme 的链接交给 urljoin.
+    """
+    parts = urlsplit(base)
+    if urlunparse(urlparse(base)) != base or _SLOW_BASE_PATH_RE.search(parts.path):
+        # base 以 ? # 或者 ; 结尾这类拆开再拼回去不相同的情况, urljoin 按拼回去的结果拼接
+        return [urljoin(base, link) for link in links]
+    origin = f"{parts.scheme}://{parts.netloc}"
+    path = parts.path
+    directory = origin + (path[: path.rfind("/") + 1] if path else "/")
+    without_query = origin + path
+    without_fragment = base.partition("#")[0]
+    scheme = parts.scheme + ":"
+    slow_relative = _SLOW_RELATIVE_RE.search
+    slow_absolute = _SLOW_ABSOLUTE_RE.search
+    joined = []
+    append = joined.append
+    for link in links:
+        if not link:
+            append(base)
+        elif link.startswith(("http://", "https://")):
+            append(urljoin(base, link) if slow_absolute(link) else link)
+        elif slow_relative(link):
+            append(urljoin(base, link))
+        elif link[0] == "/":
+            append(scheme + link if link[1:2] == "/" else origin + link)
+        elif link[0] == "?":
+            append(without_query + link)
+        elif link[0] == "#":
+            append(without_fragment + link)
+        else:
+            append(directory + link)
+    return joined
@@ -0,0 +1,139 @@
+"""
+JSON 编解码, JSON_BACKEND 为 "auto" 时按 orjson -> ujson -> json 的顺序选择已安装的最快实现,
+也可以指定 "orjson" "ujson" "json" 或者一个提供 dumps/loads 的模块路径.
+dumps 统一返回 utf-8 编码的 bytes, 不能序列化的对象转成字符串; loads 接受 str bytes 和 memoryview.
+使用时通过模块访问 json_backend.dumps / json_backend.loads, set_backend 之后才能生效.
+"""
+
+import json
+import re
+from importlib import import_module
+from typing import Any, Callable, Iterator, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _orjson():
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=str, option=option)
+
+    return dumps, orjson.loads
+
+
+def _ujson():
+    def dumps(obj) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False, default=str).encode()
+
+    def loads(data):
+        return ujson.loads(bytes(data) if type(data) is memoryview else data)
+
+    return dumps, loads
+
+
+def _json():
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, default=str, separators=(",", ":")).encode()
+
+    def loads(data):
+        return json.loads(bytes(data) if type(data) is memoryview else data)
+
+    return dumps, loads
+
+
+_BACKENDS = {"orjson": (_orjson, orjson), "ujson": (_ujson, ujson), "json": (_json, json)}
+
+
+def _resolve(name: str) -> str:
+    if name == "auto":
+        return "orjson" if orjson is not None else "ujson" if ujson is not None else "json"
+    return name
+
+
+def get_backend(name: str = "auto") -> Tuple[Callable[[Any], bytes], Callable[[Any], Any]]:
+    name = _resolve(name)
+    if name in _BACKENDS:
+        factory, module = _BACKENDS[name]
+        if module is None:
+            raise ImportError(f"JSON_BACKEND {name!r} is not installed.")
+        return factory()
+    module = import_module(name)
+    return module.dumps, module.loads
+
+
+def set_backend(name: str = "auto"):
+    global backend, dumps, loads
+    dumps, loads = get_backend(name)
+    backend = _resolve(name)
+
+
+backend: str
+dumps: Callable[[Any], bytes]
+loads: Callable[[Any], Any]
+set_backend()
+
+# 字符串整体匹配, 字符串内部的括号和逗号不会被当成结构字符
+_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{}:,]', re.S)
+_OPEN_RE = re.compile(rb"\s*([\[{])")
+_BLANK_RE = re.compile(rb"\s*")
+
+
+def iter_array(data: bytes | memoryview, path: Sequence[str] = ()) -> Iterator:
+    """
+    逐个解析 JSON 数组中的元素, 不构建整个对象树.
+    path 是从根对象到数组的 key, 如 ("data", "items"); 为空时根节点就是数组. path 不存在时什么也不返回.
+    """
+    keys = list(path)
+    pos = _open(data, 0, keys)
+    while keys:
+        tokens = _TOKEN_RE.finditer(data, pos)
+        depth, key = 1, None
+        for match in tokens:
+            char = match.group()[:1]
+            if char == b'"':
+                key = match.group() if depth == 1 else None
+            elif char == b":":
+                if depth == 1 and json.loads(key) == keys[0]:
+                    keys.pop(0)
+                    pos = _open(data, match.end(), keys)
+                    break
+            elif char in b"[{":
+                depth += 1
+            elif char in b"]}":
+                depth -= 1
+                if depth == 0:
+                    return
+        else:
+            return
+    start, depth = pos, 1
+    for match in _TOKEN_RE.finditer(data, pos):
+        char = match.group()[:1]
+        if char in b"[{":
+            depth += 1
+        elif char in b"]}":
+            depth -= 1
+            if depth == 0:
+                if not _BLANK_RE.fullmatch(data, start, match.start()):
+                    yield loads(data[start : match.start()])
+                return
+        elif char == b"," and depth == 1:
+            yield loads(data[start : match.start()])
+            start = match.end()
+    raise ValueError("unterminated JSON array")
+
+
+def _open(data: bytes | memoryview, pos: int, keys: list) -> int:
+    """跳过空白, 检查下一个值是数组(path 已经走完)或对象, 返回容器内部的起始位置"""
+    expected = b"{" if keys else b"["
+    match = _OPEN_RE.match(data, pos)
+    if match is None or match.group(1) != expected:
+        raise ValueError(f"expected JSON {'object' if keys else 'array'} at position {pos}")
+    return match.end()
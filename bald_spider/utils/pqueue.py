@@ -1,14 +1,394 @@
-from asyncio import PriorityQueue, TimeoutError
+from asyncio import PriorityQueue, Queue, QueueEmpty
+from heapq import heappop, heappush
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from time import monotonic, time, time_ns
 import asyncio
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+from bald_spider.utils.log import get_logger
+from bald_spider.utils.redis_client import RedisError, redis_client, redis_key
+from bald_spider.utils.request import request_from_dict, request_to_dict
 
 
 class SpoderPriorityQueue(PriorityQueue):
 	def __init__(self, maxsize=0):
 		super(SpoderPriorityQueue, self).__init__(maxsize)
 
-	async def get(self):
-		f = super().get()
+	@classmethod
+	def create_instance(cls, crawler):
+		return cls()
+
+	def dump(self):
+		# 内存队列不能自己持久化, 返回待抓取的请求由调度器保存
+		return list(self._queue)
+
+	def checkpoint(self):
+		return list(self._queue)
+
+	def get_nowait(self):
+		# 队列为空时直接返回 None, 由引擎等待入队事件, 不再轮询
 		try:
-			return await asyncio.wait_for(f, timeout=0.1)
-		except TimeoutError:
+			return super().get_nowait()
+		except QueueEmpty:
 			return None
+
+
+class DiskPriorityQueue(Queue):
+	"""
+	落盘的优先级队列: 内存中只保留一个有限大小的热缓冲(最小堆),
+	超出部分序列化后批量写入 sqlite, 内存占用和待抓取的请求数量无关.
+	"""
+
+	def __init__(self, spider, path=None, buffer_size=1000, spill_batch=500):
+		self.spider = spider
+		# 没有指定路径时使用临时目录, 关闭时删除
+		self._tmpdir = None if path else tempfile.mkdtemp(prefix="bald_spider_")
+		self.path = path or os.path.join(self._tmpdir, "requests.db")
+		self.buffer_size = max(1, buffer_size)
+		self.spill_batch = max(1, spill_batch)
+		# 每次从 sqlite 读回的数量, 热缓冲降到 buffer_size - load_batch 以下时就读回一批
+		self.load_batch = max(1, self.buffer_size // 2)
+		super().__init__()
+
+	@classmethod
+	def create_instance(cls, crawler):
+		path = crawler.settings.get("SCHEDULER_DISK_PATH")
+		if not path and crawler.settings.get("JOBDIR"):
+			path = os.path.join(crawler.settings.get("JOBDIR"), "requests.db")
+		return cls(
+			crawler.spider,
+			path=path,
+			buffer_size=crawler.settings.getint("SCHEDULER_MEMORY_BUFFER", 1000),
+		)
+
+	def _init(self, maxsize):
+		self._queue = []
+		self._spill = []
+		self._db = sqlite3.connect(self.path)
+		self._db.execute("PRAGMA journal_mode=WAL")
+		self._db.execute("PRAGMA synchronous=NORMAL")
+		self._db.execute(
+			"CREATE TABLE IF NOT EXISTS requests ("
+			"id INTEGER PRIMARY KEY AUTOINCREMENT, priority INTEGER NOT NULL, data BLOB NOT NULL)"
+		)
+		self._db.execute("CREATE INDEX IF NOT EXISTS requests_priority ON requests (priority, id)")
+		self._disk_size = self._db.execute("SELECT COUNT(*) FROM requests").fetchone()[0]
+		self._disk_min = self._db.execute("SELECT MIN(priority) FROM requests").fetchone()[0]
+
+	def qsize(self):
+		return len(self._queue) + len(self._spill) + self._disk_size
+
+	def empty(self):
+		return self.qsize() == 0
+
+	def _put(self, request):
+		heappush(self._queue, request)
+		if len(self._queue) > self.buffer_size:
+			self._trim(self.buffer_size - self.load_batch)
+		if len(self._spill) >= self.spill_batch:
+			self._flush()
+
+	def _trim(self, size):
+		"""热缓冲只保留优先级最高的 size 个请求, 其余写入磁盘; 排好序的列表也是合法的堆"""
+		if len(self._queue) <= size:
+			return
+		self._queue.sort()
+		for request in self._queue[size:]:
+			self._spill_request(request)
+		del self._queue[size:]
+
+	def _spill_request(self, request):
+		self._spill.append((request.priority, dumps(request_to_dict(request, self.spider), HIGHEST_PROTOCOL)))
+		if self._disk_min is None or request.priority < self._disk_min:
+			self._disk_min = request.priority
+
+	def _get(self):
+		if self._disk_min is not None and (
+			len(self._queue) <= self.buffer_size - self.load_batch or self._disk_min < self._queue[0].priority
+		):
+			self._load()
+		return heappop(self._queue)
+
+	def get_nowait(self):
+		try:
+			return super().get_nowait()
+		except QueueEmpty:
+			return None
+
+	def _flush(self):
+		if not self._spill:
+			return
+		with self._db:
+			self._db.executemany("INSERT INTO requests (priority, data) VALUES (?, ?)", self._spill)
+		self._disk_size += len(self._spill)
+		self._spill.clear()
+
+	def _load(self):
+		# 先给读回的一批请求腾出位置, 热缓冲不会超过 buffer_size
+		self._trim(self.buffer_size - self.load_batch)
+		self._flush()
+		rows = self._db.execute(
+			"SELECT id, data FROM requests ORDER BY priority, id LIMIT ?", (self.load_batch,)
+		).fetchall()
+		with self._db:
+			self._db.executemany("DELETE FROM requests WHERE id = ?", [(row[0],) for row in rows])
+		for _id, data in rows:
+			heappush(self._queue, request_from_dict(loads(data), self.spider))
+		self._disk_size -= len(rows)
+		self._disk_min = self._db.execute("SELECT MIN(priority) FROM requests").fetchone()[0]
+
+	def checkpoint(self):
+		# 定时保存时只提交溢出的请求, 热缓冲不动, 由调度器和其他待抓取请求一起保存
+		self._flush()
+		return list(self._queue)
+
+	def dump(self):
+		# 退出时热缓冲全部写入 sqlite, 队列本身就是持久化的, 不需要调度器额外保存
+		for request in self._queue:
+			self._spill_request(request)
+		self._queue.clear()
+		self._flush()
+		return []
+
+	def close(self):
+		if not self._tmpdir:
+			self.dump()
+		self._db.close()
+		if self._tmpdir:
+			shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+class RedisPriorityQueue:
+	"""
+	多个节点共享的优先级队列(Redis 有序集合, 分数为优先级, 成员为序列化后的请求).
+	取出请求和记录到本节点的处理中集合在同一个事务中完成, 下载完成后删除; 每个节点定时刷新心跳,
+	心跳超时的节点(进程退出或者卡死)处理中的请求由其他节点放回队列.
+	队列为空并且所有存活节点都没有处理中的请求, 持续 REDIS_IDLE_TIME 秒后, 各个节点结束抓取.
+
+	命令在事件循环中同步执行(见 bald_spider.utils.redis_client). Redis 不可用时不中断抓取: 取请求返回 None,
+	新请求和完成记录先保存在本地, 恢复后由维护任务补发; 连接中断时不知道取请求的事务是否执行,
+	恢复后把处理中集合里本节点不认识的请求放回队列.
+	"""
+
+	# 取请求时队首被其他节点抢走(WATCH 失败)的重试次数
+	POP_RETRIES = 10
+
+	def __init__(self, crawler):
+		settings = crawler.settings
+		self.crawler = crawler
+		self.spider = crawler.spider
+		self.client = redis_client(crawler)
+		self.key = redis_key(crawler, "requests")
+		self.workers_key = redis_key(crawler, "workers")
+		self.inflight_prefix = redis_key(crawler, "inflight")
+		self.worker = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+		self.inflight_key = self._inflight_key(self.worker)
+		self.max_inflight = settings.getint("REDIS_MAX_INFLIGHT") or settings.getint("CONCURRENCY") * 2
+		self.heartbeat_timeout = settings.getfloat("REDIS_HEARTBEAT_TIMEOUT")
+		self.poll_interval = settings.getfloat("REDIS_POLL_INTERVAL")
+		self.idle_time = settings.getfloat("REDIS_IDLE_TIME")
+		self.logger = get_logger(self.__class__.__name__, settings.get("LOG_LEVEL"))
+		# 本节点取出还没有完成的请求 -> 队列中的成员
+		self._members = {}
+		# Redis 不可用时还没有发出去的新请求 (优先级, 成员) 和完成记录
+		self._unsent = []
+		self._done = []
+		self._reconcile = False
+		self._available = True
+		self._idle_since = None
+		self._task = None
+
+	@classmethod
+	def create_instance(cls, crawler):
+		return cls(crawler)
+
+	def _inflight_key(self, worker):
+		return f"{self.inflight_prefix}:{worker}"
+
+	def open(self):
+		try:
+			self._heartbeat()
+		except RedisError as exc:
+			self._error(exc)
+		self._task = asyncio.create_task(self._maintain())
+
+	def _member(self, request):
+		# 成员以纳秒时间开头, 同一优先级的请求按入队顺序取出, 相同的请求也不会合并
+		data = dumps(request_to_dict(request, self.spider), HIGHEST_PROTOCOL)
+		return time_ns().to_bytes(8, "big") + os.urandom(4) + data
+
+	def _error(self, exc):
+		if self._available:
+			self._available = False
+			self.logger.error(f"redis unavailable, keep pending requests locally: {exc}")
+
+	async def put(self, request):
+		self.put_nowait(request)
+
+	def put_nowait(self, request):
+		self._unsent.append((request.priority, self._member(request)))
+		self._flush()
+
+	def _flush(self):
+		"""发送本地保存的新请求和完成记录, 重发的成员相同, 不会重复"""
+		commands = []
+		if self._unsent:
+			commands.append(("ZADD", self.key, *[value for pair in self._unsent for value in pair]))
+		if self._done:
+			commands.append(("ZREM", self.inflight_key, *self._done))
+		if not commands:
+			return
+		try:
+			self.client.pipeline(commands)
+		except RedisError as exc:
+			self._error(exc)
+			return
+		self._unsent.clear()
+		self._done.clear()
+
+	def get_nowait(self):
+		# 本节点已经取了足够多的请求, 剩下的留给其他节点
+		if len(self._members) >= self.max_inflight:
+			return None
+		try:
+			for _ in range(self.POP_RETRIES):
+				_, reply = self.client.pipeline([("WATCH", self.key), ("ZRANGE", self.key, 0, 0, "WITHSCORES")])
+				if not reply:
+					self.client.execute("UNWATCH")
+					return None
+				member, score = reply
+				# 取出和记录到处理中集合是原子的, 节点在任何时候退出都不会丢失请求
+				moved = [("ZREM", self.key, member), ("ZADD", self.inflight_key, score, member)]
+				if self.client.transaction(moved) is not None:
+					break
+			else:
+				return None
+		except RedisError as exc:
+			self._reconcile = True
+			self._error(exc)
+			return None
+		request = request_from_dict(loads(member[12:]), self.spider)
+		self._members[request] = member
+		return request
+
+	def request_done(self, request):
+		if (member := self._members.pop(request, None)) is not None:
+			self._done.append(member)
+			self._flush()
+
+	def qsize(self):
+		try:
+			size = self.client.execute("ZCARD", self.key)
+		except RedisError as exc:
+			self._error(exc)
+			size = 0
+		return size + len(self._unsent)
+
+	def empty(self):
+		if self._unsent:
+			return False
+		try:
+			return self.client.execute("ZCARD", self.key) == 0
+		except RedisError as exc:
+			# 不知道队列是否为空, 不能结束抓取
+			self._error(exc)
+			return False
+
+	def idle(self):
+		"""所有节点都没有待抓取和处理中的请求"""
+		if self._members or self._unsent or self._done or self._reconcile or not self.empty():
+			self._idle_since = None
+			return False
+		try:
+			alive = self.client.execute("ZRANGEBYSCORE", self.workers_key, time() - self.heartbeat_timeout, "+inf")
+			busy = alive and any(self.client.pipeline([("ZCARD", self._inflight_key(w.decode())) for w in alive]))
+		except RedisError as exc:
+			self._error(exc)
+			busy = True
+		if busy:
+			self._idle_since = None
+			return False
+		now = monotonic()
+		if self._idle_since is None:
+			self._idle_since = now
+		return now - self._idle_since >= self.idle_time
+
+	def dump(self):
+		# 队列本身保存在 Redis 中, 不需要调度器额外保存
+		return []
+
+	def checkpoint(self):
+		return []
+
+	async def _maintain(self):
+		while True:
+			await asyncio.sleep(self.poll_interval)
+			try:
+				self._heartbeat()
+				if not self._available:
+					self._available = True
+					self.logger.info("redis available again")
+				self._flush()
+				if self._reconcile:
+					self._requeue_unknown()
+				self._requeue_dead()
+			except RedisError as exc:
+				self._error(exc)
+			# 其他节点可能放入了新请求, 或者全部空闲可以结束了
+			self.crawler.engine.wakeup()
+
+	def _heartbeat(self):
+		self.client.execute("ZADD", self.workers_key, time(), self.worker)
+
+	def _requeue_unknown(self):
+		"""连接中断时执行了但是没有收到结果的取请求事务, 请求在处理中集合里, 本节点却不知道"""
+		pairs = self.client.execute("ZRANGE", self.inflight_key, 0, -1, "WITHSCORES")
+		known = set(self._members.values())
+		orphans = [(pairs[i + 1], pairs[i]) for i in range(0, len(pairs), 2) if pairs[i] not in known]
+		if orphans:
+			self.client.transaction([
+				("ZREM", self.inflight_key, *[member for _, member in orphans]),
+				("ZADD", self.key, *[value for pair in orphans for value in pair]),
+			])
+			self.logger.warning(f"requeued {len(orphans)} requests popped while redis connection was lost")
+		self._reconcile = False
+
+	def _requeue_dead(self):
+		dead = self.client.execute("ZRANGEBYSCORE", self.workers_key, "-inf", f"({time() - self.heartbeat_timeout}")
+		for worker in dead:
+			worker = worker.decode()
+			count = self._requeue(worker)
+			self.logger.warning(f"worker {worker} heartbeat timeout, requeued {count} requests")
+			self.crawler.stats.inc_value("redis_requeued_count", count)
+
+	def _requeue(self, worker):
+		"""把节点处理中的请求放回队列, 多个节点同时执行时只有一个能拿到"""
+		inflight = self._inflight_key(worker)
+		pairs, _, _ = self.client.transaction(
+			[("ZRANGE", inflight, 0, -1, "WITHSCORES"), ("DEL", inflight), ("ZREM", self.workers_key, worker)]
+		)
+		if pairs:
+			# ZRANGE 返回 member, score, ZADD 的参数是 score, member
+			args = [value for i in range(0, len(pairs), 2) for value in (pairs[i + 1], pairs[i])]
+			self.client.execute("ZADD", self.key, *args)
+		return len(pairs) // 2
+
+	def close(self):
+		if self._task is not None:
+			self._task.cancel()
+			self._task = None
+		# 先补发新请求和已经完成的记录, 没有完成的请求(ctrl + c 时还在下载或者在槽位中等待)还在处理中集合里,
+		# 由 _requeue 放回队列; Redis 不可用时留在处理中集合, 心跳超时后由其他节点放回
+		self._members.clear()
+		self._flush()
+		try:
+			if count := self._requeue(self.worker):
+				self.logger.info(f"requeued {count} unfinished requests")
+		except RedisError as exc:
+			self.logger.error(f"requeue unfinished requests failed: {exc}")
+		if self._unsent:
+			self.logger.error(f"redis unavailable, {len(self._unsent)} new requests are lost")
+		self.client.close()
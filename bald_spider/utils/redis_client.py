@@ -0,0 +1,156 @@
+"""
+最小的 Redis 客户端(RESP2 协议), 分布式抓取的队列 去重和统计使用, 不依赖第三方库.
+命令在调用者的线程(通常是事件循环)中同步执行, 本机或者同一个机房的 Redis 一次往返只需要几十微秒,
+多条命令用 pipeline 一次发送. Redis 不可用时, 每个命令最多阻塞 REDIS_SOCKET_TIMEOUT 秒,
+之后进入退避: 退避期间的命令直接抛出 RedisError 不再连接, 退避时间从 1 秒开始每次失败翻倍, 最多 30 秒.
+"""
+
+import socket
+from time import monotonic
+from typing import Any, Iterable, List, Sequence
+from urllib.parse import unquote, urlsplit
+
+
+class RedisError(Exception):
+    pass
+
+
+def _encode(args: Sequence) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, (int, float)):
+            arg = repr(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+class RedisClient:
+    BACKOFF_MIN = 1.0
+    BACKOFF_MAX = 30.0
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 6379,
+        db: int = 0,
+        password: str | None = None,
+        username: str | None = None,
+        timeout: float = 10.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.username = username
+        self.timeout = timeout
+        self._sock: socket.socket | None = None
+        self._file = None
+        self._backoff = 0.0
+        self._retry_at = 0.0
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisClient":
+        """redis://[[username]:password@]host[:port][/db]"""
+        parts = urlsplit(url)
+        if parts.scheme != "redis":
+            raise ValueError(f"unsupported redis url: {url}")
+        return cls(
+            host=parts.hostname or "127.0.0.1",
+            port=parts.port or 6379,
+            db=int(parts.path.strip("/") or 0),
+            password=unquote(parts.password) if parts.password else None,
+            username=unquote(parts.username) if parts.username else None,
+            **kwargs,
+        )
+
+    def _connect(self):
+        if (wait := self._retry_at - monotonic()) > 0:
+            raise RedisError(f"redis {self.host}:{self.port} unavailable, retry in {wait:.1f}s")
+        try:
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+        except OSError as exc:
+            self._fail()
+            raise RedisError(f"can not connect to redis {self.host}:{self.port}: {exc}") from exc
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock, self._file = sock, sock.makefile("rb")
+        commands = []
+        if self.password:
+            commands.append(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password))
+        if self.db:
+            commands.append(("SELECT", self.db))
+        if commands:
+            self.pipeline(commands)
+
+    def execute(self, *args) -> Any:
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands: Iterable[Sequence]) -> List[Any]:
+        """一次发送多条命令, 按顺序返回结果, 有命令出错时读完所有结果再抛出第一个错误"""
+        commands = list(commands)
+        if self._sock is None:
+            self._connect()
+        try:
+            self._sock.sendall(b"".join(_encode(args) for args in commands))
+            replies = [self._read() for _ in commands]
+        except OSError as exc:
+            # 连接断开后不知道命令是否执行, 交给调用者处理, 退避之后重新连接
+            self.close()
+            self._fail()
+            raise RedisError(f"connection to redis {self.host}:{self.port} lost: {exc}") from exc
+        self._backoff = 0.0
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def _fail(self):
+        self._backoff = min(self._backoff * 2 or self.BACKOFF_MIN, self.BACKOFF_MAX)
+        self._retry_at = monotonic() + self._backoff
+
+    def transaction(self, commands: Iterable[Sequence]) -> List[Any]:
+        """MULTI/EXEC 中原子地执行多条命令, WATCH 的 key 被修改时返回 None"""
+        commands = list(commands)
+        replies = self.pipeline([("MULTI",), *commands, ("EXEC",)])
+        return replies[-1]
+
+    def _read(self) -> Any:
+        line = self._file.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionResetError("connection closed by redis")
+        kind, value = line[:1], line[1:-2]
+        if kind == b"+":
+            return value.decode()
+        if kind == b"-":
+            return RedisError(value.decode())
+        if kind == b":":
+            return int(value)
+        if kind == b"$":
+            if (size := int(value)) < 0:
+                return None
+            data = self._file.read(size + 2)
+            if len(data) != size + 2:
+                raise ConnectionResetError("connection closed by redis")
+            return data[:-2]
+        if kind == b"*":
+            if (size := int(value)) < 0:
+                return None
+            return [self._read() for _ in range(size)]
+        raise RedisError(f"unknown reply from redis: {line!r}")
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = self._file = None
+
+
+def redis_client(crawler) -> RedisClient:
+    settings = crawler.settings
+    return RedisClient.from_url(settings.get("REDIS_URL"), timeout=settings.getfloat("REDIS_SOCKET_TIMEOUT"))
+
+
+def redis_key(crawler, name: str) -> str:
+    """同一个爬虫的所有节点使用相同的 key, REDIS_KEY 没有设置时按爬虫名称生成"""
+    return f"{crawler.settings.get('REDIS_KEY') or f'bald_spider:{crawler.spider}'}:{name}"
@@ -0,0 +1,79 @@
+from hashlib import sha1
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """规范化url: scheme/host 小写、去掉默认端口和锚点、参数排序"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if parts.port and _DEFAULT_PORTS.get(scheme) == parts.port:
+        netloc = netloc.rsplit(":", 1)[0]
+    path = quote(parts.path, safe="/%:@&=+$,;~!*'()") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def _body_bytes(body) -> bytes:
+    if not body:
+        return b""
+    if isinstance(body, bytes):
+        return body
+    if isinstance(body, dict):
+        return urlencode(sorted(body.items())).encode()
+    return str(body).encode()
+
+
+def request_fingerprint(request) -> bytes:
+    """请求指纹: method + 规范化后的url + body"""
+    fp = sha1(request.method.upper().encode())
+    fp.update(canonicalize_url(request.url).encode())
+    fp.update(_body_bytes(request.body))
+    return fp.digest()
+
+
+def _callback_name(callback, spider):
+    if callback is None:
+        return None
+    name = getattr(callback, "__name__", None)
+    if getattr(callback, "__self__", None) is spider and name:
+        return name
+    raise ValueError(f"callback {callback!r} must be a method of {spider} to be serialized.")
+
+
+def request_to_dict(request, spider) -> dict:
+    """序列化请求, 回调函数只保存方法名, 默认值不保存以节省空间"""
+    d = {"url": request.url}
+    if request.callback is not None:
+        d["callback"] = _callback_name(request.callback, spider)
+    if request.method != "GET":
+        d["method"] = request.method
+    if request.priority:
+        d["priority"] = request.priority
+    if request.headers_or_none:
+        d["headers"] = request.headers_or_none
+    if request.cookie:
+        d["cookie"] = request.cookie
+    if request.proxy:
+        d["proxy"] = request.proxy
+    if request.body:
+        d["body"] = request.body
+    if request.encoding != "utf-8":
+        d["encoding"] = request.encoding
+    if request.meta_or_none:
+        d["meta"] = request.meta_or_none
+    if request.dont_filter:
+        d["dont_filter"] = True
+    return d
+
+
+def request_from_dict(d: dict, spider):
+    from bald_spider.http.request import Request
+
+    d = dict(d)
+    callback = d.pop("callback", None)
+    if callback is not None:
+        callback = getattr(spider, callback)
+    return Request(callback=callback, **d)
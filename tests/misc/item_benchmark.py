@@ -0,0 +1,124 @@
+"""
+item_benchmark.py
+
+对比旧版 Item(dict 存储 + __getattribute__ 拦截每次属性访问 + deepcopy)和按下标存储的 Item,
+分别测试 1M 个 item 的创建、读写字段、拷贝、导出(to_dict + json)耗时以及单个 item 的内存占用.
+
+运行: python -m tests.misc.item_benchmark
+"""
+
+import tracemalloc
+from collections.abc import MutableMapping
+from copy import deepcopy
+from time import perf_counter
+
+from bald_spider import Item
+from bald_spider.items import Field
+from bald_spider.utils.json_backend import dumps
+
+N = 1_000_000
+
+
+class LegacyItem(MutableMapping):
+    """旧实现, 字段由子类的 FIELDS 指定"""
+
+    FIELDS: dict
+
+    def __init__(self, *args, **kwargs) -> None:
+        self._values = {}
+        if kwargs:
+            for key, value in kwargs.items():
+                self[key] = value
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            self._values[key] = value
+        else:
+            raise KeyError(f"{self.__class__.__name__} does not support field: {key}")
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __delitem__(self, key):
+        del self._values[key]
+
+    def __setattr__(self, key, value):
+        if key.startswith("_") or key in ["values"]:
+            super().__setattr__(key, value)
+        else:
+            raise AttributeError(f"use item[{key!r}]={value!r} to set field value.")
+
+    def __getattribute__(self, item):
+        fields = super().__getattribute__("FIELDS")
+        if item in fields:
+            raise AttributeError(f"use item[{item!r}] to get field value.")
+        else:
+            return super().__getattribute__(item)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def to_dict(self):
+        return dict(self)
+
+    def copy(self):
+        return deepcopy(self)
+
+
+class LegacyArticle(LegacyItem):
+    FIELDS = {"url": Field(), "title": Field(), "author": Field(), "views": Field(), "tags": Field()}
+
+
+class Article(Item):
+    url = Field()
+    title = Field()
+    author = Field()
+    views = Field()
+    tags = Field()
+
+
+def bench(name, fn, n=N):
+    start = perf_counter()
+    fn(n)
+    elapsed = perf_counter() - start
+    print(f"  {name:<10} {elapsed:6.2f}s  {elapsed / n * 1e9:7.0f} ns/item")
+
+
+def run(cls):
+    print(cls.__name__)
+    items = []
+
+    def create(n):
+        for i in range(n):
+            items.append(cls(url="https://example.com/", title="title", author="author", views=i, tags=["a"]))
+
+    def set_get(n):
+        for item in items[:n]:
+            item["views"] = item["views"] + 1
+            item.get("author")
+
+    def copy(n):
+        for item in items[:n]:
+            item.copy()
+
+    def export(n):
+        for item in items[:n]:
+            dumps(item.to_dict())
+
+    bench("create", create)
+    bench("set/get", set_get)
+    bench("copy", copy, n=N // 10)
+    bench("export", export)
+    tracemalloc.start()
+    sample = [cls(url="https://example.com/", title="title", author="author", views=i, tags=None) for i in range(10000)]
+    size = tracemalloc.get_traced_memory()[0] / len(sample)
+    tracemalloc.stop()
+    print(f"  memory     {size:6.0f} bytes/item")
+
+
+if __name__ == "__main__":
+    run(LegacyArticle)
+    run(Article)
@@ -0,0 +1,56 @@
+"""
+json_response_benchmark.py
+
+对比 response.json() 的旧实现(先解码成 str 并缓存, 再 ujson.loads)和直接从 bytes 解析,
+以及 iter_json 逐个解析大数组时的峰值内存(不包括响应体本身).
+
+运行: python -m tests.misc.json_response_benchmark
+"""
+
+import timeit
+import tracemalloc
+
+import ujson
+
+from bald_spider import Request
+from bald_spider.http.response import Response
+from bald_spider.utils import json_backend
+
+ROWS = 20_000
+URL = "https://api.example.com/list"
+BODY = json_backend.dumps(
+    {"code": 0, "data": {"items": [{"id": i, "title": f"标题 {i}", "tags": ["a", "b"], "price": i * 0.5} for i in range(ROWS)]}}
+)
+
+
+def make_response():
+    return Response(URL, request=Request(URL), headers={"Content-Type": "application/json"}, body=BODY)
+
+
+def legacy_json():
+    response = make_response()
+    # 旧实现: text 解码后缓存在响应上, 再从 str 解析
+    response._text_cache = str(response.body, "utf-8")
+    return ujson.loads(response._text_cache)
+
+
+def peak(func):
+    tracemalloc.start()
+    func()
+    size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size / 1024 / 1024
+
+
+def main():
+    number = 20
+    print(f"backend: {json_backend.backend}, body: {len(BODY) / 1024 / 1024:.1f} MB, {ROWS} rows")
+    before = timeit.timeit(legacy_json, number=number) / number * 1000
+    after = timeit.timeit(lambda: make_response().json(), number=number) / number * 1000
+    print(f"json()     before: {before:6.2f} ms  after: {after:6.2f} ms")
+    print(f"peak memory json():      {peak(lambda: make_response().json()):6.2f} MB")
+    print(f"peak memory iter_json(): {peak(lambda: sum(1 for _ in make_response().iter_json('data.items'))):6.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
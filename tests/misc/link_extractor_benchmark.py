@@ -0,0 +1,66 @@
+"""
+link_extractor_benchmark.py
+
+对比手写的链接循环(xpath 取 href, 逐个 urljoin, 逐个匹配规则, 去重后生成 Request)和 LinkExtractor.
+每次都是新的 Response, 包括解码和提取.
+
+运行: python -m tests.misc.link_extractor_benchmark
+"""
+
+import re
+import timeit
+
+from bald_spider import Request
+from bald_spider.http.response import Response
+from bald_spider.linkextractors import LinkExtractor
+
+URL = "https://www.example.com/list/1"
+LINKS = 3000
+PAGE = (
+    "<html><head><title>列表</title></head><body>"
+    + "".join(
+        f'<div><a href="/detail/{i % 2000}?from=list">第 {i} 条</a>'
+        f'<a href="https://cdn.example.net/img/{i}.jpg">图片</a><a href="page-{i % 50}.html#top">分页</a></div>'
+        for i in range(LINKS // 3)
+    )
+    + "</body></html>"
+).encode()
+ALLOW = [re.compile(r"/detail/\d+"), re.compile(r"/list/page-\d+\.html")]
+DENY = [re.compile(r"\.jpg$")]
+
+
+def make_response():
+    return Response(URL, request=Request(URL), headers={"Content-Type": "text/html"}, body=PAGE)
+
+
+def hand_written():
+    response = make_response()
+    seen = set()
+    requests = []
+    for href in response.xpath("//a/@href").getall():
+        url = response.urljoin(href).split("#")[0]
+        if url in seen or "example.com" not in url:
+            continue
+        seen.add(url)
+        if any(p.search(url) for p in ALLOW) and not any(p.search(url) for p in DENY):
+            requests.append(Request(url))
+    return requests
+
+
+extractor = LinkExtractor(allow=ALLOW, deny=DENY, allow_domains="example.com")
+
+
+def link_extractor():
+    return extractor.extract_requests(make_response())
+
+
+def main():
+    number = 50
+    assert [r.url for r in hand_written()] == [r.url for r in link_extractor()]
+    print(f"page: {len(PAGE) / 1024:.0f} KB, {LINKS} links, {len(link_extractor())} requests")
+    for name, func in (("hand written", hand_written), ("LinkExtractor", link_extractor)):
+        print(f"{name:<14} {timeit.timeit(func, number=number) / number * 1000:6.2f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
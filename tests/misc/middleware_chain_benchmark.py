@@ -0,0 +1,106 @@
+"""
+middleware_chain_benchmark.py
+
+对比中间件链预编译前后, 每个请求在 MiddlewareManager 中的开销(下载函数直接返回响应).
+旧实现每次调用都通过 common_call 判断是否协程, 并且每个响应都创建一个通知任务.
+
+运行: python -m tests.misc.middleware_chain_benchmark
+"""
+
+import asyncio
+from asyncio import create_task
+from time import perf_counter
+from types import SimpleNamespace
+
+from bald_spider import Request, Response
+from bald_spider.middleware import BaseMiddleware
+from bald_spider.middleware.middleware_manager import MiddlewareManager
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.stats_collector import StatsCollector
+from bald_spider.subscriber import Subscriber
+from bald_spider.utils.project import common_call
+from bald_spider.event import response_received
+
+N = 100_000
+MIDDLEWARES = [
+    "bald_spider.middleware.default_header.DefaultHeader",
+    "bald_spider.middleware.response_code.ResponseCodeStats",
+    "tests.misc.middleware_chain_benchmark.AsyncMiddleware",
+    "tests.misc.middleware_chain_benchmark.ExceptionMiddleware",
+]
+
+
+class AsyncMiddleware(BaseMiddleware):
+    async def process_request(self, request, spider):
+        pass
+
+    async def process_response(self, request, response, spider):
+        return response
+
+
+class ExceptionMiddleware(BaseMiddleware):
+    def process_exception(self, request, exception, spider):
+        pass
+
+
+class LegacyMiddlewareManager(MiddlewareManager):
+    """预编译之前的实现"""
+
+    async def _process_request(self, request):
+        for method in self.methods["process_request"]:
+            result = await common_call(method, request, self.crawler.spider)
+            if result == None:
+                continue
+            if isinstance(result, (Request, Response)):
+                return result
+        return await self.download_method(request)
+
+    async def _process_response(self, request, response):
+        for method in reversed(self.methods["process_response"]):
+            response = await common_call(method, request, response, self.crawler.spider)
+            if isinstance(response, Request):
+                return response
+        return response
+
+    async def download(self, request):
+        response = await self._process_request(request)
+        create_task(self.crawler.subscriber.notify(response_received, response, self.crawler.spider))
+        self.crawler.stats.inc_value("response_received_count")
+        if isinstance(response, Response):
+            response = await self._process_response(request, response)
+        return response
+
+
+def create_crawler():
+    async def download(request):
+        return Response(request.url, request=request, headers={}, body=b"", status_code=200)
+
+    crawler = SimpleNamespace(settings=SettingsManager({"MIDDLEWARES": MIDDLEWARES, "LOG_LEVEL": "WARNING"}))
+    crawler.stats = StatsCollector(crawler)
+    crawler.subscriber = Subscriber()
+    crawler.spider = "BenchmarkSpider"
+    crawler.engine = SimpleNamespace(downloader=SimpleNamespace(download=download))
+    return crawler
+
+
+async def bench(manager_cls):
+    manager = manager_cls(create_crawler())
+    request = Request("http://example.com/")
+    start = perf_counter()
+    for _ in range(N):
+        await manager.download(request)
+    elapsed = perf_counter() - start
+    await asyncio.sleep(0)
+    return elapsed / N * 1e6
+
+
+async def run():
+    legacy = await bench(LegacyMiddlewareManager)
+    compiled = await bench(MiddlewareManager)
+    print(f"{len(MIDDLEWARES)} middlewares, {N} requests")
+    print(f"legacy:   {legacy:.2f} us/request")
+    print(f"compiled: {compiled:.2f} us/request ({legacy / compiled:.2f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
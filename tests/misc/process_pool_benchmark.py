@@ -0,0 +1,82 @@
+"""
+process_pool_benchmark.py
+
+本地起一个 aiohttp 服务, 抓取 N 个页面, 每个页面的回调函数做大量解析(CPU 密集),
+对比回调函数在事件循环中执行和放到进程池(PROCESS_POOL_CALLBACKS)中执行的总耗时.
+
+运行: python -m tests.misc.process_pool_benchmark
+"""
+
+import asyncio
+import os
+import time
+
+from aiohttp import web
+
+from bald_spider import Item
+from bald_spider.crawler import CrawlerProcess
+from bald_spider.http.request import Request
+from bald_spider.items import Field
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.spider import Spider
+
+PAGES = 200
+PORT = 8790
+BODY = (
+    "<html><head><title>page</title></head><body>"
+    + "".join(f'<div class="row"><a href="/item/{i}">第 {i} 条</a><span>{i * 3}</span></div>' for i in range(3000))
+    + "</body></html>"
+)
+
+
+class RowsItem(Item):
+    url = Field()
+    total = Field()
+
+
+class HeavySpider(Spider):
+    start_urls = [f"http://127.0.0.1:{PORT}/page/{i}" for i in range(PAGES)]
+
+    def start_requests(self):
+        for url in self.start_urls:
+            yield Request(url, dont_filter=True)
+
+    def parse(self, response):
+        total = 0
+        for row in response.xpath("//div[@class='row']"):
+            total += int(row.xpath("./span/text()").get())
+        yield RowsItem(url=response.url, total=total)
+
+
+async def page(request):
+    return web.Response(text=BODY, content_type="text/html")
+
+
+async def crawl(settings):
+    process = CrawlerProcess(SettingsManager({"LOG_LEVEL": "WARNING", "INTERVAL": 60, **settings}))
+    await process.crawl(HeavySpider)
+    start = time.perf_counter()
+    await process.start()
+    crawler = next(iter(process.crawlers))
+    return time.perf_counter() - start, crawler.stats.get_value("item_successful_count")
+
+
+async def main():
+    app = web.Application()
+    app.router.add_get("/page/{i}", page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+    workers = os.cpu_count()
+    print(f"{PAGES} pages, {len(BODY) // 1024} KB each, {workers} CPUs")
+    for name, settings in (
+        ("event loop", {}),
+        (f"process pool ({workers})", {"PROCESS_POOL_CALLBACKS": ["parse"]}),
+    ):
+        elapsed, items = await crawl(settings)
+        print(f"{name:<20} {elapsed:6.2f} s  {PAGES / elapsed:7.1f} pages/s  items: {items}")
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+request_memory_benchmark.py
+
+测量调度队列中每个待抓取请求占用的内存(字节), 对比旧版 Request(实例 __dict__, 每个请求都创建 headers 和 meta 字典)
+和 __slots__ 版本. url 字符串本身的内存也计算在内.
+
+运行: python -m tests.misc.request_memory_benchmark
+"""
+
+import gc
+import tracemalloc
+
+from bald_spider import Request
+from bald_spider.utils.pqueue import SpoderPriorityQueue
+
+N = 200_000
+
+
+class LegacyRequest:
+    """旧实现"""
+
+    def __init__(
+        self,
+        url,
+        *,
+        headers=None,
+        callback=None,
+        priority=0,
+        method="GET",
+        cookie=None,
+        proxy=None,
+        body="",
+        encoding="utf-8",
+        meta=None,
+        dont_filter=False,
+    ):
+        self.url = url
+        self.headers = headers if headers else {}
+        self.callback = callback
+        self.priority = priority
+        self.method = method
+        self.cookie = cookie
+        self.proxy = proxy
+        self.body = body
+        self.encoding = encoding
+        self._meta = meta if meta is not None else {}
+        self.dont_filter = dont_filter
+
+    def __lt__(self, other):
+        return self.priority < other.priority
+
+
+def measure(cls, with_meta):
+    gc.collect()
+    tracemalloc.start()
+    queue = SpoderPriorityQueue()
+    for i in range(N):
+        meta = {"depth": 1} if with_meta else None
+        queue.put_nowait(cls(f"https://example.com/page/{i}", priority=i % 10, meta=meta))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / N
+
+
+def main():
+    for title, with_meta in (("plain", False), ("with meta", True)):
+        before = measure(LegacyRequest, with_meta)
+        after = measure(Request, with_meta)
+        print(f"{title:<10} before: {before:6.0f} bytes/request  after: {after:6.0f} bytes/request")
+
+
+if __name__ == "__main__":
+    main()
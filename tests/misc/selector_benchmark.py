@@ -0,0 +1,62 @@
+"""
+selector_benchmark.py
+
+对比旧的 Selector(response.text) 和从 bytes 直接解析的耗时,
+以及用 xpath 和快速提取(不解析 DOM)取标题 链接 meta 的耗时. 每次都是新的 Response, 包括解码和解析,
+不包括把链接拼接成绝对地址.
+
+运行: python -m tests.misc.selector_benchmark
+"""
+
+import timeit
+from parsel import Selector
+
+from bald_spider import Request
+from bald_spider.http.response import Response
+from bald_spider.utils.html import get_links
+
+URL = "https://www.example.com/list/1"
+PAGE = (
+    "<html><head><meta charset='utf-8'><title>示例页面</title>"
+    '<meta name="description" content="描述"><meta name="keywords" content="a,b"></head><body>'
+    + "".join(f'<div class="item"><a href="/detail/{i}?from=list">第 {i} 条</a><p>{"内容" * 20}</p></div>' for i in range(1000))
+    + "</body></html>"
+).encode()
+
+
+def make_response():
+    return Response(URL, request=Request(URL), headers={"Content-Type": "text/html"}, body=PAGE)
+
+
+def legacy_xpath():
+    response = make_response()
+    # 旧实现: 先解码成 str, parsel 再编码回 utf-8 交给 lxml
+    selector = Selector(str(response.body, "utf-8"))
+    selector.xpath("//title/text()").get()
+    selector.xpath("//a/@href").getall()
+    selector.xpath("//meta[@name='description']/@content").get()
+
+
+def new_xpath():
+    response = make_response()
+    response.xpath("//title/text()").get()
+    response.xpath("//a/@href").getall()
+    response.xpath("//meta[@name='description']/@content").get()
+
+
+def fast_path():
+    response = make_response()
+    response.title()
+    get_links(response.text)
+    response.html_meta()
+
+
+def main():
+    number = 100
+    print(f"page: {len(PAGE) / 1024:.0f} KB, 1000 links")
+    for name, func in (("Selector(text) + xpath", legacy_xpath), ("bytes + xpath", new_xpath), ("fast path", fast_path)):
+        print(f"{name:<24} {timeit.timeit(func, number=number) / number * 1000:6.2f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
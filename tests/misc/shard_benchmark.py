@@ -0,0 +1,88 @@
+"""
+shard_benchmark.py
+
+在单独的进程中起一个 aiohttp 服务, 用 8 个本地地址(127.0.0.1 ~ 127.0.0.8)模拟 8 个站点,
+每个页面的回调函数做一些解析, 对比单进程抓取和 CRAWLER_PROCESSES 个进程按域名分片抓取的总耗时.
+
+运行: python -m tests.misc.shard_benchmark
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+
+from aiohttp import web
+
+from bald_spider import Item
+from bald_spider.crawler import CrawlerProcess
+from bald_spider.http.request import Request
+from bald_spider.items import Field
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.spider import Spider
+
+PAGES = 400
+HOSTS = 8
+PORT = 8792
+ROWS = "".join(f'<div class="row"><span>{i}</span></div>' for i in range(500))
+
+
+def url(i):
+    return f"http://127.0.0.{i % HOSTS + 1}:{PORT}/page/{i}"
+
+
+class RowsItem(Item):
+    url = Field()
+    total = Field()
+
+
+class SiteSpider(Spider):
+    start_urls = [url(0)]
+
+    def parse(self, response):
+        total = sum(int(value) for value in response.xpath("//div[@class='row']/span/text()").getall())
+        yield RowsItem(url=response.url, total=total)
+        for href in response.xpath("//a/@href").getall():
+            yield Request(href, callback=self.parse)
+
+
+async def page(request):
+    i = int(request.match_info["i"])
+    links = "".join(f'<a href="{url(j)}">{j}</a>' for j in range(i * 4 + 1, i * 4 + 5) if j < PAGES)
+    return web.Response(text=f"<html><body>{links}{ROWS}</body></html>", content_type="text/html")
+
+
+def serve():
+    app = web.Application()
+    app.router.add_get("/page/{i}", page)
+    web.run_app(app, host="0.0.0.0", port=PORT, print=None)
+
+
+async def crawl(settings):
+    process = CrawlerProcess(SettingsManager({"LOG_LEVEL": "WARNING", "INTERVAL": 60, "STATS_DUMP": False, **settings}))
+    await process.crawl(SiteSpider)
+    start = time.perf_counter()
+    await process.start()
+    crawler = next(iter(process.crawlers))
+    return time.perf_counter() - start, crawler.stats.get_value("item_successful_count")
+
+
+async def main():
+    processes = max(os.cpu_count() or 1, 2)
+    print(f"{PAGES} pages on {HOSTS} hosts, {os.cpu_count()} CPUs")
+    for name, settings in (
+        ("1 process", {}),
+        (f"{processes} processes", {"CRAWLER_PROCESSES": processes}),
+    ):
+        elapsed, items = await crawl(settings)
+        print(f"{name:<14} {elapsed:6.2f} s  {PAGES / elapsed:7.1f} pages/s  items: {items}")
+
+
+if __name__ == "__main__":
+    server = multiprocessing.Process(target=serve, daemon=True)
+    server.start()
+    time.sleep(1)
+    try:
+        asyncio.run(main())
+    finally:
+        server.terminate()
@@ -0,0 +1,66 @@
+"""
+sqlite_pipeline_benchmark.py
+
+测试 SqlitePipeline 经过 PipelineManager 的写入速度(每秒条数), 分别测试直接插入和按 url upsert.
+
+运行: python -m tests.misc.sqlite_pipeline_benchmark
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+from time import perf_counter
+from types import SimpleNamespace
+
+from bald_spider import Item
+from bald_spider.items import Field
+from bald_spider.pipelines.pipeline_manager import PipelineManager
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.stats_collector import StatsCollector
+from bald_spider.subscriber import Subscriber
+
+N = 200_000
+
+
+class ArticleItem(Item):
+    url = Field(sqlite_type="TEXT")
+    title = Field(sqlite_type="TEXT")
+    views = Field(sqlite_type="INTEGER")
+    tags = Field()
+
+
+async def run(path, upsert_keys):
+    settings = SettingsManager(
+        {
+            "ITEM_PIPELINES": ["bald_spider.pipelines.sqlite.SqlitePipeline"],
+            "SQLITE_PATH": path,
+            "SQLITE_UPSERT_KEYS": upsert_keys,
+            "LOG_LEVEL": "WARNING",
+        }
+    )
+    crawler = SimpleNamespace(settings=settings, spider="benchmark", subscriber=Subscriber())
+    crawler.stats = StatsCollector(crawler)
+    manager = PipelineManager(crawler)
+    manager.logger.setLevel("WARNING")
+    await manager.open_spider()
+    start = perf_counter()
+    for i in range(N):
+        # upsert 时有一半是重复的 url
+        n = i // 2 if upsert_keys else i
+        await manager.process_item(ArticleItem(url=f"https://example.com/{n}", title=f"title {i}", views=i, tags=["a", "b"]))
+    await manager.close_spider()
+    return perf_counter() - start
+
+
+def main():
+    for upsert_keys in ([], ["url"]):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "items.db")
+            elapsed = asyncio.run(run(path, upsert_keys))
+            rows = sqlite3.connect(path).execute("select count(*) from articleitem").fetchone()[0]
+            print(f"upsert_keys={upsert_keys}: {N / elapsed:,.0f} items/s, {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
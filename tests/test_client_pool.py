@@ -0,0 +1,37 @@
+"""
+Tests for the LRU pool of downloader clients
+"""
+
+import asyncio
+
+from bald_spider.core.downloader.pool import ClientPool
+
+
+class FakeClient:
+	def __init__(self, key):
+		self.key = key
+		self.closed = False
+
+	async def close(self):
+		self.closed = True
+
+
+def test_evicts_least_recently_used_after_requests_finish():
+	async def main():
+		pool = ClientPool(FakeClient, FakeClient.close, maxsize=3)
+		default, a = pool.get(None), pool.get("a")
+		with pool.use("b") as b:
+			pool.get("a")
+			# 超过上限, 淘汰最久没有使用的 b, 默认客户端不会被淘汰
+			c = pool.get("c")
+			await asyncio.sleep(0)
+			assert "b" not in pool and len(pool) == 3 and not b.closed
+		await asyncio.sleep(0)
+		assert b.closed and not a.closed and not default.closed
+		pool.get("d", "created-from-args")
+		await asyncio.sleep(0)
+		assert a.closed and pool.get("d").key == "created-from-args"
+		await pool.close()
+		assert default.closed and c.closed and len(pool) == 0
+
+	asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Tests for request fingerprints and dupefilters
+"""
+
+from types import SimpleNamespace
+
+from bald_spider import Request
+from bald_spider.dupefilter.bloom_filter import BloomDupeFilter
+from bald_spider.dupefilter.memory_filter import MemoryDupeFilter
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.utils.request import canonicalize_url, request_fingerprint
+
+
+def _crawler(**values):
+	return SimpleNamespace(settings=SettingsManager(values))
+
+
+def _seen(dupefilter, urls):
+	return [dupefilter.request_seen(Request(url)) for url in urls]
+
+
+def test_canonicalize_url():
+	assert canonicalize_url("HTTP://Example.com:80/a?b=2&a=1#frag") == "http://example.com/a?a=1&b=2"
+	assert canonicalize_url("https://example.com") == "https://example.com/"
+
+
+def test_request_fingerprint():
+	assert request_fingerprint(Request("http://a.com/?x=1&y=2")) == request_fingerprint(Request("http://A.com/?y=2&x=1"))
+	assert request_fingerprint(Request("http://a.com/")) != request_fingerprint(Request("http://a.com/", method="POST"))
+	assert request_fingerprint(Request("http://a.com/", body="1")) != request_fingerprint(Request("http://a.com/", body="2"))
+
+
+def test_memory_dupefilter():
+	dupefilter = MemoryDupeFilter(_crawler())
+	assert not dupefilter.request_seen(Request("http://a.com/1"))
+	assert dupefilter.request_seen(Request("http://a.com/1"))
+	assert not dupefilter.request_seen(Request("http://a.com/2"))
+	assert len(dupefilter) == 2
+
+
+def test_bloom_dupefilter():
+	dupefilter = BloomDupeFilter(_crawler(BLOOM_CAPACITY=10000, BLOOM_ERROR_RATE=0.001))
+	urls = [f"http://a.com/{i}" for i in range(10000)]
+	assert sum(dupefilter.request_seen(Request(url)) for url in urls) < 50
+	assert all(dupefilter.request_seen(Request(url)) for url in urls)
+	false_positives = sum(request_fingerprint(Request(f"http://b.com/{i}")) in dupefilter for i in range(10000))
+	assert false_positives < 50
+
+
+def test_bloom_dupefilter_checkpoint_and_restore(tmp_path):
+	settings = {"JOBDIR": str(tmp_path), "BLOOM_CAPACITY": 1000, "BLOOM_ERROR_RATE": 0.001}
+	urls = [f"http://a.com/{i}" for i in range(100)]
+	dupefilter = BloomDupeFilter(_crawler(**settings))
+	assert not any(_seen(dupefilter, urls))
+	dupefilter.close()
+	restored = BloomDupeFilter(_crawler(**settings))
+	assert len(restored) == 100 and all(_seen(restored, urls))
+	assert not restored.request_seen(Request("http://a.com/new"))
+	# 容量或者误判率变了, 保存的状态不能用
+	changed = BloomDupeFilter(_crawler(**{**settings, "BLOOM_CAPACITY": 2000}))
+	assert len(changed) == 0 and not any(_seen(changed, urls[:10]))
+
+
+def test_memory_dupefilter_checkpoint_appends(tmp_path):
+	dupefilter = MemoryDupeFilter(_crawler(JOBDIR=str(tmp_path)))
+	_seen(dupefilter, ["http://a.com/1", "http://a.com/2"])
+	dupefilter.checkpoint()
+	_seen(dupefilter, ["http://a.com/3"])
+	dupefilter.close()
+	path = tmp_path / "requests.seen"
+	assert path.stat().st_size == 3 * MemoryDupeFilter.FP_SIZE
+	# 写了一半的指纹被忽略
+	with open(path, "ab") as f:
+		f.write(b"partial")
+	restored = MemoryDupeFilter(_crawler(JOBDIR=str(tmp_path)))
+	assert len(restored) == 3 and all(_seen(restored, ["http://a.com/1", "http://a.com/2", "http://a.com/3"]))
@@ -0,0 +1,112 @@
+"""
+Tests for file downloads: range reassembly and content-hash dedup
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+import re
+from types import SimpleNamespace
+
+from aiohttp import web
+
+from bald_spider import Request
+from bald_spider.core.downloader.aiohttp_downloder import AioDownloader
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.stats_collector import StatsCollector
+from bald_spider.subscriber import Subscriber
+
+PORT = 8794
+RANGE_SIZE = 16 * 1024
+DATA = random.Random(18).randbytes(RANGE_SIZE * 5 + 123)
+
+
+def _app():
+	# flaky 的第一个分段请求返回 503
+	failures = [1]
+
+	async def serve(request):
+		name = request.match_info["name"]
+		start, end = 0, len(DATA) - 1
+		if match := re.match(r"bytes=(\d+)-(\d+)", request.headers.get("Range", "")):
+			start, end = int(match.group(1)), min(int(match.group(2)), end)
+		else:
+			return web.Response(body=DATA, content_type="application/octet-stream")
+		if name == "flaky" and start > 0 and failures:
+			failures.pop()
+			return web.Response(status=503)
+		# 分段返回的范围和请求的不一致
+		shown = start + 1 if name == "bad" and start > 0 else start
+		headers = {"Content-Range": f"bytes {shown}-{end}/{len(DATA)}"}
+		return web.Response(status=206, body=DATA[start : end + 1], headers=headers, content_type="application/octet-stream")
+
+	app = web.Application()
+	app.router.add_get("/{name}", serve)
+	return app
+
+
+def _downloader(store, **values):
+	settings = SettingsManager({
+		"FILES_STORE": str(store),
+		"FILES_RANGE_SIZE": RANGE_SIZE,
+		"FILES_RANGE_CONCURRENCY": 3,
+		"MIDDLEWARES": ["bald_spider.middleware.retry.Retry"],
+		"RETRY_BACKOFF_BASE": 0.01,
+		"LOG_LEVEL": "CRITICAL",
+		**values,
+	})
+	crawler = SimpleNamespace(settings=settings, spider=None, subscriber=Subscriber())
+	crawler.stats = StatsCollector(crawler)
+	downloader = AioDownloader(crawler)
+	crawler.engine = SimpleNamespace(downloader=downloader)
+	downloader.open()
+	return downloader
+
+
+def _run(store, *urls, **values):
+	async def main():
+		runner = web.AppRunner(_app())
+		await runner.setup()
+		await web.TCPSite(runner, "127.0.0.1", PORT).start()
+		downloader = _downloader(store, **values)
+		results = []
+		for url in urls:
+			request = Request(url, meta={"download_file": True})
+			results.append(await downloader.fetch(request))
+			# 调用者的请求不会被加上 Range
+			assert "Range" not in request.headers
+		await downloader.close()
+		await runner.cleanup()
+		return results
+
+	return asyncio.run(main())
+
+
+def _stored(store):
+	return sorted(os.path.join(root, name) for root, _, names in os.walk(store) for name in names)
+
+
+def test_range_download_reassembled(tmp_path):
+	results = _run(tmp_path, f"http://127.0.0.1:{PORT}/a.bin", f"http://127.0.0.1:{PORT}/flaky")
+	checksum = hashlib.sha256(DATA).hexdigest()
+	files = [response.meta["file"] for response in results]
+	assert [file["checksum"] for file in files] == [checksum, checksum]
+	assert files[0]["size"] == len(DATA) and files[1]["path"] == files[0]["path"]
+	# 相同内容只保存一份, 分段重试之后也没有多余的临时文件
+	assert _stored(tmp_path) == [files[0]["path"]]
+	with open(files[0]["path"], "rb") as f:
+		assert f.read() == DATA
+
+
+def test_mismatched_content_range_is_not_written(tmp_path):
+	# 分段失败时取消其他分段, 删除临时文件, 请求被丢弃
+	assert _run(tmp_path, f"http://127.0.0.1:{PORT}/bad") == [None]
+	assert _stored(tmp_path) == []
+
+
+def test_sequential_download_without_ranges(tmp_path):
+	results = _run(tmp_path, f"http://127.0.0.1:{PORT}/a.bin", f"http://127.0.0.1:{PORT}/b.bin", FILES_RANGE_CONCURRENCY=1)
+	first, second = (response.meta["file"] for response in results)
+	assert first["checksum"] == hashlib.sha256(DATA).hexdigest() and first["path"].endswith(".bin")
+	assert second["path"] == first["path"] and _stored(tmp_path) == [first["path"]]
@@ -0,0 +1,71 @@
+"""
+Tests for LinkExtractor
+"""
+
+import random
+from urllib.parse import urljoin
+
+from bald_spider import Request
+from bald_spider.http.response import Response
+from bald_spider.linkextractors import LinkExtractor
+from bald_spider.utils.html import urljoin_all
+
+PAGE = """<html><head><base href="/list/"></head><body>
+<a href="detail/1">1</a><a href="detail/1#comments">1 again</a><a href="/detail/2?b=2&amp;a=1">2</a>
+<a href="http://www.example.com/detail/3">3</a><a href="http://other.com/detail/4">4</a>
+<a href="http://ads.example.com/detail/5">5</a><a href="detail/6.pdf">pdf</a><a href="/about">about</a>
+<a href="mailto:a@example.com">mail</a><a href="javascript:void(0)">js</a>
+</body></html>"""
+
+
+def make_response():
+	url = "http://example.com/index.html"
+	return Response(url, request=Request(url), body=PAGE.encode())
+
+
+def test_extract_links_rules():
+	extractor = LinkExtractor(allow=r"/detail/", allow_domains="example.com", deny_domains=["ads.example.com"])
+	assert extractor.extract_links(make_response()) == [
+		"http://example.com/list/detail/1",
+		"http://example.com/detail/2?b=2&a=1",
+		"http://www.example.com/detail/3",
+	]
+	extractor = LinkExtractor(deny=[r"/about", r"other\.com"], deny_extensions=[], canonicalize=True)
+	links = extractor.extract_links(make_response())
+	assert "http://example.com/detail/2?a=1&b=2" in links
+	assert "http://example.com/list/detail/6.pdf" in links
+	assert not [link for link in links if "about" in link or "other" in link]
+
+
+def test_extract_requests():
+	requests = LinkExtractor(allow=r"/detail/\d+$").extract_requests(make_response(), priority=5, meta={"depth": 1})
+	assert [request.url for request in requests] == [
+		"http://example.com/list/detail/1",
+		"http://www.example.com/detail/3",
+		"http://other.com/detail/4",
+		"http://ads.example.com/detail/5",
+	]
+	assert requests[0].priority == 5 and requests[0].meta == {"depth": 1}
+	assert requests[0].meta is not requests[1].meta
+
+
+def test_urljoin_all_matches_urljoin():
+	bases = [
+		"http://a.com", "http://a.com/x/y", "https://u@a.com:8080/x/y;p?q=1#f", "http://a.com?q",
+		"http://a.com/p?", "http://a.com/p#", "http://a.com/p?#", "http://a.com/p;",
+		"http://a.com/x/../y/", "http://a.com/a/./b", "http://a.com//x/y", "http://a.com/x/..", "http://a.com/x/.",
+	]
+	parts = [
+		"", "a", "..", ".", "/", "//", "?", "#", "b/", "c;d", ";", "e:f", "http://z.com/./a", "http://z.com/a;",
+		"mailto:x", "../g", "?k=v", "#f", "#/", "\n", "%20",
+	]
+	rng = random.Random(22)
+	links = ["".join(rng.choice(parts) for _ in range(rng.randint(0, 4))).strip() for _ in range(5000)]
+	links += ["a;", "#/", "a;?x", "http://z.com/a;#f"]
+	assert urljoin_all("http://a.com/x", ["a;"]) == ["http://a.com/a"]
+	assert urljoin_all("http://a.com/p?", ["#/"]) == ["http://a.com/p#/"]
+	assert urljoin_all("http://a.com/x/../y/", ["a"]) == ["http://a.com/y/a"]
+	assert urljoin_all("http://a.com/a/./b", ["c"]) == ["http://a.com/a/c"]
+	assert urljoin_all("http://a.com//x/y", ["a"]) == ["http://a.com/x/a"]
+	for base in bases:
+		assert urljoin_all(base, links) == [urljoin(base, link) for link in links]
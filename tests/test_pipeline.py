@@ -0,0 +1,180 @@
+"""
+Tests for item pipelines
+"""
+
+import asyncio
+import gzip
+import sqlite3
+from types import SimpleNamespace
+
+from bald_spider import Item
+from bald_spider.exceptions import DropItem
+from bald_spider.items import Field
+from bald_spider.pipelines import BasePipeline
+from bald_spider.pipelines.feed_export import FeedExportPipeline
+from bald_spider.pipelines.pipeline_manager import PipelineManager
+from bald_spider.pipelines.sqlite import SqlitePipeline
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.stats_collector import StatsCollector
+from bald_spider.subscriber import Subscriber
+from bald_spider.utils.json_backend import loads
+
+
+class NumberItem(Item):
+	n = Field()
+
+
+class DropOddPipeline(BasePipeline):
+	def process_item(self, item, spider):
+		if item["n"] % 2:
+			raise DropItem("odd")
+		return item
+
+
+class BatchPipeline(BasePipeline):
+	batch_size = 3
+
+	def __init__(self):
+		self.batches = []
+
+	async def process_items(self, items, spider):
+		self.batches.append([item["n"] for item in items])
+		return items[1:]
+
+
+class SlowBatchPipeline(BasePipeline):
+	batch_size = 2
+
+	def __init__(self):
+		self.batches = []
+
+	async def process_items(self, items, spider):
+		# 第一次写入一直等待, 直到被取消
+		if not self.batches:
+			self.batches.append(None)
+			await asyncio.sleep(60)
+		self.batches.append([item["n"] for item in items])
+		return items
+
+
+class FailTwoPipeline(BasePipeline):
+	def process_item(self, item, spider):
+		if item["n"] == 2:
+			raise ValueError("broken item")
+		return item
+
+
+class CollectPipeline(BasePipeline):
+	def __init__(self):
+		self.items = []
+		self.closed = False
+
+	def process_item(self, item, spider):
+		self.items.append(item["n"])
+		return item
+
+	def close_spider(self, spider):
+		self.closed = True
+
+
+def _crawler(pipelines=("DropOddPipeline", "BatchPipeline", "CollectPipeline"), interval=60):
+	settings = SettingsManager(
+		{
+			"ITEM_PIPELINES": [f"tests.test_pipeline.{name}" for name in pipelines],
+			"ITEM_PIPELINE_BATCH_SIZE": 100,
+			"ITEM_PIPELINE_BATCH_INTERVAL": interval,
+		}
+	)
+	crawler = SimpleNamespace(settings=settings, spider=None, subscriber=Subscriber())
+	crawler.stats = StatsCollector(crawler)
+	return crawler
+
+
+def test_pipeline_batches():
+	async def main():
+		crawler = _crawler()
+		manager = PipelineManager(crawler)
+		_, batch, collect = manager.pipelines
+		await manager.open_spider()
+		for n in range(10):
+			await manager.process_item(NumberItem(n=n))
+		# 0 2 4 凑满一批, 6 8 留在缓冲区
+		assert batch.batches == [[0, 2, 4]]
+		assert collect.items == [2, 4]
+		await manager.close_spider()
+		assert batch.batches == [[0, 2, 4], [6, 8]]
+		assert collect.items == [2, 4, 8]
+		assert collect.closed
+		assert crawler.stats.get_value("item_dropped_count") == 5
+		assert crawler.stats.get_value("item_successful_count") == 3
+
+	asyncio.run(main())
+
+
+def test_pipeline_error_after_batch():
+	async def main():
+		crawler = _crawler(("BatchPipeline", "FailTwoPipeline", "CollectPipeline"), interval=0.05)
+		manager = PipelineManager(crawler)
+		_, _, collect = manager.pipelines
+		await manager.open_spider()
+		for n in range(5):
+			await manager.process_item(NumberItem(n=n))
+		# 批量管道放出 1 2, 2 出错只丢弃这一条, 定时写入任务继续清空缓冲区
+		assert collect.items == [1]
+		await asyncio.sleep(0.2)
+		assert collect.items == [1, 4] and not manager._flush_task.done()
+		await manager.close_spider()
+		assert crawler.stats.get_value("item_error_count") == 1
+
+	asyncio.run(main())
+
+
+def test_cancelled_flush_keeps_batch():
+	async def main():
+		manager = PipelineManager(_crawler(("SlowBatchPipeline", "CollectPipeline")))
+		batch, collect = manager.pipelines
+		await manager.open_spider()
+		await manager.process_item(NumberItem(n=0))
+		task = asyncio.create_task(manager.process_item(NumberItem(n=1)))
+		await asyncio.sleep(0.01)
+		task.cancel()
+		await asyncio.gather(task, return_exceptions=True)
+		# 写入时被取消的一批放回缓冲区, 关闭时写入
+		assert [item["n"] for item in manager._stages[0].buffer] == [0, 1] and not collect.items
+		await manager.close_spider()
+		assert batch.batches == [None, [0, 1]] and collect.items == [0, 1]
+
+	asyncio.run(main())
+
+
+def test_feed_export_rotation(tmp_path):
+	async def main():
+		crawler = _crawler()
+		crawler.settings.set("FEED_PATH", str(tmp_path / "{name}.jsonl"))
+		crawler.settings.set("FEED_COMPRESSION", "gzip")
+		crawler.settings.set("FEED_ROTATE_COUNT", 4)
+		crawler.spider = "test"
+		pipeline = FeedExportPipeline.create_instance(crawler)
+		await pipeline.process_items([NumberItem(n=n) for n in range(10)], None)
+		await pipeline.close_spider(None)
+		return sorted(tmp_path.iterdir())
+
+	files = asyncio.run(main())
+	assert [f.name for f in files] == ["test.00000.jsonl.gz", "test.00001.jsonl.gz", "test.00002.jsonl.gz"]
+	lines = [line for f in files for line in gzip.open(f).read().splitlines()]
+	assert [loads(line)["n"] for line in lines] == list(range(10))
+
+
+def test_sqlite_upsert(tmp_path):
+	async def main():
+		crawler = _crawler()
+		crawler.settings.set("SQLITE_PATH", str(tmp_path / "items.db"))
+		crawler.settings.set("SQLITE_UPSERT_KEYS", ["n"])
+		pipeline = SqlitePipeline.create_instance(crawler)
+		await pipeline.open_spider(None)
+		await pipeline.process_items([NumberItem(n=n % 3) for n in range(10)], None)
+		await pipeline.close_spider(None)
+
+	asyncio.run(main())
+	rows = sqlite3.connect(tmp_path / "items.db").execute("select n from numberitem order by n").fetchall()
+	assert rows == [(0,), (1,), (2,)]
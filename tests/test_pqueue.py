@@ -0,0 +1,63 @@
+"""
+Tests for the scheduler queues
+"""
+
+import asyncio
+import random
+
+from bald_spider import Request
+from bald_spider.spider import Spider
+from bald_spider.utils.pqueue import DiskPriorityQueue, SpoderPriorityQueue
+
+
+class QueueSpider(Spider):
+	def parse_detail(self, response):
+		pass
+
+
+def test_spoder_priority_queue_get_nowait():
+	queue = SpoderPriorityQueue()
+	assert queue.get_nowait() is None
+	queue.put_nowait(Request("http://a.com/2", priority=2))
+	queue.put_nowait(Request("http://a.com/1", priority=1))
+	assert queue.get_nowait().priority == 1
+
+
+def test_disk_priority_queue_order(tmp_path):
+	spider = QueueSpider()
+	queue = DiskPriorityQueue(spider, path=str(tmp_path / "requests.db"), buffer_size=10, spill_batch=7)
+	load = queue._load
+	loads = []
+	queue._load = lambda: loads.append(1) or load()
+	priorities = [random.randint(-50, 50) for _ in range(500)]
+	for i, priority in enumerate(priorities):
+		queue.put_nowait(Request(f"http://a.com/{i}", priority=priority, callback=spider.parse_detail))
+		assert len(queue._queue) <= 10
+	assert queue.qsize() == 500
+	got = []
+	# 插入高优先级请求和读回磁盘上的请求时, 热缓冲都不超过 buffer_size
+	for i in range(100):
+		queue.put_nowait(Request(f"http://a.com/high/{i}", priority=-100 + i, callback=spider.parse_detail))
+		priorities.append(-100 + i)
+		got.append(queue.get_nowait().priority)
+		assert len(queue._queue) <= 10
+	while (request := queue.get_nowait()) is not None:
+		got.append(request.priority)
+		assert request.callback == spider.parse_detail and len(queue._queue) <= 10
+	assert got == sorted(priorities)
+	# 每次读回一批(buffer_size // 2), 不会一条一条地查询
+	assert len(loads) < 120
+	queue.close()
+
+
+def test_disk_priority_queue_wakes_getter():
+	async def run():
+		queue = DiskPriorityQueue(QueueSpider(), buffer_size=1)
+		getter = asyncio.create_task(queue.get())
+		await asyncio.sleep(0)
+		await queue.put(Request("http://a.com/"))
+		request = await asyncio.wait_for(getter, 1)
+		queue.close()
+		return request
+
+	assert asyncio.run(run()).url == "http://a.com/"
@@ -0,0 +1,75 @@
+"""
+Tests for the callback process pool
+"""
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+from multidict import CIMultiDictProxy, CIMultiDict
+
+from bald_spider import Item, Request
+from bald_spider.core.process_pool import CallbackProcessPool
+from bald_spider.http.response import Response
+from bald_spider.items import Field
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.spider import Spider
+from bald_spider.stats_collector import StatsCollector
+
+
+class PageItem(Item):
+	url = Field()
+	title = Field()
+	pid = Field()
+	header = Field()
+
+
+class PoolSpider(Spider):
+	def parse(self, response):
+		yield PageItem(url=response.url, title=response.title(), pid=os.getpid(), header=response.headers["x-test"])
+		yield Request(response.urljoin("/next"), callback=self.parse_next, meta={"from": response.meta["page"]})
+
+	def parse_next(self, response):
+		raise ValueError("broken page")
+
+
+def _crawler(callbacks):
+	settings = SettingsManager({"PROCESS_POOL_CALLBACKS": callbacks, "PROCESS_POOL_WORKERS": 1})
+	crawler = SimpleNamespace(settings=settings, spider=PoolSpider())
+	crawler.stats = StatsCollector(crawler)
+	return crawler
+
+
+def test_offload_rules():
+	crawler = _crawler(["parse"])
+	pool = CallbackProcessPool(crawler)
+	spider = crawler.spider
+	assert pool.offload(Request("http://a.com/"), spider.parse)
+	assert not pool.offload(Request("http://a.com/"), spider.parse_next)
+	assert pool.offload(Request("http://a.com/", meta={"process_pool": True}), spider.parse_next)
+	assert not pool.offload(Request("http://a.com/", meta={"process_pool": False}), spider.parse)
+	assert not pool.offload(Request("http://a.com/", meta={"process_pool": True}), lambda response: None)
+	# 默认不 fork, 主进程中可能已经有数据导出等线程
+	assert pool.start_method in ("forkserver", "spawn")
+
+
+def test_run_callback_in_worker():
+	async def main():
+		crawler = _crawler("*")
+		pool = CallbackProcessPool(crawler)
+		spider = crawler.spider
+		request = Request("http://a.com/page", callback=spider.parse, meta={"page": 1})
+		headers = CIMultiDictProxy(CIMultiDict([("X-Test", "1")]))
+		body = memoryview(b"<html><head><title>page</title></head></html>")
+		response = Response(request.url, request=request, headers=headers, body=body)
+		outputs = [output async for output in pool.run(spider.parse, response)]
+		next_request = outputs[1]
+		errors = [output async for output in pool.run(spider.parse_next, response.replace(request=next_request))]
+		await pool.close()
+		return outputs, errors
+
+	(item, request), (error,) = asyncio.run(main())
+	assert item["title"] == "page" and item["header"] == "1" and item["pid"] != os.getpid()
+	assert request.url == "http://a.com/next" and request.meta == {"from": 1}
+	assert request.callback.__self__ is not None and request.callback.__name__ == "parse_next"
+	assert isinstance(error, ValueError) and "broken page" in error.__notes__[0]
@@ -0,0 +1,178 @@
+"""
+Tests for the distributed queue, dupefilter and stats against the in-process fake redis
+"""
+
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+
+from aiohttp import web
+
+from bald_spider import Request
+from bald_spider.crawler import CrawlerProcess
+from bald_spider.dupefilter.redis_filter import RedisDupeFilter
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.spider import Spider
+from bald_spider.stats_collector import RedisStatsCollector
+from bald_spider.utils.fake_redis import FakeRedisServer
+from bald_spider.utils.pqueue import RedisPriorityQueue
+from bald_spider.utils.redis_client import RedisClient
+
+PORT = 8793
+PAGES = 30
+
+
+class FrontierSpider(Spider):
+	start_urls = [f"http://127.0.0.1:{PORT}/0"]
+
+	def parse(self, response):
+		for href in response.xpath("//a/@href").getall():
+			yield Request(response.urljoin(href), callback=self.parse)
+
+
+def _site(port, delay=0.05, served=None):
+	async def page(request):
+		i = int(request.match_info["i"])
+		if served is not None:
+			served[i] += 1
+		await asyncio.sleep(delay)
+		links = "".join(f'<a href="/{j}">{j}</a>' for j in (i * 2 + 1, i * 2 + 2, 0) if j < PAGES)
+		return web.Response(text=f"<html><body>{links}</body></html>", content_type="text/html")
+
+	app = web.Application()
+	app.router.add_get("/{i}", page)
+	return app
+
+
+def _process(url, **settings):
+	return CrawlerProcess(SettingsManager({
+		"SCHEDULER_QUEUE": "bald_spider.utils.pqueue.RedisPriorityQueue",
+		"DUPEFILTER": "bald_spider.dupefilter.redis_filter.RedisDupeFilter",
+		"STATS_COLLECTOR": "bald_spider.stats_collector.RedisStatsCollector",
+		"REDIS_URL": url,
+		"REDIS_POLL_INTERVAL": 0.1,
+		"REDIS_IDLE_TIME": 0.3,
+		"CONCURRENCY": 2,
+		"MIDDLEWARES": [],
+		"LOG_LEVEL": "CRITICAL",
+		"STATS_DUMP": False,
+		**settings,
+	}))
+
+
+def _crawler(url, **settings):
+	settings = SettingsManager({"REDIS_URL": url, "REDIS_KEY": "test", "CONCURRENCY": 1, **settings})
+	crawler = SimpleNamespace(settings=settings, spider=FrontierSpider())
+	crawler.stats = RedisStatsCollector(crawler)
+	return crawler
+
+
+def test_client_and_transaction():
+	server = FakeRedisServer().start()
+	client = RedisClient.from_url(server.url)
+	assert client.execute("ZADD", "z", 2, "b", 1.5, "a") == 2
+	assert client.transaction([("ZRANGE", "z", 0, -1, "WITHSCORES"), ("DEL", "z")]) == [[b"a", b"1.5", b"b", b"2"], 1]
+	assert client.execute("ZCARD", "z") == 0 and client.execute("ZPOPMIN", "z") == []
+	# WATCH 之后 key 被其他连接修改, 事务不执行
+	other = RedisClient.from_url(server.url)
+	client.execute("WATCH", "z")
+	other.execute("ZADD", "z", 1, "c")
+	assert client.transaction([("DEL", "z")]) is None and client.execute("ZCARD", "z") == 1
+	client.close()
+	other.close()
+	server.stop()
+
+
+def test_shared_frontier_and_requeue():
+	server = FakeRedisServer().start()
+	a, b = _crawler(server.url), _crawler(server.url, REDIS_HEARTBEAT_TIMEOUT=10)
+	queue_a, queue_b = RedisPriorityQueue(a), RedisPriorityQueue(b)
+	queue_a._heartbeat()
+	queue_b._heartbeat()
+	spider = a.spider
+	queue_a.put_nowait(Request("http://a.com/low", callback=spider.parse, priority=5))
+	queue_b.put_nowait(Request("http://a.com/high", priority=-1))
+	queue_b.put_nowait(Request("http://a.com/high2", priority=-1))
+	assert queue_b.qsize() == 3
+	first = queue_a.get_nowait()
+	second = queue_a.get_nowait()
+	# CONCURRENCY * 2 个请求还没有完成, 剩下的留给其他节点
+	assert first.url == "http://a.com/high" and second.url == "http://a.com/high2" and queue_a.get_nowait() is None
+	queue_a.request_done(first)
+	assert not queue_b.idle()
+	# 节点 a 心跳超时, 处理中的请求由节点 b 放回队列
+	RedisClient.from_url(server.url).execute("ZADD", queue_a.workers_key, 0, queue_a.worker)
+	queue_b._requeue_dead()
+	assert b.stats.get_value("redis_requeued_count") == 1
+	assert [queue_b.get_nowait().url for _ in range(2)] == ["http://a.com/high2", "http://a.com/low"]
+	assert queue_b.get_nowait() is None
+	dupefilter = RedisDupeFilter(SimpleNamespace(settings=a.settings, spider=spider, stats=a.stats))
+	assert not dupefilter.request_seen(first) and dupefilter.request_seen(first) and len(dupefilter) == 1
+	server.stop()
+
+
+def test_close_requeues_unfinished_requests():
+	server = FakeRedisServer().start()
+	crawler = _crawler(server.url)
+	queue = RedisPriorityQueue(crawler)
+	queue.put_nowait(Request("http://a.com/done"))
+	queue.put_nowait(Request("http://a.com/unfinished"))
+	done, unfinished = queue.get_nowait(), queue.get_nowait()
+	queue.request_done(done)
+	queue.close()
+	# 关闭时还在处理的请求放回队列, 已经完成的不会
+	other = RedisPriorityQueue(_crawler(server.url))
+	assert other.qsize() == 1 and other.get_nowait().url == unfinished.url and other.get_nowait() is None
+	other.close()
+	server.stop()
+
+
+def test_two_crawlers_share_frontier():
+	async def main(url):
+		runner = web.AppRunner(_site(PORT))
+		await runner.setup()
+		await web.TCPSite(runner, "127.0.0.1", PORT).start()
+		process = _process(url)
+		await process.crawl(FrontierSpider)
+		await process.crawl(FrontierSpider)
+		await process.start()
+		await runner.cleanup()
+		return [crawler.stats for crawler in process.crawlers]
+
+	server = FakeRedisServer().start()
+	stats = asyncio.run(main(server.url))
+	counts = [s.get_value("response_received_count", 0) for s in stats]
+	assert sum(counts) == PAGES and all(counts)
+	assert stats[0].get_shared_stats()["response_received_count"] == PAGES
+	server.stop()
+
+
+def test_redis_restart_mid_crawl(monkeypatch):
+	monkeypatch.setattr(RedisClient, "BACKOFF_MIN", 0.1)
+	monkeypatch.setattr(RedisClient, "BACKOFF_MAX", 0.2)
+	served = Counter()
+
+	async def restart(server):
+		while sum(served.values()) < 5:
+			await asyncio.sleep(0.01)
+		await asyncio.to_thread(server.stop)
+		await asyncio.sleep(0.5)
+		host, port = server.server_address[:2]
+		return FakeRedisServer(host, port, redis=server.redis).start()
+
+	async def main(server):
+		runner = web.AppRunner(_site(PORT, served=served))
+		await runner.setup()
+		await web.TCPSite(runner, "127.0.0.1", PORT).start()
+		process = _process(server.url, REDIS_SOCKET_TIMEOUT=1)
+		await process.crawl(FrontierSpider)
+		restarted = asyncio.create_task(restart(server))
+		await process.start()
+		await runner.cleanup()
+		return await restarted
+
+	server = FakeRedisServer().start()
+	restarted = asyncio.run(main(server))
+	# Redis 停止期间的请求保存在本地, 恢复后补发, 所有页面都抓取到了
+	assert set(served) == set(range(PAGES))
+	restarted.stop()
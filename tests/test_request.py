@@ -0,0 +1,68 @@
+"""
+Tests for Request copying, lazy headers/meta and serialization
+"""
+
+import pytest
+
+from bald_spider import Request
+from bald_spider.core.downloader.slot import SlotManager
+from bald_spider.spider import Spider
+from bald_spider.utils.request import request_from_dict, request_to_dict
+
+
+class DetailSpider(Spider):
+	def parse_detail(self, response):
+		pass
+
+
+def test_lazy_headers_and_meta():
+	request = Request("http://a.com/")
+	assert request._headers is None and request._meta is None
+	with pytest.raises(AttributeError):
+		request.__dict__
+	# 序列化、取槽位 key 和读取 meta 中的值都不会创建空字典
+	assert request_to_dict(request, None) == {"url": "http://a.com/"} and SlotManager.slot_key(request) == "a.com"
+	assert request.get_meta("depth", 0) == 0 and request.pop_meta("depth") is None
+	assert request.meta_or_none is None and request.headers_or_none is None and request._meta is None
+	request.meta["depth"] = 1
+	request.headers["User-Agent"] = "x"
+	assert request._meta == {"depth": 1} and request._headers == {"User-Agent": "x"}
+	assert request.get_meta("depth") == 1 and request.pop_meta("depth") == 1 and request.meta_or_none == {}
+	# 空的 headers 不保存
+	assert Request("http://a.com/", headers={})._headers is None
+
+
+def test_replace_copies_and_overrides():
+	spider = DetailSpider()
+	request = Request(
+		"http://a.com/", callback=spider.parse_detail, priority=2, method="POST", body="b=1",
+		headers={"X": "1"}, meta={"depth": 1, "items": []}, dont_filter=True,
+	)
+	copy = request.replace(url="http://a.com/2", priority=5)
+	assert (copy.url, copy.priority) == ("http://a.com/2", 5)
+	assert (copy.method, copy.body, copy.callback, copy.dont_filter) == ("POST", "b=1", spider.parse_detail, True)
+	# meta 和 headers 是浅拷贝: 修改副本的 key 不影响原请求, 可变的值是共享的
+	copy.meta["depth"] = 2
+	copy.headers["X"] = "2"
+	copy.meta["items"].append(1)
+	assert request.meta == {"depth": 1, "items": [1]} and request.headers == {"X": "1"}
+	assert request.copy().meta == request.meta and request.copy().meta is not request.meta
+	# 没有 meta 的请求复制后也不会创建
+	assert Request("http://a.com/").replace(priority=1)._meta is None
+	assert request.replace(meta={"other": 1}).meta == {"other": 1}
+
+
+def test_request_dict_round_trip():
+	spider = DetailSpider()
+	request = Request(
+		"http://a.com/", callback=spider.parse_detail, priority=-1, headers={"X": "1"}, meta={"depth": 3},
+		encoding="gbk", dont_filter=True,
+	)
+	d = request_to_dict(request, spider)
+	assert d["callback"] == "parse_detail"
+	restored = request_from_dict(d, spider)
+	assert restored.callback == spider.parse_detail
+	for name in ("url", "priority", "headers", "meta", "encoding", "dont_filter", "method"):
+		assert getattr(restored, name) == getattr(request, name)
+	with pytest.raises(ValueError):
+		request_to_dict(Request("http://a.com/", callback=lambda response: None), spider)
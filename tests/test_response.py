@@ -0,0 +1,117 @@
+"""
+Tests for Response decoding and body buffering
+"""
+
+import logging
+import mmap
+
+import pytest
+
+from bald_spider import Request
+from bald_spider.core.downloader.body import BodyBuffer
+from bald_spider.exceptions import DownloadSizeError
+from bald_spider.http.response import Response
+from bald_spider.utils import encoding
+
+
+def make_response(body, content_type=None, url="http://a.com/", request_encoding="utf-8"):
+	headers = {"Content-Type": content_type} if content_type else None
+	return Response(url, request=Request(url, encoding=request_encoding), headers=headers, body=body)
+
+
+def test_declared_encoding_order():
+	text = "中文页面"
+	response = make_response("\ufeff".encode("utf-8") + text.encode("utf-8"), "text/html; charset=gbk")
+	assert response.text == text and response.encoding == "utf-8"
+	response = make_response(text.encode("gbk"), "text/html; charset=GB2312")
+	assert response.text == text and response.encoding == "gb18030"
+	body = b"<html><head><meta charset=\"gbk\"></head>" + text.encode("gbk")
+	assert make_response(memoryview(body), "text/html").text.endswith(text)
+	body = b"<meta http-equiv=\"Content-Type\" content=\"text/html; charset=iso-8859-1\">caf\xe9"
+	response = make_response(body)
+	assert response.text.endswith("café") and response.encoding == "cp1252"
+
+
+def test_detected_encoding_cached_per_host():
+	encoding._host_encodings.clear()
+	text = "没有声明编码的页面" * 10
+	response = make_response(text.encode("gb18030"), url="http://gb.com/1")
+	assert response.text == text
+	assert encoding.host_encoding("gb.com") == response.encoding
+	assert make_response(text.encode("gb18030"), url="http://gb.com/2").text == text
+	assert make_response(b"", url="http://gb.com/3").text == ""
+
+
+def test_json_from_bytes():
+	body = '{"data": {"total": 3, "items": [{"n": 1, "s": "a,]}"}, [2], 3]}, "next": null}'.encode()
+	response = make_response(memoryview(body), "application/json")
+	assert list(response.iter_json("data.items")) == [{"n": 1, "s": "a,]}"}, [2], 3]
+	assert list(response.iter_json("missing")) == []
+	assert response.json()["data"]["total"] == 3
+	assert response.json() is response.json()
+	assert list(response.iter_json(("data", "items")))[2] == 3
+	assert list(make_response(b" [ ] ").iter_json()) == []
+	gbk = make_response('{"name": "中文"}'.encode("gbk"), "application/json; charset=gbk")
+	assert gbk.json() == {"name": "中文"}
+
+
+def test_selector_and_fast_path():
+	page = (
+		'<html><head><title> 标题 &amp; 副标题 </title><base href="/base/">'
+		'<meta name="Description" content="desc &amp; more"><meta property="og:title" content=\'og\'></head>'
+		'<body><!-- <a href="/comment"> --><a class="x" href="a.html?x=1&amp;y=2">A</a>'
+		"<script>var s = '<a href=\"/script\">';</script><a href='/b'>B</a><a href=c>C</a></body></html>"
+	)
+	for body in (page.encode(), page.encode("gbk")):
+		content_type = "text/html; charset=gbk" if body != page.encode() else "text/html"
+		response = make_response(body, content_type, url="http://a.com/dir/page")
+		assert response.title() == "标题 & 副标题"
+		assert response.xpath("//title/text()").get().strip() == "标题 & 副标题"
+		assert response.css("a.x::text").get() == "A"
+		assert response.links() == ["http://a.com/base/a.html?x=1&y=2", "http://a.com/b", "http://a.com/base/c"]
+		assert response.html_meta() == {"description": "desc & more", "og:title": "og"}
+		assert response.re_first(r"href='(.*?)'") == "/b"
+
+
+def _buffer(**values):
+	values = {"maxsize": 100, "warnsize": 50, "spill_size": 0, **values}
+	return BodyBuffer(Request("http://a.com/"), logger=logging.getLogger("test_response"), **values)
+
+
+def test_body_size_limits(caplog):
+	with pytest.raises(DownloadSizeError):
+		_buffer(expected=101)
+	buffer = _buffer()
+	with caplog.at_level(logging.WARNING, "test_response"):
+		for _ in range(6):
+			buffer.write(b"x" * 10)
+	# 超过 warnsize 只警告一次
+	assert len(caplog.records) == 1 and buffer.getvalue() == b"x" * 60
+	buffer = _buffer()
+	buffer.write(b"x" * 100)
+	with pytest.raises(DownloadSizeError):
+		buffer.write(b"x")
+	# 0 表示不限制
+	buffer = _buffer(maxsize=0, warnsize=0)
+	buffer.write(b"x" * 1000)
+	assert buffer.getvalue() == b"x" * 1000
+
+
+def test_spilled_body_is_mmap_view_and_body_is_bytes():
+	page = "<html><head><title>大页面</title></head><body>" + "<p>x</p>" * 100 + "</body></html>"
+	data = page.encode()
+	buffer = _buffer(maxsize=0, spill_size=64)
+	for i in range(0, len(data), 50):
+		buffer.write(data[i : i + 50])
+	value = buffer.getvalue()
+	assert type(value) is memoryview and type(value.obj) is mmap.mmap
+	response = make_response(value, "text/html")
+	# 解码和解析直接使用 mmap, 不复制成 bytes
+	assert response.title() == "大页面" and response.body_view is value
+	assert response.xpath("//title/text()").get() == "大页面"
+	assert type(response.body) is bytes and response.body == data
+	assert bytes(response.body_view) == data and response.replace().body is response.body
+	# 没有超过 spill_size 的响应体就是 bytes
+	small = _buffer(spill_size=64)
+	small.write(b"abc")
+	assert type(small.getvalue()) is bytes
@@ -0,0 +1,85 @@
+"""
+Tests for retry backoff and requests returned by middlewares
+"""
+
+import asyncio
+from email.utils import formatdate
+from time import time
+from types import SimpleNamespace
+
+from bald_spider import Request
+from bald_spider.core.downloader.slot import SlotManager
+from bald_spider.core.scheduler import Scheduler
+from bald_spider.http.response import Response
+from bald_spider.middleware.middleware_manager import MiddlewareManager
+from bald_spider.middleware.retry import Retry
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.spider import Spider
+from bald_spider.stats_collector import StatsCollector
+from bald_spider.subscriber import Subscriber
+
+
+def _crawler(**values):
+	settings = SettingsManager({"RETRY_BACKOFF_BASE": 1.0, "RETRY_BACKOFF_MAX": 60.0, "MAX_RETRY_TIMES": 3, **values})
+	crawler = SimpleNamespace(settings=settings, spider=Spider(), subscriber=Subscriber())
+	crawler.stats = StatsCollector(crawler)
+	return crawler
+
+
+def _response(request, status, **headers):
+	return Response(request.url, request=request, headers=headers, status_code=status)
+
+
+def test_backoff_and_retry_after():
+	crawler = _crawler()
+	retry = Retry.create_instance(crawler)
+	spider = crawler.spider
+	request = Request("http://a.com/", priority=3)
+	first = retry.process_response(request, _response(request, 503), spider)
+	assert isinstance(first, Request) and first is not request and first.dont_filter and first.priority == 4
+	assert first.meta["retry_times"] == 1 and 0.5 <= first.meta["schedule_delay"] <= 1
+	# 指数退避: 第 3 次在 [2, 4] 秒之间
+	third = retry.process_response(first.replace(meta={"retry_times": 2}), _response(first, 503), spider)
+	assert third.meta["retry_times"] == 3 and 2 <= third.meta["schedule_delay"] <= 4
+	# Retry-After 比退避时间长时以它为准, 可以是秒数或者 HTTP-date, 都不超过 RETRY_BACKOFF_MAX
+	def delay(retry_after):
+		response = _response(request, 429, **{"Retry-After": retry_after})
+		return retry.process_response(request, response, spider).meta["schedule_delay"]
+
+	assert delay("7") >= 7 and 28 <= delay(formatdate(time() + 30, usegmt=True)) <= 30 and delay("3600") == 60
+	# 重试次数用完后返回原响应
+	last = _response(request, 503)
+	assert retry.process_response(request.replace(meta={"retry_times": 3}), last, spider) is last
+	assert crawler.stats.get_value("retry_count") == 5 and crawler.stats.get_value("retry_max_reached") == 1
+
+
+def test_retry_request_from_middleware_is_scheduled():
+	async def main():
+		crawler = _crawler(MIDDLEWARES=["bald_spider.middleware.retry.Retry"], RETRY_BACKOFF_BASE=0.01)
+		downloaded = []
+
+		async def download(request):
+			downloaded.append(request)
+			return _response(request, 503, **{"Retry-After": "0.05"})
+
+		crawler.engine = SimpleNamespace(
+			downloader=SimpleNamespace(download=download, slots=SlotManager(crawler)),
+			wakeup=lambda: None,
+			inflight_requests=lambda: [],
+		)
+		scheduler = Scheduler(crawler)
+		scheduler.open()
+		crawler.engine.enqueue_request = scheduler.enqueue_request
+		middleware = MiddlewareManager.create_instance(crawler)
+		request = Request("http://a.com/")
+		assert await scheduler.enqueue_request(request)
+		assert await middleware.download(await scheduler.next_request()) is None and len(downloaded) == 1
+		# 中间件返回的重试请求跳过去重, 进入调度器的延时队列, 到期后放回队列
+		assert await scheduler.next_request() is None and len(scheduler._delayed) == 1
+		await asyncio.sleep(0.1)
+		scheduler.slots.release(request)
+		retried = await scheduler.next_request()
+		assert retried.url == request.url and retried.meta["retry_times"] == 1 and "schedule_delay" not in retried.meta
+		scheduler.close()
+
+	asyncio.run(main())
@@ -0,0 +1,228 @@
+"""
+Tests for the scheduler and download slots
+"""
+
+import asyncio
+import pickle
+from types import SimpleNamespace
+
+from bald_spider import Request
+from bald_spider.core.downloader.slot import SlotManager
+from bald_spider.core.scheduler import Scheduler
+from bald_spider.http.response import Response
+from bald_spider.middleware.auto_throttle import AutoThrottle
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.spider import Spider
+from bald_spider.stats_collector import StatsCollector
+from bald_spider.subscriber import Subscriber
+from bald_spider.task_manager import ResizableSemaphore, TaskManager
+from bald_spider.utils.rate_limit import TokenBucket
+
+
+def _crawler(**values):
+	settings = SettingsManager()
+	settings.update_values(values)
+	crawler = SimpleNamespace(settings=settings, spider=Spider(), subscriber=Subscriber())
+	crawler.stats = StatsCollector(crawler)
+	crawler.engine = SimpleNamespace(
+		downloader=SimpleNamespace(slots=SlotManager(crawler)), wakeup=lambda: None, inflight_requests=lambda: []
+	)
+	return crawler
+
+
+def _scheduler(**values):
+	scheduler = Scheduler(_crawler(**values))
+	scheduler.open()
+	return scheduler
+
+
+def test_parked_requests_are_bounded():
+	async def main():
+		scheduler = _scheduler(CONCURRENCY_PER_DOMAIN=8)
+		queue = scheduler.request_queue
+		for i in range(10000):
+			queue.put_nowait(Request(f"http://a.com/{i}"))
+		requests = []
+		for _ in range(100):
+			if (request := await scheduler.next_request()) is not None:
+				requests.append(request)
+		assert len(requests) == 8
+		assert len(scheduler.slots) == scheduler.slot_backlog
+		assert queue.qsize() == 10000 - 8 - scheduler.slot_backlog
+		# 后来的高优先级请求只排在少量等待请求后面
+		queue.put_nowait(Request("http://a.com/urgent", priority=-10))
+		urls = []
+		for _ in range(scheduler.slot_backlog + 1):
+			scheduler.slots.release(requests.pop())
+			requests.append(await scheduler.next_request())
+			urls.append(requests[-1].url)
+		assert "http://a.com/urgent" in urls
+
+	asyncio.run(main())
+
+
+def test_auto_throttle_grows_beyond_initial_domain_concurrency():
+	async def main():
+		crawler = _crawler(
+			AUTOTHROTTLE_ENABLED=True, CONCURRENCY_PER_DOMAIN=2, AUTOTHROTTLE_MAX_CONCURRENCY_PER_DOMAIN=5, DOWNLOAD_DELAY=0
+		)
+		crawler.engine.task_manager = TaskManager(8)
+		throttle = AutoThrottle.create_instance(crawler)
+		slots = crawler.engine.downloader.slots
+		for i in range(20):
+			request = Request(f"http://a.com/{i}", meta={"download_latency": 0.01})
+			assert slots.admit(request)
+			slot = slots.slot_for(request)
+			# 槽位占满时响应正常, 增加并发
+			slot.active = slot.concurrency
+			throttle.process_response(request, Response(request.url, request=request), None)
+			slot.active = 1
+			slots.release(request)
+			slot.next_time = 0
+		assert slot.concurrency == 5
+
+	asyncio.run(main())
+
+
+def test_cancelled_woken_waiter_passes_permit_on():
+	async def main():
+		semaphore = ResizableSemaphore(1)
+		await semaphore.acquire()
+		first, second = asyncio.create_task(semaphore.acquire()), asyncio.create_task(semaphore.acquire())
+		await asyncio.sleep(0)
+		# 被唤醒的等待者在恢复运行之前被取消, 许可交给下一个等待者
+		semaphore.release()
+		first.cancel()
+		await asyncio.wait_for(second, 1)
+		assert first.cancelled() and semaphore.locked()
+		# 调大上限唤醒的等待者被取消也一样
+		third, fourth = asyncio.create_task(semaphore.acquire()), asyncio.create_task(semaphore.acquire())
+		await asyncio.sleep(0)
+		semaphore.resize(2)
+		third.cancel()
+		await asyncio.wait_for(fourth, 1)
+		assert semaphore._active == 2 and not semaphore._waiters
+
+	asyncio.run(main())
+
+
+def test_checkpoint_and_restore(tmp_path):
+	async def main():
+		scheduler = _scheduler(JOBDIR=str(tmp_path))
+		assert await scheduler.enqueue_request(Request("http://a.com/1"))
+		assert await scheduler.enqueue_request(Request("http://a.com/retry", meta={"schedule_delay": 30}))
+		scheduler.close()
+		restored = _scheduler(JOBDIR=str(tmp_path))
+		# 指纹也恢复了, 已经见过的请求不再入队
+		assert not await restored.enqueue_request(Request("http://a.com/1"))
+		assert (await restored.next_request()).url == "http://a.com/1"
+		assert await restored.next_request() is None
+		# 延时请求继续等待剩余的时间
+		((due, _, request),) = restored._delayed
+		assert request.url == "http://a.com/retry" and 29 < due - asyncio.get_running_loop().time() <= 30
+		restored.close()
+
+	asyncio.run(main())
+
+
+def test_interval_checkpoint_keeps_disk_buffer(tmp_path):
+	async def main():
+		scheduler = _scheduler(
+			JOBDIR=str(tmp_path), SCHEDULER_QUEUE="bald_spider.utils.pqueue.DiskPriorityQueue", SCHEDULER_MEMORY_BUFFER=4
+		)
+		for i in range(5):
+			assert await scheduler.enqueue_request(Request(f"http://a.com/{i}"))
+		task = asyncio.create_task(scheduler.interval_checkpoint(0.01))
+		await asyncio.sleep(0.05)
+		task.cancel()
+		# 定时保存只提交溢出的请求, 热缓冲留在内存, 和其他待抓取请求一起保存
+		queue = scheduler.request_queue
+		assert len(queue._queue) == 2 and queue._disk_size == 3 and not queue._spill
+		with open(tmp_path / "requests.pickle", "rb") as f:
+			assert len(pickle.load(f)) == 2
+		scheduler.close()
+		restored = _scheduler(JOBDIR=str(tmp_path), SCHEDULER_QUEUE="bald_spider.utils.pqueue.DiskPriorityQueue")
+		assert sorted([(await restored.next_request()).url for _ in range(5)]) == [f"http://a.com/{i}" for i in range(5)]
+		restored.close()
+
+	asyncio.run(main())
+
+
+def test_slot_delay_and_concurrency():
+	async def main():
+		crawler = _crawler(DOWNLOAD_DELAY=0.05, RANDOMNESS=False, CONCURRENCY_PER_DOMAIN=2)
+		woken = asyncio.Event()
+		crawler.engine.wakeup = woken.set
+		slots = crawler.engine.downloader.slots
+		loop = asyncio.get_running_loop()
+		first = Request("http://a.com/1")
+		assert slots.admit(first)
+		# 下载间隔没到, 同一个域名的请求在槽位中等待, 其他域名不受影响
+		assert not slots.admit(Request("http://a.com/2"))
+		assert slots.admit(Request("http://b.com/1"))
+		assert len(slots) == 1 and slots.pop_ready() is None
+		start = loop.time()
+		await asyncio.wait_for(woken.wait(), 1)
+		assert loop.time() - start >= 0.04
+		second = slots.pop_ready()
+		assert second.url == "http://a.com/2" and slots.slot_for(second).active == 2
+		# 并发满了, 间隔到了也要等 release
+		assert not slots.admit(Request("http://a.com/3"))
+		await asyncio.sleep(0.06)
+		assert slots.pop_ready() is None
+		slots.release(first)
+		assert slots.pop_ready().url == "http://a.com/3"
+		slots.close()
+
+	asyncio.run(main())
+
+
+def test_readmitted_request_releases_its_slot_once():
+	async def main():
+		slots = _crawler(CONCURRENCY_PER_DOMAIN=2).engine.downloader.slots
+		request = Request("http://a.com/1")
+		assert slots.admit(request)
+		# 同一个请求对象换了槽位再次进入调度, 之前占用的槽位先释放
+		request.meta["download_slot"] = "b"
+		assert slots.admit(request)
+		assert slots.get_slot(Request("http://a.com/2")).active == 0 and slots.slot_for(request).active == 1
+		slots.release(request)
+		slots.release(request)
+		assert slots.get_slot(request).active == 0 and slots.slot_for(request) is None
+		slots.close()
+
+	asyncio.run(main())
+
+
+def test_token_bucket():
+	bucket = TokenBucket(10, burst=2)
+	for _ in range(2):
+		assert bucket.available_at(0.0) == 0.0
+		bucket.consume(0.0)
+	assert abs(bucket.available_at(0.0) - 0.1) < 1e-9
+	# 空闲时最多积攒 burst 个令牌
+	assert bucket.available_at(10.0) == 10.0 and bucket.tokens == 2
+
+
+def test_global_and_per_slot_rate_limits():
+	async def main():
+		crawler = _crawler(RATE_LIMIT=20, RATE_LIMIT_BURST=1, DOWNLOAD_SLOTS={"slow.com": {"rate": 5}})
+		woken = asyncio.Event()
+		crawler.engine.wakeup = woken.set
+		slots = crawler.engine.downloader.slots
+		loop = asyncio.get_running_loop()
+		first = loop.time()
+		assert not slots.throttled() and slots.admit(Request("http://slow.com/1"))
+		# 全局令牌用完, 不发出任何请求, 到下一个令牌可用时唤醒引擎
+		start = loop.time()
+		assert slots.throttled()
+		await asyncio.wait_for(woken.wait(), 1)
+		assert 0.04 <= loop.time() - start < 0.2 and not slots.throttled()
+		# 全局有令牌, 但是 slow.com 每秒只能 5 个, 请求在槽位中等待
+		assert not slots.admit(Request("http://slow.com/2"))
+		woken.clear()
+		await asyncio.wait_for(woken.wait(), 1)
+		assert loop.time() - first >= 0.19 and slots.pop_ready().url == "http://slow.com/2"
+		slots.close()
+
+	asyncio.run(main())
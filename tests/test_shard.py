@@ -0,0 +1,94 @@
+"""
+Tests for multi-process crawling with domain sharding
+"""
+
+import asyncio
+import os
+
+import pytest
+from aiohttp import web
+
+from bald_spider import Item, Request
+from bald_spider.core.shard import shard_index
+from bald_spider.crawler import CrawlerProcess
+from bald_spider.items import Field
+from bald_spider.pipelines import BasePipeline
+from bald_spider.settings.settings_manager import SettingsManager
+from bald_spider.spider import Spider
+
+PORT = 8791
+PAGES = 40
+
+
+class PageItem(Item):
+	url = Field()
+	pid = Field()
+
+
+class CollectPipeline(BasePipeline):
+	# 管道在主进程的 ShardedCrawler 中创建, 测试通过类属性读取, 由 collected 重置
+	items = []
+
+	def process_item(self, item, spider):
+		self.items.append((item, os.getpid()))
+		return item
+
+
+class ShardSpider(Spider):
+	start_urls = [f"http://127.0.0.1:{PORT}/0"]
+
+	def parse(self, response):
+		yield PageItem(url=response.url, pid=os.getpid())
+		for href in response.xpath("//a/@href").getall():
+			yield Request(href, callback=self.parse)
+
+
+async def _page(request):
+	i = int(request.match_info["i"])
+	links = "".join(
+		f'<a href="http://127.0.0.{j % 4 + 1}:{PORT}/{j}">{j}</a>' for j in (i * 2 + 1, i * 2 + 2, 0) if j < PAGES
+	)
+	return web.Response(text=f"<html><body>{links}</body></html>", content_type="text/html")
+
+
+def test_shard_index():
+	assert shard_index("http://a.com/1", 4) == shard_index("https://A.com:8080/2?x=1", 4)
+	assert {shard_index(f"http://host{i}.com/", 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+@pytest.fixture
+def collected():
+	CollectPipeline.items = []
+	yield CollectPipeline.items
+	CollectPipeline.items = []
+
+
+def test_sharded_crawl(collected):
+	async def main():
+		app = web.Application()
+		app.router.add_get("/{i}", _page)
+		runner = web.AppRunner(app)
+		await runner.setup()
+		await web.TCPSite(runner, "0.0.0.0", PORT).start()
+		settings = SettingsManager({
+			"CRAWLER_PROCESSES": 2,
+			"MIDDLEWARES": [],
+			"ITEM_PIPELINES": ["tests.test_shard.CollectPipeline"],
+			"LOG_LEVEL": "WARNING",
+		})
+		process = CrawlerProcess(settings)
+		await process.crawl(ShardSpider)
+		await process.start()
+		await runner.cleanup()
+		return next(iter(process.crawlers)).stats
+
+	stats = asyncio.run(main())
+	urls = sorted(item["url"] for item, _ in collected)
+	assert urls == sorted(f"http://127.0.0.{i % 4 + 1}:{PORT}/{i}" for i in range(PAGES))
+	# 数据都在主进程的管道中处理, 同一个域名只在一个子进程中抓取
+	assert {pid for _, pid in collected} == {os.getpid()}
+	pids = {}
+	for item, _ in collected:
+		pids.setdefault(item["url"].split("/")[2], set()).add(item["pid"])
+	assert all(len(p) == 1 for p in pids.values()) and len(set.union(*pids.values())) == 2
+	assert stats["response_received_count"] == PAGES and stats["reason"] == "finished"